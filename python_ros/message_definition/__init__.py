@@ -1,8 +1,11 @@
 from __future__ import annotations
 
+import hashlib
+import threading
 from dataclasses import dataclass
 from dataclasses import field as dataclass_field
-from typing import List, Optional, Sequence, Union
+from dataclasses import fields
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
 # Type aliases matching the TypeScript package
 ConstantValue = Union[str, int, float, bool, None]
@@ -17,6 +20,17 @@ DefaultValue = Union[
     Sequence[bool],
     None,
 ]
+FrozenDefaultValue = Union[
+    str,
+    int,
+    float,
+    bool,
+    Tuple[str, ...],
+    Tuple[int, ...],
+    Tuple[float, ...],
+    Tuple[bool, ...],
+    None,
+]
 
 
 @dataclass
@@ -36,6 +50,88 @@ class MessageDefinitionField:
     arrayUpperBound: Optional[int] = None
     defaultValue: DefaultValue = None
 
+    def key(self) -> Tuple:
+        """Return a hashable tuple of every attribute of this field."""
+
+        default = self.defaultValue
+        return (
+            self.type,
+            self.name,
+            self.isComplex,
+            self.enumType,
+            self.isArray,
+            self.arrayLength,
+            self.isConstant,
+            self.value,
+            self.valueText,
+            self.upperBound,
+            self.arrayUpperBound,
+            tuple(default) if isinstance(default, list) else default,
+        )
+
+    def freeze(self) -> FrozenMessageDefinitionField:
+        return FrozenMessageDefinitionField(
+            **{f.name: getattr(self, f.name) for f in fields(self)}
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class FrozenMessageDefinitionField:
+    """An immutable, hashable and compact form of :class:`MessageDefinitionField`.
+
+    It exposes the same attributes, stores them in ``__slots__`` instead of a
+    per-instance ``__dict__``, keeps array default values as tuples, and
+    computes its hash once on first use.
+    """
+
+    type: str
+    name: str
+    isComplex: bool = False
+    enumType: Optional[str] = None
+    isArray: bool = False
+    arrayLength: Optional[int] = None
+    isConstant: bool = False
+    value: ConstantValue = None
+    valueText: Optional[str] = None
+    upperBound: Optional[int] = None
+    arrayUpperBound: Optional[int] = None
+    defaultValue: FrozenDefaultValue = None
+    _hash: Optional[int] = dataclass_field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self) -> None:
+        if isinstance(self.defaultValue, list):
+            object.__setattr__(self, "defaultValue", tuple(self.defaultValue))
+
+    def __hash__(self) -> int:
+        if self._hash is None:
+            object.__setattr__(self, "_hash", hash(self.key()))
+        return self._hash  # type: ignore[return-value]
+
+    def key(self) -> Tuple:
+        return (
+            self.type,
+            self.name,
+            self.isComplex,
+            self.enumType,
+            self.isArray,
+            self.arrayLength,
+            self.isConstant,
+            self.value,
+            self.valueText,
+            self.upperBound,
+            self.arrayUpperBound,
+            self.defaultValue,
+        )
+
+    def thaw(self) -> MessageDefinitionField:
+        default = self.defaultValue
+        return MessageDefinitionField(
+            *self.key()[:-1],
+            defaultValue=list(default) if isinstance(default, tuple) else default,
+        )
+
 
 @dataclass
 class MessageDefinition:
@@ -44,12 +140,92 @@ class MessageDefinition:
     name: Optional[str] = None
     definitions: List[MessageDefinitionField] = dataclass_field(default_factory=list)
 
+    def fingerprint(self) -> str:
+        """Return a canonical digest of the name and fields of this definition.
+
+        Definitions that compare equal share a fingerprint. The digest is cached
+        on first use; call :meth:`invalidate_fingerprint` after mutating fields.
+        """
+
+        cached = self.__dict__.get("_fingerprint")
+        if cached is None:
+            canonical = repr((self.name, [f.key() for f in self.definitions]))
+            cached = hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+            self.__dict__["_fingerprint"] = cached
+        return cached
+
+    def invalidate_fingerprint(self) -> None:
+        self.__dict__.pop("_fingerprint", None)
+
+
+class MessageDefinitionRegistry:
+    """A thread-safe store of shared, interned message definitions.
+
+    Definitions are interned by fully-qualified name plus structural
+    fingerprint, so every structurally equal definition maps to one shared
+    object and memory grows with the number of distinct types. Interned
+    definitions are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._by_name: Dict[Optional[str], Dict[str, MessageDefinition]] = {}
+
+    def intern(self, msg_def: MessageDefinition) -> MessageDefinition:
+        """Return the shared definition equal to *msg_def*, storing it if new."""
+
+        fingerprint = msg_def.fingerprint()
+        with self._lock:
+            variants = self._by_name.setdefault(msg_def.name, {})
+            return variants.setdefault(fingerprint, msg_def)
+
+    def get(
+        self, name: Optional[str], fingerprint: Optional[str] = None
+    ) -> Optional[MessageDefinition]:
+        """Return the definition registered under *name*, or ``None``.
+
+        Without a *fingerprint*, raises ``ValueError`` if several structurally
+        different definitions share the name.
+        """
+
+        with self._lock:
+            variants = self._by_name.get(name)
+            if not variants:
+                return None
+            if fingerprint is not None:
+                return variants.get(fingerprint)
+            if len(variants) > 1:
+                raise ValueError(
+                    f"Registry holds {len(variants)} different definitions of '{name}'"
+                )
+            return next(iter(variants.values()))
+
+    def variants(self, name: Optional[str]) -> List[MessageDefinition]:
+        with self._lock:
+            return list(self._by_name.get(name, {}).values())
+
+    def __contains__(self, name: object) -> bool:
+        with self._lock:
+            return name in self._by_name
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(variants) for variants in self._by_name.values())
+
+    def __iter__(self) -> Iterator[MessageDefinition]:
+        with self._lock:
+            snapshot = [d for v in self._by_name.values() for d in v.values()]
+        return iter(snapshot)
+
 
 __all__ = [
     "ConstantValue",
     "DefaultValue",
+    "FrozenDefaultValue",
+    "FrozenMessageDefinitionField",
     "MessageDefinition",
     "MessageDefinitionField",
+    "MessageDefinitionRegistry",
 ]
 
 
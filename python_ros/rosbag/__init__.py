@@ -0,0 +1,60 @@
+from .bag import Bag, ReadResult
+from .chunks import (
+    HAVE_LZ4,
+    CacheInfo,
+    ChunkCache,
+    Compress,
+    Decompress,
+    default_codecs,
+    default_compressors,
+)
+from .info import BagInfo, CompressionInfo, TopicInfo, bag_info
+from .iterators import BaseIterator, ForwardIterator, MessageEvent, ReverseIterator
+from .reader import BagReader, ChunkReadResult
+from .records import (
+    BagHeader,
+    Chunk,
+    ChunkInfo,
+    Connection,
+    IndexData,
+    IndexEntry,
+    MessageData,
+    Record,
+    extract_fields,
+)
+from .scan import partition_bag, scan_bag
+from .writer import BagWriter
+
+__all__ = [
+    "Bag",
+    "BagReader",
+    "BagWriter",
+    "ReadResult",
+    "MessageEvent",
+    "BagInfo",
+    "TopicInfo",
+    "CompressionInfo",
+    "bag_info",
+    "scan_bag",
+    "partition_bag",
+    "BaseIterator",
+    "ForwardIterator",
+    "ReverseIterator",
+    "ChunkReadResult",
+    "Decompress",
+    "Compress",
+    "ChunkCache",
+    "CacheInfo",
+    "default_codecs",
+    "default_compressors",
+    "HAVE_LZ4",
+    "Record",
+    "BagHeader",
+    "Chunk",
+    "ChunkInfo",
+    "Connection",
+    "IndexData",
+    "IndexEntry",
+    "MessageData",
+    "extract_fields",
+]
@@ -0,0 +1,157 @@
+"""High-level reading of ROS bag files."""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from typing import IO, Any, Dict, Iterable, Iterator, List, Mapping, Optional, Union
+
+from python_ros.rostime import Time, compare
+
+from .chunks import DEFAULT_CACHE_BYTES, Decompress
+from .iterators import BaseIterator, ForwardIterator, ReverseIterator
+from .reader import BagReader
+from .records import BagHeader, ChunkInfo, Connection
+
+
+@dataclass
+class ReadResult:
+    """A message read from a bag.
+
+    ``data`` is the serialized message, a ``memoryview`` into the bag that is
+    valid while the bag is open. ``message`` is ``None`` if parsing was off.
+    ``chunkOffset`` is the index of the chunk among the ``totalChunks`` chunks
+    that were read.
+    """
+
+    topic: str
+    message: Any
+    timestamp: Time
+    data: memoryview
+    chunkOffset: int
+    totalChunks: int
+    connectionId: int
+
+
+class Bag:
+    """A ROS bag file opened for reading.
+
+    :meth:`open` reads the bag header and the connection and chunk-info
+    records; messages are read chunk by chunk as they are requested. Message
+    definitions are parsed once per connection. *workers*, *prefetch* and
+    *cache_bytes* configure chunk decompression as for :class:`BagReader`.
+    """
+
+    def __init__(
+        self,
+        source: Union[str, os.PathLike, IO[bytes]],
+        decompress: Optional[Mapping[str, Decompress]] = None,
+        parse: bool = True,
+        workers: Optional[int] = None,
+        prefetch: Optional[int] = None,
+        cache_bytes: int = DEFAULT_CACHE_BYTES,
+    ) -> None:
+        self.reader = BagReader(source, decompress, workers, prefetch, cache_bytes)
+        self.parse = parse
+        self.header: Optional[BagHeader] = None
+        self.connections: Dict[int, Connection] = {}
+        self.chunkInfos: List[ChunkInfo] = []
+        self.startTime: Optional[Time] = None
+        self.endTime: Optional[Time] = None
+
+    def open(self) -> Bag:
+        header = self.header = self.reader.read_header()
+        connections, chunk_infos = self.reader.read_connections_and_chunk_info(
+            header.indexPosition, header.connectionCount, header.chunkCount
+        )
+        self.connections = {c.conn: c for c in connections}
+        self.chunkInfos = chunk_infos
+        if chunk_infos:
+            self.startTime = min((c.startTime for c in chunk_infos), key=_time_key)
+            self.endTime = max((c.endTime for c in chunk_infos), key=_time_key)
+        return self
+
+    def close(self) -> None:
+        self.reader.close()
+
+    def __enter__(self) -> Bag:
+        if self.header is None:
+            self.open()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def read_messages(
+        self,
+        topics: Optional[Iterable[str]] = None,
+        start_time: Optional[Time] = None,
+        end_time: Optional[Time] = None,
+        no_parse: bool = False,
+    ) -> Iterator[ReadResult]:
+        """Yield the messages on *topics* within ``[start_time, end_time]``.
+
+        Messages come chunk by chunk, in time order within each chunk. The
+        next chunks are decompressed while the messages of one are yielded.
+        """
+
+        connections = self.connections
+        if topics is None:
+            ids = list(connections)
+        else:
+            wanted = set(topics)
+            ids = [conn for conn, c in connections.items() if c.topic in wanted]
+        chunk_infos = [
+            info
+            for info in self.chunkInfos
+            if (end_time is None or compare(info.startTime, end_time) <= 0)
+            and (start_time is None or compare(start_time, info.endTime) <= 0)
+        ]
+        parse = self.parse and not no_parse
+        chunks = self.reader.iter_chunks(chunk_infos)
+        for index, (info, chunk) in enumerate(zip(chunk_infos, chunks)):
+            messages = self.reader.chunk_messages(
+                chunk, info, ids, start_time, end_time
+            )
+            for record in messages:
+                connection = connections.get(record.conn)
+                if connection is None:
+                    raise ValueError(f"Unable to find connection with id {record.conn}")
+                yield ReadResult(
+                    connection.topic,
+                    connection.reader.read_message(record.data) if parse else None,
+                    record.time,
+                    record.data,
+                    index,
+                    len(chunk_infos),
+                    record.conn,
+                )
+
+    def message_iterator(
+        self,
+        topics: Optional[Iterable[str]] = None,
+        start_time: Optional[Time] = None,
+        end_time: Optional[Time] = None,
+        reverse: bool = False,
+        no_parse: bool = False,
+    ) -> BaseIterator:
+        """Iterate over the messages on *topics* within ``[start_time, end_time]``.
+
+        Messages come in time order across chunks, latest first if *reverse*.
+        Only chunks that overlap the range and hold one of the topics are read.
+        """
+
+        iterator = ReverseIterator if reverse else ForwardIterator
+        return iterator(
+            self.reader,
+            self.connections,
+            self.chunkInfos,
+            topics,
+            start_time,
+            end_time,
+            self.parse and not no_parse,
+        )
+
+
+def _time_key(time: Time) -> Any:
+    return time.sec, time.nsec
@@ -0,0 +1,200 @@
+"""Report where the time goes when reading bag files.
+
+Run with ``python -m python_ros.rosbag.benchmark BAG...``. Every message of
+every bag is read once, and the time is split into the phases of
+:meth:`Bag.read_messages`:
+
+``index``
+    the bag header, connection and chunk-info records at the end of the file
+``compile``
+    parsing message definitions and compiling their readers, once per type
+``chunks``
+    chunk records, decompression and the index records after each chunk;
+    chunks are decompressed in the calling thread so that this is their cost
+``records``
+    message record headers; with ``mmap`` this is also where the pages of
+    uncompressed chunks are first read from disk
+``decode``
+    decoding message data, skipped with ``--no-parse``
+
+With ``--scan``, every bag is also reduced to per-topic message counts and
+sizes by :func:`scan_bag` with 1 to 16 worker processes. ``--synthetic N``
+adds a generated bag of *N* messages to the bags to read.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import struct
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from python_ros.rostime import from_nanosec
+
+from .chunks import default_codecs
+from .iterators import MessageEvent
+from .reader import BagReader
+from .scan import scan_bag
+from .writer import DEFAULT_CHUNK_SIZE, BagWriter
+
+FIXTURES_DIR = Path(__file__).resolve().parents[2] / "packages/rosbag/fixtures"
+
+PHASES = ["index", "compile", "chunks", "records", "decode"]
+
+SCAN_WORKERS = [1, 2, 4, 8, 16]
+
+SYNTHETIC_TOPICS = ["/scan", "/odom", "/status"]
+SYNTHETIC_DEFINITION = "uint32 seq\ntime stamp\nfloat32[] ranges\nstring label\n"
+
+# Per-topic message count and total size
+TopicStats = Dict[str, Tuple[int, int]]
+
+
+def profile_bag(path: Path, parse: bool = True) -> Dict[str, float]:
+    """Read every message of the bag at *path*; returns seconds per phase."""
+
+    timings = dict.fromkeys(PHASES, 0.0)
+    clock = time.perf_counter
+    with BagReader(path, default_codecs(), workers=0) as reader:
+        start = clock()
+        header = reader.read_header()
+        connections, chunk_infos = reader.read_connections_and_chunk_info(
+            header.indexPosition, header.connectionCount, header.chunkCount
+        )
+        timings["index"] = clock() - start
+
+        readers = {}
+        if parse:
+            start = clock()
+            readers = {c.conn: c.reader for c in connections}
+            timings["compile"] = clock() - start
+
+        for info in chunk_infos:
+            start = clock()
+            chunk, indices = reader.read_chunk(info)
+            timings["chunks"] += clock() - start
+
+            start = clock()
+            records = [
+                reader.read_message_data(
+                    chunk.data, entry.offset, index.conn, entry.time
+                )
+                for index in indices
+                for entry in index.indices
+            ]
+            timings["records"] += clock() - start
+
+            if parse:
+                start = clock()
+                for record in records:
+                    readers[record.conn].read_message(record.data)
+                timings["decode"] += clock() - start
+    return timings
+
+
+def write_synthetic_bag(
+    path: Path,
+    count: int,
+    compression: str = "none",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    seed: int = 0,
+) -> Path:
+    """Write *count* messages spread over :data:`SYNTHETIC_TOPICS`, 100 Hz each."""
+
+    rng = random.Random(seed)
+    with BagWriter(path, compression, chunk_size) as writer:
+        ids = [
+            writer.add_connection(topic, "bench/Synthetic", "*", SYNTHETIC_DEFINITION)
+            for topic in SYNTHETIC_TOPICS
+        ]
+        for seq in range(count):
+            stamp = from_nanosec(1_600_000_000 * 10**9 + seq * 10**7 // len(ids))
+            ranges = [rng.random() for _ in range(rng.randrange(16, 256))]
+            label = f"frame {seq}".encode()
+            data = (
+                struct.pack("<III", seq, stamp.sec, stamp.nsec)
+                + struct.pack(f"<I{len(ranges)}f", len(ranges), *ranges)
+                + struct.pack("<I", len(label))
+                + label
+            )
+            writer.write(ids[seq % len(ids)], stamp, data)
+    return path
+
+
+def topic_stats(stats: TopicStats, event: MessageEvent) -> TopicStats:
+    count, size = stats.get(event.topic, (0, 0))
+    stats[event.topic] = (count + 1, size + len(event.data))
+    return stats
+
+
+def merge_topic_stats(left: TopicStats, right: TopicStats) -> TopicStats:
+    for topic, (count, size) in right.items():
+        total_count, total_size = left.get(topic, (0, 0))
+        left[topic] = (total_count + count, total_size + size)
+    return left
+
+
+def profile_scan(
+    path: Path, workers: Iterable[int] = SCAN_WORKERS, parse: bool = True
+) -> Dict[int, float]:
+    """Scan the bag at *path* with each number of *workers*; returns seconds."""
+
+    timings = {}
+    expected = None
+    for count in workers:
+        start = time.perf_counter()
+        stats = scan_bag(
+            path,
+            topic_stats,
+            dict,
+            merge_topic_stats,
+            workers=count,
+            decompress=default_codecs(),
+            parse=parse,
+        )
+        timings[count] = time.perf_counter() - start
+        if expected is not None and stats != expected:
+            raise ValueError(f"Scan with {count} workers differs from the first")
+        expected = stats
+    return timings
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--no-parse", action="store_true")
+    parser.add_argument("--scan", action="store_true")
+    parser.add_argument("--synthetic", type=int, metavar="N")
+    parser.add_argument("bags", nargs="*", type=Path)
+    args = parser.parse_args(argv)
+
+    bags = list(args.bags)
+    directory = tempfile.TemporaryDirectory()
+    if args.synthetic:
+        bags.append(
+            write_synthetic_bag(Path(directory.name) / "synthetic.bag", args.synthetic)
+        )
+    for path in bags or [FIXTURES_DIR / "example.bag"]:
+        timings = profile_bag(path, not args.no_parse)
+        total = sum(timings.values())
+        size = path.stat().st_size
+        print(f"{path.name}: {size / 1e6:.1f} MB in {total:.3f}s")
+        for phase in PHASES:
+            seconds = timings[phase]
+            share = seconds / total * 100 if total else 0.0
+            print(f"  {phase:<8} {seconds:>9.4f}s {share:>5.1f}%")
+        if args.scan:
+            timings = profile_scan(path, parse=not args.no_parse)
+            baseline = next(iter(timings.values()))
+            for workers, seconds in timings.items():
+                speedup = baseline / seconds
+                print(f"  scan x{workers:<3} {seconds:>9.4f}s {speedup:>5.2f}x")
+    directory.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Chunk compression codecs and the cache of decompressed chunks.
+
+``bz2`` is always available. ``lz4`` chunks, which ROS writes in the LZ4 frame
+format, need the ``lz4`` package. Other codecs, or faster implementations,
+can be passed to :class:`BagReader` as functions of the compressed data and
+the uncompressed size, and to :class:`BagWriter` as functions of the data.
+"""
+
+from __future__ import annotations
+
+import bz2
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Hashable, NamedTuple, Optional, TypeVar
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # pragma: no cover - depends on the environment
+    lz4_frame = None
+
+HAVE_LZ4 = lz4_frame is not None
+
+T = TypeVar("T")
+
+# Decompresses a chunk's data given its uncompressed size
+Decompress = Callable[[memoryview, int], Any]
+# Compresses a chunk's data
+Compress = Callable[[bytes], bytes]
+
+# Default size of the decompressed-chunk cache of a reader
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+
+
+def decompress_bz2(data: memoryview, size: int) -> bytes:
+    return bz2.decompress(data)
+
+
+def decompress_lz4(data: memoryview, size: int) -> bytes:
+    if lz4_frame is None:
+        raise ValueError("The lz4 package is required to read lz4 chunks")
+    return lz4_frame.decompress(data)
+
+
+def default_codecs() -> Dict[str, Decompress]:
+    """The built-in decompression functions by compression name."""
+
+    codecs: Dict[str, Decompress] = {"bz2": decompress_bz2}
+    if lz4_frame is not None:
+        codecs["lz4"] = decompress_lz4
+    return codecs
+
+
+def default_compressors() -> Dict[str, Compress]:
+    """The built-in compression functions by compression name."""
+
+    compressors: Dict[str, Compress] = {"bz2": bz2.compress}
+    if lz4_frame is not None:
+        compressors["lz4"] = lz4_frame.compress
+    return compressors
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    entries: int
+    nbytes: int
+    maxBytes: int
+
+
+class ChunkCache(Generic[T]):
+    """Thread-safe LRU cache bounded by the total size of its entries.
+
+    An entry larger than the whole cache is not stored.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, tuple[T, int]] = OrderedDict()
+        self._nbytes = 0
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: Hashable) -> Optional[T]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: T, nbytes: int) -> None:
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._nbytes -= old[1]
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = (value, nbytes)
+            self._nbytes += nbytes
+            while self._nbytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._nbytes -= evicted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def cache_info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(
+                self._hits,
+                self._misses,
+                len(self._entries),
+                self._nbytes,
+                self.max_bytes,
+            )
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,199 @@
+"""Summaries of bag files, like ``rosbag info``.
+
+Run with ``python -m python_ros.rosbag.info [--json] BAG...``. Only the bag
+header, the connection and chunk-info records at the end of the file and the
+header of each chunk record are read; chunk data is never touched, so the
+cost depends on the size of the index and not of the bag.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from typing import IO, Any, Dict, List, Optional, Union
+
+from python_ros.rostime import Time, subtract, to_rfc3339_string, to_sec
+
+from .bag import Bag
+
+
+@dataclass
+class TopicInfo:
+    """Message count of a topic, summed over its connections."""
+
+    topic: str
+    type: str
+    md5sum: str
+    messageCount: int = 0
+    connectionCount: int = 0
+
+
+@dataclass
+class CompressionInfo:
+    """Chunks using one compression, with their stored and uncompressed sizes."""
+
+    compression: str
+    chunkCount: int = 0
+    compressedSize: int = 0
+    uncompressedSize: int = 0
+
+    @property
+    def ratio(self) -> float:
+        """Stored size as a fraction of the uncompressed size."""
+
+        if not self.uncompressedSize:
+            return 1.0
+        return self.compressedSize / self.uncompressedSize
+
+
+@dataclass
+class BagInfo:
+    """What ``rosbag info`` reports about a bag.
+
+    ``startTime`` and ``endTime`` are ``None`` for a bag without messages.
+    """
+
+    path: Optional[str]
+    size: int
+    startTime: Optional[Time]
+    endTime: Optional[Time]
+    messageCount: int
+    chunkCount: int
+    topics: List[TopicInfo] = field(default_factory=list)
+    compression: List[CompressionInfo] = field(default_factory=list)
+
+    @property
+    def duration(self) -> Time:
+        if self.startTime is None or self.endTime is None:
+            return Time(0, 0)
+        return subtract(self.endTime, self.startTime)
+
+    @property
+    def compressionRatio(self) -> float:
+        """Stored size of all chunks as a fraction of their uncompressed size."""
+
+        total = sum(c.uncompressedSize for c in self.compression)
+        if not total:
+            return 1.0
+        return sum(c.compressedSize for c in self.compression) / total
+
+    def to_dict(self) -> Dict[str, Any]:
+        """A JSON-compatible summary with RFC 3339 times."""
+
+        result = asdict(self)
+        for key in ("startTime", "endTime"):
+            time = getattr(self, key)
+            result[key] = None if time is None else to_rfc3339_string(time)
+        result["duration"] = to_sec(self.duration)
+        result["compressionRatio"] = self.compressionRatio
+        for entry, compression in zip(result["compression"], self.compression):
+            entry["ratio"] = compression.ratio
+        return result
+
+
+def bag_info(source: Union[str, os.PathLike, IO[bytes]]) -> BagInfo:
+    """Summarize the bag at *source* from its index records."""
+
+    with Bag(source, parse=False) as bag:
+        topics: Dict[str, TopicInfo] = {}
+        counts: Dict[int, int] = {}
+        for info in bag.chunkInfos:
+            for conn, count in info.connections.items():
+                counts[conn] = counts.get(conn, 0) + count
+        for conn, connection in bag.connections.items():
+            topic = topics.get(connection.topic)
+            if topic is None:
+                topic = topics[connection.topic] = TopicInfo(
+                    connection.topic, connection.type, connection.md5sum
+                )
+            topic.messageCount += counts.get(conn, 0)
+            topic.connectionCount += 1
+
+        compression: Dict[str, CompressionInfo] = {}
+        for info in bag.chunkInfos:
+            chunk = bag.reader.read_chunk_header(info)
+            entry = compression.get(chunk.compression)
+            if entry is None:
+                entry = compression[chunk.compression] = CompressionInfo(
+                    chunk.compression
+                )
+            entry.chunkCount += 1
+            entry.compressedSize += len(chunk.data)
+            entry.uncompressedSize += chunk.size
+
+        path = source if isinstance(source, (str, os.PathLike)) else None
+        return BagInfo(
+            None if path is None else os.fspath(path),
+            bag.reader.size,
+            bag.startTime,
+            bag.endTime,
+            sum(counts.values()),
+            len(bag.chunkInfos),
+            sorted(topics.values(), key=lambda t: t.topic),
+            sorted(compression.values(), key=lambda c: c.compression),
+        )
+
+
+def format_info(info: BagInfo) -> str:
+    """Lay out *info* the way ``rosbag info`` does."""
+
+    lines = []
+    if info.path is not None:
+        lines.append(("path", info.path))
+    lines.append(("size", _format_size(info.size)))
+    if info.startTime is not None and info.endTime is not None:
+        lines.append(("duration", f"{to_sec(info.duration):.3f}s"))
+        lines.append(("start", to_rfc3339_string(info.startTime)))
+        lines.append(("end", to_rfc3339_string(info.endTime)))
+    lines.append(("messages", str(info.messageCount)))
+    for index, entry in enumerate(info.compression):
+        text = (
+            f"{entry.compression} [{entry.chunkCount}/{info.chunkCount} chunks; "
+            f"{entry.ratio * 100:.2f}%]"
+        )
+        lines.append(("compression" if index == 0 else "", text))
+    types = sorted({(t.type, t.md5sum) for t in info.topics})
+    for index, (type, md5sum) in enumerate(types):
+        lines.append(("types" if index == 0 else "", f"{type} [{md5sum}]"))
+    width = max((len(t.topic) for t in info.topics), default=0)
+    count_width = max((len(str(t.messageCount)) for t in info.topics), default=0)
+    for index, topic in enumerate(info.topics):
+        text = (
+            f"{topic.topic:<{width}}  {topic.messageCount:>{count_width}} msgs"
+            f" : {topic.type}"
+        )
+        if topic.connectionCount > 1:
+            text += f" ({topic.connectionCount} connections)"
+        lines.append(("topics" if index == 0 else "", text))
+    return "\n".join(
+        f"{name + ':' if name else '':<13}{value}" for name, value in lines
+    )
+
+
+def _format_size(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            break
+        size /= 1024
+    return f"{size:.1f} {unit}"
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--json", action="store_true", help="print JSON")
+    parser.add_argument("bags", nargs="+")
+    args = parser.parse_args(argv)
+
+    infos = [bag_info(path) for path in args.bags]
+    if args.json:
+        print(json.dumps([info.to_dict() for info in infos], indent=2))
+    else:
+        print("\n\n".join(map(format_info, infos)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""Time-ordered iteration over the messages of a bag, forwards or backwards.
+
+The iterators only read chunks whose chunk-info record overlaps the requested
+time range and lists one of the requested connections. Chunks are taken in
+groups: the first remaining chunk and every chunk that overlaps it. The
+messages of a group that fall in the time window the group covers are
+merged with a heap, then the window moves past it. Chunks that extend beyond
+the window are read again for the next group, from the reader's chunk
+cache. Only the chunks of one group are held at a time.
+"""
+
+from __future__ import annotations
+
+import heapq
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from functools import cmp_to_key
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+from python_ros.rostime import Time, add, compare, subtract, to_nanosec
+
+from .reader import BagReader
+from .records import ChunkInfo, Connection, MessageData
+
+_ONE_NSEC = Time(0, 1)
+
+
+@dataclass
+class MessageEvent:
+    """A message yielded by :class:`ForwardIterator` or :class:`ReverseIterator`.
+
+    ``data`` is the serialized message, a ``memoryview`` into the bag that is
+    valid while the bag is open. ``message`` is ``None`` if parsing was off.
+    """
+
+    topic: str
+    timestamp: Time
+    data: memoryview
+    connectionId: int
+    message: Any = None
+
+
+def _message_time(record: MessageData) -> int:
+    return to_nanosec(record.time)
+
+
+class BaseIterator(ABC):
+    """Yields the messages on *topics* within ``[start_time, end_time]``.
+
+    The chunks are read through *reader*, whose pool decompresses the chunks
+    of a group in parallel.
+    """
+
+    reverse = False
+
+    def __init__(
+        self,
+        reader: BagReader,
+        connections: Dict[int, Connection],
+        chunk_infos: Iterable[ChunkInfo],
+        topics: Optional[Iterable[str]] = None,
+        start_time: Optional[Time] = None,
+        end_time: Optional[Time] = None,
+        parse: bool = True,
+    ) -> None:
+        self.reader = reader
+        self.connections = connections
+        self.parse = parse
+        self.startTime = start_time
+        self.endTime = end_time
+        self.connectionIds: Optional[Set[int]] = None
+        if topics is not None:
+            wanted = set(topics)
+            self.connectionIds = {
+                conn for conn, c in connections.items() if c.topic in wanted
+            }
+        self.chunkInfos = [
+            info
+            for info in chunk_infos
+            if (end_time is None or compare(info.startTime, end_time) <= 0)
+            and (start_time is None or compare(start_time, info.endTime) <= 0)
+            and (
+                self.connectionIds is None
+                or not self.connectionIds.isdisjoint(info.connections)
+            )
+        ]
+
+    @abstractmethod
+    def load_next(self) -> Optional[Iterator[MessageData]]:
+        """The merged messages of the next group of chunks, ``None`` at the end."""
+
+    def __iter__(self) -> Iterator[MessageEvent]:
+        connections = self.connections
+        while True:
+            records = self.load_next()
+            if records is None:
+                return
+            for record in records:
+                connection = connections.get(record.conn)
+                if connection is None:
+                    raise ValueError(f"Unable to find connection with id {record.conn}")
+                yield MessageEvent(
+                    connection.topic,
+                    record.time,
+                    record.data,
+                    record.conn,
+                    connection.reader.read_message(record.data) if self.parse else None,
+                )
+
+    def _read_group(
+        self, group: List[ChunkInfo], start: Optional[Time], end: Optional[Time]
+    ) -> Iterator[MessageData]:
+        futures = [self.reader.load_chunk(info) for info in group]
+        streams = []
+        for info, future in zip(group, futures):
+            messages = self.reader.chunk_messages(
+                future.result(), info, self.connectionIds, start, end
+            )
+            streams.append(reversed(messages) if self.reverse else messages)
+        return heapq.merge(*streams, key=_message_time, reverse=self.reverse)
+
+
+class ForwardIterator(BaseIterator):
+    """Yields messages in increasing time order."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        # Chunks by increasing start time
+        self.remainingChunkInfos = sorted(
+            self.chunkInfos,
+            key=cmp_to_key(lambda a, b: compare(a.startTime, b.startTime)),
+        )
+        self.position = self.startTime
+
+    def load_next(self) -> Optional[Iterator[MessageData]]:
+        remaining = self.remainingChunkInfos
+        if not remaining:
+            return None
+        first, *rest = remaining
+        end = first.endTime
+        group = [first]
+        self.remainingChunkInfos = []
+        for index, info in enumerate(rest):
+            # Later chunks start after the window; keep them for the next one
+            if compare(info.startTime, end) > 0:
+                self.remainingChunkInfos.extend(rest[index:])
+                break
+            group.append(info)
+            # A chunk that ends within the window has been fully read
+            if compare(info.endTime, end) > 0:
+                self.remainingChunkInfos.append(info)
+
+        start = self.position
+        self.position = add(end, _ONE_NSEC)
+        if self.endTime is not None and compare(self.endTime, end) < 0:
+            end = self.endTime
+        return self._read_group(group, start, end)
+
+
+class ReverseIterator(BaseIterator):
+    """Yields messages in decreasing time order."""
+
+    reverse = True
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        # Chunks by decreasing end time
+        self.remainingChunkInfos = sorted(
+            self.chunkInfos,
+            key=cmp_to_key(lambda a, b: compare(b.endTime, a.endTime)),
+        )
+        self.position = self.endTime
+
+    def load_next(self) -> Optional[Iterator[MessageData]]:
+        remaining = self.remainingChunkInfos
+        if not remaining:
+            return None
+        first, *rest = remaining
+        start = first.startTime
+        group = [first]
+        self.remainingChunkInfos = []
+        for index, info in enumerate(rest):
+            # Later chunks end before the window; keep them for the next one
+            if compare(info.endTime, start) < 0:
+                self.remainingChunkInfos.extend(rest[index:])
+                break
+            group.append(info)
+            # A chunk that starts within the window has been fully read
+            if compare(info.startTime, start) < 0:
+                self.remainingChunkInfos.append(info)
+
+        end = self.position
+        self.position = subtract(start, _ONE_NSEC)
+        if self.startTime is not None and compare(self.startTime, start) > 0:
+            start = self.startTime
+        return self._read_group(group, start, end)
@@ -0,0 +1,385 @@
+"""Low-level access to the records of a ROS bag file through ``mmap``.
+
+:class:`BagReader` maps the whole file read-only and parses records in place,
+so reading a chunk only touches the pages it spans and message payloads are
+``memoryview`` slices of the mapping rather than copies. The views stay valid
+until the reader is closed.
+
+Compressed chunks are decompressed on a thread pool; ``bz2`` and ``lz4``
+release the GIL while they work, so :meth:`BagReader.iter_chunks` decompresses
+the next chunks while the current one is being read. Decompressed chunks are
+kept in a :class:`ChunkCache` so that overlapping reads reuse them.
+"""
+
+from __future__ import annotations
+
+import heapq
+import mmap
+import os
+import struct
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice, repeat
+from typing import (
+    IO,
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
+
+from python_ros.rostime import Time, compare
+
+from .chunks import DEFAULT_CACHE_BYTES, ChunkCache, Decompress
+from .records import (
+    INT32,
+    BagHeader,
+    Chunk,
+    ChunkInfo,
+    Connection,
+    IndexData,
+    IndexEntry,
+    MessageData,
+    Record,
+    extract_fields,
+)
+
+R = TypeVar("R", bound=Record)
+
+MAGIC = b"#ROSBAG V2.0\n"
+HEADER_OFFSET = len(MAGIC)
+
+# The op field of a message record header, length prefix included
+_MESSAGE_OP = b"\x04\x00\x00\x00op=\x02"
+
+
+class ChunkReadResult(NamedTuple):
+    """A chunk with its data decompressed, and the index records after it."""
+
+    chunk: Chunk
+    indices: List[IndexData]
+
+
+class BagReader:
+    """Reads the header, index and chunk records of a bag file.
+
+    *source* is a path or a binary file object opened for reading; a file
+    object is not closed by :meth:`close`. *decompress* maps compression names
+    to functions that decompress chunk data given its uncompressed size, such
+    as :func:`default_codecs`.
+
+    Up to *workers* chunks are decompressed at once, ``None`` being the
+    default of :class:`ThreadPoolExecutor` and ``0`` decompressing in the
+    calling thread. :meth:`iter_chunks` loads *prefetch* chunks ahead, one per
+    CPU by default. Chunks are cached up to *cache_bytes* of decompressed data
+    and index entries.
+    """
+
+    def __init__(
+        self,
+        source: Union[str, os.PathLike, IO[bytes]],
+        decompress: Optional[Mapping[str, Decompress]] = None,
+        workers: Optional[int] = None,
+        prefetch: Optional[int] = None,
+        cache_bytes: int = DEFAULT_CACHE_BYTES,
+    ) -> None:
+        if isinstance(source, (str, os.PathLike)):
+            self._file: IO[bytes] = open(source, "rb")
+            self._owns_file = True
+        else:
+            self._file = source
+            self._owns_file = False
+        self.decompress: Dict[str, Decompress] = dict(decompress or {})
+        self.size = os.fstat(self._file.fileno()).st_size
+        self._mmap: Optional[mmap.mmap] = None
+        self._view = memoryview(b"")
+        if self.size:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._mmap)
+        self.workers = workers
+        self.prefetch = (os.cpu_count() or 1) if prefetch is None else prefetch
+        self.cache: ChunkCache[ChunkReadResult] = ChunkCache(cache_bytes)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: Dict[int, Future[ChunkReadResult]] = {}
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        """Unmap the file.
+
+        The mapping outlives this call while ``memoryview`` payloads handed out
+        by the reader are still referenced; it is released with the last one.
+        Chunks still being decompressed are waited for first.
+        """
+
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+        self.cache.clear()
+        self._view.release()
+        self._view = memoryview(b"")
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass
+            self._mmap = None
+        if self._owns_file:
+            self._file.close()
+
+    def __enter__(self) -> BagReader:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def read(self, offset: int, length: int) -> memoryview:
+        """A view of *length* bytes of the file at *offset*."""
+
+        if offset < 0 or offset + length > self.size:
+            available = max(0, min(length, self.size - offset))
+            raise ValueError(
+                f"Attempted to read {length} bytes at offset {offset} but only "
+                f"{available} were available"
+            )
+        return self._view[offset : offset + length]
+
+    def verify_bag_header(self) -> None:
+        if bytes(self.read(0, HEADER_OFFSET)) != MAGIC:
+            raise ValueError("Cannot identify bag format.")
+
+    def read_header(self) -> BagHeader:
+        self.verify_bag_header()
+        header, _ = self.read_record(self._view, HEADER_OFFSET, BagHeader)
+        return header
+
+    def read_connections_and_chunk_info(
+        self, index_position: int, connection_count: int, chunk_count: int
+    ) -> Tuple[List[Connection], List[ChunkInfo]]:
+        """Read the connection and chunk-info records at the end of the file."""
+
+        if connection_count == 0:
+            return [], []
+        connections, offset = self.read_records(
+            self._view, index_position, connection_count, Connection
+        )
+        chunk_infos, _ = self.read_records(self._view, offset, chunk_count, ChunkInfo)
+        return connections, chunk_infos
+
+    def read_chunk_header(self, chunk_info: ChunkInfo) -> Chunk:
+        """The chunk record of *chunk_info* with its data left compressed.
+
+        Only the record header is parsed; the chunk data is not read.
+        """
+
+        chunk, _ = self.read_record(self._view, chunk_info.chunkPosition, Chunk)
+        return chunk
+
+    def read_chunk(self, chunk_info: ChunkInfo) -> ChunkReadResult:
+        """Read and decompress a chunk and read the index records after it."""
+
+        return self.load_chunk(chunk_info).result()
+
+    def load_chunk(self, chunk_info: ChunkInfo) -> Future[ChunkReadResult]:
+        """Start reading a chunk; compressed data is decompressed on the pool.
+
+        A chunk that is cached or already being loaded is not loaded again.
+        Errors are raised by the future's ``result()``.
+        """
+
+        position = chunk_info.chunkPosition
+        with self._lock:
+            future = self._pending.get(position)
+            if future is not None:
+                return future
+            future = Future()
+            cached = self.cache.get(position)
+            if cached is not None:
+                future.set_result(cached)
+                return future
+            try:
+                chunk, end = self.read_record(self._view, position, Chunk)
+                indices, index_end = self.read_records(
+                    self._view, end, chunk_info.count, IndexData
+                )
+                if chunk.compression == "none" or self.workers == 0:
+                    future.set_result(self._load(chunk, indices, index_end - end))
+                    return future
+            except Exception as error:
+                future.set_exception(error)
+                return future
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    self.workers, thread_name_prefix="rosbag-decompress"
+                )
+            future = self._executor.submit(self._load, chunk, indices, index_end - end)
+            self._pending[position] = future
+        future.add_done_callback(lambda _: self._forget(position))
+        return future
+
+    def iter_chunks(
+        self, chunk_infos: Iterable[ChunkInfo]
+    ) -> Iterator[ChunkReadResult]:
+        """Read chunks in order while loading the next :attr:`prefetch` ones."""
+
+        infos = iter(chunk_infos)
+        window = deque(map(self.load_chunk, islice(infos, self.prefetch + 1)))
+        while window:
+            future = window.popleft()
+            window.extend(map(self.load_chunk, islice(infos, 1)))
+            yield future.result()
+
+    def _load(
+        self, chunk: Chunk, indices: List[IndexData], index_bytes: int
+    ) -> ChunkReadResult:
+        chunk.data = self.decompress_chunk(chunk)
+        result = ChunkReadResult(chunk, indices)
+        # Uncompressed data stays in the mapping; only count what is held
+        nbytes = (
+            index_bytes if chunk.compression == "none" else index_bytes + chunk.size
+        )
+        self.cache.put(chunk.offset, result, nbytes)
+        return result
+
+    def _forget(self, position: int) -> None:
+        with self._lock:
+            self._pending.pop(position, None)
+
+    def decompress_chunk(self, chunk: Chunk) -> Any:
+        if chunk.compression == "none":
+            return chunk.data
+        decompress = self.decompress.get(chunk.compression)
+        if decompress is None:
+            raise ValueError(f"Unsupported compression type {chunk.compression}")
+        data = decompress(chunk.data, chunk.size)
+        if len(data) != chunk.size:
+            raise ValueError(
+                f"Decompressed chunk at {chunk.offset} has {len(data)} bytes, "
+                f"expected {chunk.size}"
+            )
+        return memoryview(data)
+
+    def read_chunk_messages(
+        self,
+        chunk_info: ChunkInfo,
+        connections: Optional[Iterable[int]] = None,
+        start_time: Optional[Time] = None,
+        end_time: Optional[Time] = None,
+    ) -> List[MessageData]:
+        """Messages of *connections* in a chunk within ``[start_time, end_time]``.
+
+        The per-connection indexes are merged, so messages come in time order.
+        """
+
+        return self.chunk_messages(
+            self.read_chunk(chunk_info), chunk_info, connections, start_time, end_time
+        )
+
+    def chunk_messages(
+        self,
+        result: ChunkReadResult,
+        chunk_info: ChunkInfo,
+        connections: Optional[Iterable[int]] = None,
+        start_time: Optional[Time] = None,
+        end_time: Optional[Time] = None,
+    ) -> List[MessageData]:
+        """Like :meth:`read_chunk_messages` for a chunk that was already read."""
+
+        if connections is None:
+            connections = chunk_info.connections
+        wanted = set(connections)
+        indices = [index for index in result.indices if index.conn in wanted]
+        data = result.chunk.data
+        messages = []
+        for entry, conn in _merge_indices(indices):
+            time = entry.time
+            if start_time is not None and compare(time, start_time) < 0:
+                continue
+            if end_time is not None and compare(time, end_time) > 0:
+                break
+            messages.append(self.read_message_data(data, entry.offset, conn, time))
+        return messages
+
+    @staticmethod
+    def read_message_data(
+        buffer: memoryview, offset: int, conn: int, time: Time
+    ) -> MessageData:
+        """Read the message record at *offset* that an index entry points to.
+
+        The connection and time come from the index, so only the opcode of the
+        record header is checked instead of parsing all of its fields.
+        """
+
+        try:
+            (header_length,) = INT32.unpack_from(buffer, offset)
+            data_offset = offset + header_length + 8
+            (data_length,) = INT32.unpack_from(buffer, data_offset - 4)
+        except struct.error:
+            raise ValueError(f"Record at position {offset} is truncated.") from None
+        end = data_offset + data_length
+        if header_length < 0 or data_length < 0 or end > len(buffer):
+            raise ValueError(f"Record at position {offset} is truncated.")
+        if _MESSAGE_OP not in bytes(buffer[offset + 4 : data_offset - 4]):
+            raise ValueError(f"Expected MessageData ({MessageData.opcode}) at {offset}")
+        return MessageData(
+            offset, data_offset, end, conn, time, buffer[data_offset:end]
+        )
+
+    def read_records(
+        self, buffer: memoryview, offset: int, count: int, cls: Type[R]
+    ) -> Tuple[List[R], int]:
+        """Read *count* consecutive records; returns them and the end offset."""
+
+        records = []
+        for _ in range(count):
+            record, offset = self.read_record(buffer, offset, cls)
+            records.append(record)
+        return records, offset
+
+    @staticmethod
+    def read_record(buffer: memoryview, offset: int, cls: Type[R]) -> Tuple[R, int]:
+        """Read the record of type *cls* at *offset*; returns it and its end."""
+
+        available = len(buffer) - offset
+        if available < 8:
+            raise ValueError(f"Record at position {offset} is truncated.")
+        (header_length,) = INT32.unpack_from(buffer, offset)
+        if header_length < 0 or header_length + 8 > available:
+            raise ValueError(
+                f"Record at position {offset} header too large: {header_length}."
+            )
+        header_start = offset + 4
+        data_offset = header_start + header_length + 4
+        fields = extract_fields(buffer[header_start : data_offset - 4])
+        op = fields.get("op")
+        if op is None:
+            raise ValueError("Record is missing 'op' field.")
+        if op[:1] != bytes((cls.opcode,)):
+            found = op[0] if op else None
+            raise ValueError(
+                f"Expected {cls.__name__} ({cls.opcode}) but found {found}"
+            )
+        (data_length,) = INT32.unpack_from(buffer, data_offset - 4)
+        end = data_offset + data_length
+        if data_length < 0 or end > len(buffer):
+            raise ValueError(f"Record at position {offset} data is truncated.")
+        data = buffer[data_offset:end]
+        record = cls.from_fields(fields, data, (offset, data_offset, end))
+        return record, end  # type: ignore[return-value]
+
+
+def _merge_indices(indices: List[IndexData]) -> Iterator[Tuple[IndexEntry, int]]:
+    """Merge the entries of several index records by time, with their conn."""
+
+    if len(indices) == 1:
+        conn = indices[0].conn
+        return ((entry, conn) for entry in indices[0].indices)
+    return heapq.merge(*(zip(index.indices, repeat(index.conn)) for index in indices))
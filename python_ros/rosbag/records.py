@@ -0,0 +1,278 @@
+"""Records of the ROS bag format 2.0.
+
+Every record is a length-prefixed header of ``name=value`` fields followed by
+a length-prefixed data section. The classes here mirror the record types of
+the format and are built by :meth:`BagReader.read_record`. ``data`` sections
+stay ``memoryview`` slices of the buffer they were read from.
+"""
+
+from __future__ import annotations
+
+import struct
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, ClassVar, Dict, List, NamedTuple, Optional
+
+from python_ros.message_definition import MessageDefinition
+from python_ros.rosmsg import cached_parse
+from python_ros.rosmsg_serialization import MessageReader
+from python_ros.rostime import Time
+
+INT32 = struct.Struct("<i")
+UINT32 = struct.Struct("<I")
+UINT64 = struct.Struct("<Q")
+TIME = struct.Struct("<II")
+
+# An index entry: the time and the offset of a message in the chunk data
+_INDEX_ENTRY = struct.Struct("<III")
+# A chunk-info entry: the connection id and its message count in the chunk
+_CHUNK_CONNECTION = struct.Struct("<II")
+
+Fields = Dict[str, bytes]
+
+
+def extract_fields(buffer: Any) -> Fields:
+    """Split a record header into its ``name=value`` fields."""
+
+    if len(buffer) < 4:
+        raise ValueError("fields are truncated.")
+    view = memoryview(buffer)
+    fields: Fields = {}
+    offset = 0
+    end = len(view)
+    while offset < end:
+        if offset + 4 > end:
+            raise ValueError("Header fields are truncated.")
+        (length,) = INT32.unpack_from(view, offset)
+        offset += 4
+        if length < 0 or offset + length > end:
+            raise ValueError("Header fields are corrupt.")
+        entry = bytes(view[offset : offset + length])
+        offset += length
+        name, equals, value = entry.partition(b"=")
+        if not equals:
+            raise ValueError("Header field is missing equals sign.")
+        fields[name.decode("utf-8")] = value
+    return fields
+
+
+def extract_time(buffer: bytes, offset: int = 0) -> Time:
+    sec, nsec = TIME.unpack_from(buffer, offset)
+    return Time(sec, nsec)
+
+
+def _required(fields: Fields, name: str, record: str) -> bytes:
+    value = fields.get(name)
+    if value is None:
+        raise ValueError(f"{record} header is missing {name}.")
+    return value
+
+
+@dataclass
+class Record(ABC):
+    """Position of a record in the buffer it was read from.
+
+    ``offset`` is where the record starts, ``dataOffset`` where its data
+    section starts and ``end`` the offset just past the record.
+    """
+
+    opcode: ClassVar[int] = -1
+
+    offset: int
+    dataOffset: int
+    end: int
+
+    @property
+    def length(self) -> int:
+        return self.end - self.offset
+
+    @classmethod
+    @abstractmethod
+    def from_fields(cls, fields: Fields, data: memoryview, position: Any) -> Record:
+        """Build the record from its header *fields* and *data* section."""
+
+
+@dataclass
+class BagHeader(Record):
+    opcode: ClassVar[int] = 3
+
+    indexPosition: int
+    connectionCount: int
+    chunkCount: int
+
+    @classmethod
+    def from_fields(cls, fields: Fields, data: memoryview, position: Any) -> BagHeader:
+        return cls(
+            *position,
+            UINT64.unpack(_required(fields, "index_pos", "Bag"))[0],
+            INT32.unpack(_required(fields, "conn_count", "Bag"))[0],
+            INT32.unpack(_required(fields, "chunk_count", "Bag"))[0],
+        )
+
+
+@dataclass
+class Chunk(Record):
+    """A chunk of message and connection records, possibly compressed.
+
+    ``size`` is the uncompressed size of ``data``.
+    """
+
+    opcode: ClassVar[int] = 5
+
+    compression: str
+    size: int
+    data: Any
+
+    @classmethod
+    def from_fields(cls, fields: Fields, data: memoryview, position: Any) -> Chunk:
+        return cls(
+            *position,
+            _required(fields, "compression", "Chunk").decode("utf-8"),
+            UINT32.unpack(_required(fields, "size", "Chunk"))[0],
+            data,
+        )
+
+
+@dataclass
+class Connection(Record):
+    """A topic with its message type, whose definition is parsed on first use."""
+
+    opcode: ClassVar[int] = 7
+
+    conn: int
+    topic: str
+    type: str
+    md5sum: str
+    messageDefinition: str
+    callerid: Optional[str] = None
+    latching: Optional[bool] = None
+    _definitions: Optional[List[MessageDefinition]] = field(
+        default=None, repr=False, compare=False
+    )
+    _reader: Optional[MessageReader] = field(default=None, repr=False, compare=False)
+
+    @classmethod
+    def from_fields(cls, fields: Fields, data: memoryview, position: Any) -> Connection:
+        header = extract_fields(data)
+        callerid = header.get("callerid")
+        latching = header.get("latching")
+        return cls(
+            *position,
+            UINT32.unpack(_required(fields, "conn", "Connection"))[0],
+            _required(fields, "topic", "Connection").decode("utf-8"),
+            _required(header, "type", "Connection").decode("utf-8"),
+            _required(header, "md5sum", "Connection").decode("utf-8"),
+            _required(header, "message_definition", "Connection").decode("utf-8"),
+            None if callerid is None else callerid.decode("utf-8"),
+            None if latching is None else latching == b"1",
+        )
+
+    @property
+    def definitions(self) -> List[MessageDefinition]:
+        """The parsed message definition, shared between equal definitions."""
+
+        if self._definitions is None:
+            self._definitions = cached_parse(self.messageDefinition)
+        return self._definitions
+
+    @property
+    def reader(self) -> MessageReader:
+        """A compiled :class:`MessageReader` for the messages of this connection."""
+
+        if self._reader is None:
+            self._reader = MessageReader(self.definitions)
+        return self._reader
+
+
+@dataclass
+class MessageData(Record):
+    opcode: ClassVar[int] = 2
+
+    conn: int
+    time: Time
+    data: memoryview
+
+    @classmethod
+    def from_fields(
+        cls, fields: Fields, data: memoryview, position: Any
+    ) -> MessageData:
+        return cls(
+            *position,
+            UINT32.unpack(_required(fields, "conn", "Message"))[0],
+            extract_time(_required(fields, "time", "Message")),
+            data,
+        )
+
+
+class IndexEntry(NamedTuple):
+    """Time of a message and the offset of its record in the chunk data.
+
+    Entries sort by time, then offset.
+    """
+
+    sec: int
+    nsec: int
+    offset: int
+
+    @property
+    def time(self) -> Time:
+        return Time(self.sec, self.nsec)
+
+
+@dataclass
+class IndexData(Record):
+    opcode: ClassVar[int] = 4
+
+    ver: int
+    conn: int
+    count: int
+    indices: List[IndexEntry]
+
+    @classmethod
+    def from_fields(cls, fields: Fields, data: memoryview, position: Any) -> IndexData:
+        count = UINT32.unpack(_required(fields, "count", "Index"))[0]
+        if len(data) < count * _INDEX_ENTRY.size:
+            raise ValueError(f"Index data is truncated: {count} entries expected.")
+        entries = data[: count * _INDEX_ENTRY.size]
+        return cls(
+            *position,
+            UINT32.unpack(_required(fields, "ver", "Index"))[0],
+            UINT32.unpack(_required(fields, "conn", "Index"))[0],
+            count,
+            list(map(IndexEntry._make, _INDEX_ENTRY.iter_unpack(entries))),
+        )
+
+
+@dataclass
+class ChunkInfo(Record):
+    """Time range and per-connection message counts of one chunk.
+
+    ``connections`` maps connection ids to their message count in the chunk.
+    """
+
+    opcode: ClassVar[int] = 6
+
+    ver: int
+    chunkPosition: int
+    startTime: Time
+    endTime: Time
+    count: int
+    connections: Dict[int, int]
+
+    @classmethod
+    def from_fields(cls, fields: Fields, data: memoryview, position: Any) -> ChunkInfo:
+        count = UINT32.unpack(_required(fields, "count", "Chunk info"))[0]
+        if len(data) < count * _CHUNK_CONNECTION.size:
+            raise ValueError(
+                f"Chunk info data is truncated: {count} connections expected."
+            )
+        entries = data[: count * _CHUNK_CONNECTION.size]
+        return cls(
+            *position,
+            UINT32.unpack(_required(fields, "ver", "Chunk info"))[0],
+            UINT64.unpack(_required(fields, "chunk_pos", "Chunk info"))[0],
+            extract_time(_required(fields, "start_time", "Chunk info")),
+            extract_time(_required(fields, "end_time", "Chunk info")),
+            count,
+            dict(_CHUNK_CONNECTION.iter_unpack(entries)),
+        )
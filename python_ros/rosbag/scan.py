@@ -0,0 +1,155 @@
+"""Scanning whole bags on several processes.
+
+:func:`scan_bag` splits the time range of a bag into windows holding about
+the same number of messages, each starting at the start of a chunk. Every
+window is scanned by a worker process that opens and maps the bag itself, so
+only the window bounds and the partial results cross process boundaries.
+Windows do not overlap, so each message is seen once; a chunk that spans two
+windows is read by both.
+"""
+
+from __future__ import annotations
+
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import reduce
+from typing import (
+    Any,
+    Callable,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+from python_ros.rostime import Time, compare, subtract
+
+from .bag import Bag
+from .chunks import Decompress
+from .iterators import MessageEvent
+
+A = TypeVar("A")
+
+# The inclusive time range of a window; None is unbounded
+Window = Tuple[Optional[Time], Optional[Time]]
+
+_ONE_NSEC = Time(0, 1)
+
+
+def scan_bag(
+    path: Union[str, os.PathLike],
+    reducer: Callable[[A, MessageEvent], A],
+    initial: Callable[[], A],
+    merge: Callable[[A, A], A],
+    topics: Optional[Iterable[str]] = None,
+    start_time: Optional[Time] = None,
+    end_time: Optional[Time] = None,
+    ordered: bool = False,
+    workers: Optional[int] = None,
+    partitions: Optional[int] = None,
+    decompress: Optional[Mapping[str, Decompress]] = None,
+    parse: bool = True,
+) -> A:
+    """Reduce the messages on *topics* within ``[start_time, end_time]``.
+
+    Each window starts from ``initial()`` and folds its messages, in time
+    order, with ``reducer(accumulator, event)``; the partial results are then
+    combined with ``merge(left, right)``. If *ordered*, the partial results
+    are merged in time order so that a non-commutative *merge* sees messages
+    in the order of the bag; otherwise they are merged as workers finish.
+
+    *reducer*, *initial* and *merge* must be picklable, e.g. module-level
+    functions. *workers* processes scan *partitions* windows, four per worker
+    by default; with ``workers=0`` the windows are scanned in this process.
+    """
+
+    topics = None if topics is None else list(topics)
+    with Bag(path, decompress, parse=False) as bag:
+        windows = partition_bag(
+            bag, partitions or 4 * (workers or os.cpu_count() or 1), topics
+        )
+    windows = _clip(windows, start_time, end_time)
+    tasks = [
+        (path, decompress, parse, topics, window, reducer, initial)
+        for window in windows
+    ]
+    if not tasks:
+        return initial()
+    if workers == 0:
+        return reduce(merge, [_scan_window(*task) for task in tasks])
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(_scan_window, *task) for task in tasks]
+        done = futures if ordered else as_completed(futures)
+        return reduce(merge, (future.result() for future in done))
+
+
+def partition_bag(
+    bag: Bag, partitions: int, topics: Optional[Iterable[str]] = None
+) -> List[Window]:
+    """Split the bag into at most *partitions* windows of similar message count.
+
+    Windows start at chunk start times and are in time order; only the
+    messages on *topics* are counted.
+    """
+
+    if topics is None:
+        ids = None
+    else:
+        wanted = set(topics)
+        ids = {conn for conn, c in bag.connections.items() if c.topic in wanted}
+    counts = []
+    for info in bag.chunkInfos:
+        count = sum(
+            n for conn, n in info.connections.items() if ids is None or conn in ids
+        )
+        if count:
+            counts.append((info.startTime, count))
+    if not counts:
+        return []
+    counts.sort(key=lambda entry: (entry[0].sec, entry[0].nsec))
+    total = sum(count for _, count in counts)
+    starts: List[Time] = []
+    seen = 0
+    for start, count in counts:
+        # Start a new window once the previous ones hold their share
+        if len(starts) * total <= seen * partitions and (
+            not starts or compare(start, starts[-1]) > 0
+        ):
+            starts.append(start)
+        seen += count
+    ends: List[Optional[Time]] = [subtract(s, _ONE_NSEC) for s in starts[1:]]
+    return list(zip([None, *starts[1:]], [*ends, None]))
+
+
+def _clip(
+    windows: List[Window], start_time: Optional[Time], end_time: Optional[Time]
+) -> List[Window]:
+    clipped = []
+    for start, end in windows:
+        if start_time is not None and (start is None or compare(start, start_time) < 0):
+            start = start_time
+        if end_time is not None and (end is None or compare(end, end_time) > 0):
+            end = end_time
+        if start is None or end is None or compare(start, end) <= 0:
+            clipped.append((start, end))
+    return clipped
+
+
+def _scan_window(
+    path: Union[str, os.PathLike],
+    decompress: Optional[Mapping[str, Decompress]],
+    parse: bool,
+    topics: Optional[List[str]],
+    window: Window,
+    reducer: Callable[[Any, MessageEvent], Any],
+    initial: Callable[[], Any],
+) -> Any:
+    accumulator = initial()
+    # Worker processes decompress in their own thread
+    with Bag(path, decompress, parse, workers=0) as bag:
+        for event in bag.message_iterator(topics, *window):
+            accumulator = reducer(accumulator, event)
+    return accumulator
@@ -0,0 +1,205 @@
+"""Writing ROS bag format 2.0 files.
+
+:class:`BagWriter` writes the layout that ``rosbag`` itself produces: message
+records grouped into chunks, each chunk followed by one index record per
+connection, and the connection and chunk-info records at the end of the file.
+"""
+
+from __future__ import annotations
+
+import os
+import struct
+from typing import IO, Dict, List, Mapping, Optional, Tuple, Union
+
+from python_ros.rostime import Time, compare
+
+from .chunks import Compress, default_compressors
+from .reader import MAGIC
+from .records import INT32, TIME, UINT32, UINT64
+
+# Default uncompressed size at which a chunk is written, as in rosbag
+DEFAULT_CHUNK_SIZE = 768 * 1024
+
+# Size of the bag header record, padded so it can be rewritten in place
+_HEADER_LENGTH = 4096
+
+_INDEX_ENTRY = struct.Struct("<III")
+_CHUNK_CONNECTION = struct.Struct("<II")
+
+
+def _record(fields: Mapping[str, bytes], data: bytes = b"") -> bytes:
+    header = _header(fields)
+    return INT32.pack(len(header)) + header + INT32.pack(len(data)) + data
+
+
+def _header(fields: Mapping[str, bytes]) -> bytes:
+    entries = [name.encode("utf-8") + b"=" + value for name, value in fields.items()]
+    return b"".join(INT32.pack(len(entry)) + entry for entry in entries)
+
+
+def _time(time: Time) -> bytes:
+    return TIME.pack(time.sec, time.nsec)
+
+
+class BagWriter:
+    """Writes messages to a bag file.
+
+    *target* is a path or a seekable binary file object opened for writing; a
+    file object is not closed by :meth:`close`. Chunks are written once they
+    hold *chunk_size* bytes and compressed with *compression*, one of
+    ``"none"`` or a name in *compress* or :func:`default_compressors`.
+    """
+
+    def __init__(
+        self,
+        target: Union[str, os.PathLike, IO[bytes]],
+        compression: str = "none",
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        compress: Optional[Mapping[str, Compress]] = None,
+    ) -> None:
+        compressors = {**default_compressors(), **(compress or {})}
+        if compression != "none" and compression not in compressors:
+            raise ValueError(f"Unsupported compression type {compression}")
+        self._compress = compressors.get(compression)
+        self.compression = compression
+        self.chunk_size = chunk_size
+        if isinstance(target, (str, os.PathLike)):
+            self._file: IO[bytes] = open(target, "wb")
+            self._owns_file = True
+        else:
+            self._file = target
+            self._owns_file = False
+        self._closed = False
+        self._connections: List[Tuple[int, bytes]] = []
+        self._written: set[int] = set()
+        self._chunk_infos: List[bytes] = []
+        self._buffer = bytearray()
+        self._indices: Dict[int, List[Tuple[int, int, int]]] = {}
+        self._start_time: Optional[Time] = None
+        self._end_time: Optional[Time] = None
+        self._file.write(MAGIC)
+        self._write_header(0)
+
+    def __enter__(self) -> BagWriter:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def add_connection(
+        self,
+        topic: str,
+        type: str,
+        md5sum: str,
+        message_definition: str,
+        callerid: Optional[str] = None,
+        latching: Optional[bool] = None,
+    ) -> int:
+        """Declare a connection; returns the id to write its messages with."""
+
+        conn = len(self._connections)
+        header = {
+            "topic": topic.encode("utf-8"),
+            "type": type.encode("utf-8"),
+            "md5sum": md5sum.encode("utf-8"),
+            "message_definition": message_definition.encode("utf-8"),
+        }
+        if callerid is not None:
+            header["callerid"] = callerid.encode("utf-8")
+        if latching is not None:
+            header["latching"] = b"1" if latching else b"0"
+        fields = {"op": b"\x07", "conn": UINT32.pack(conn), "topic": header["topic"]}
+        self._connections.append((conn, _record(fields, _header(header))))
+        return conn
+
+    def write(self, conn: int, time: Time, data: bytes) -> None:
+        """Append a serialized message of connection *conn* received at *time*."""
+
+        if not 0 <= conn < len(self._connections):
+            raise ValueError(f"Unable to find connection with id {conn}")
+        if conn not in self._written:
+            # Like rosbag, connections are also recorded in their first chunk
+            self._written.add(conn)
+            self._buffer += self._connections[conn][1]
+        offset = len(self._buffer)
+        fields = {"op": b"\x02", "conn": UINT32.pack(conn), "time": _time(time)}
+        self._buffer += _record(fields, data)
+        self._indices.setdefault(conn, []).append((time.sec, time.nsec, offset))
+        if self._start_time is None or compare(time, self._start_time) < 0:
+            self._start_time = time
+        if self._end_time is None or compare(time, self._end_time) > 0:
+            self._end_time = time
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the current chunk and its index records."""
+
+        if not self._indices:
+            return
+        position = self._file.tell()
+        data = bytes(self._buffer)
+        if self._compress is not None:
+            data = self._compress(data)
+        fields = {
+            "op": b"\x05",
+            "compression": self.compression.encode("utf-8"),
+            "size": UINT32.pack(len(self._buffer)),
+        }
+        records = [_record(fields, data)]
+        counts = b""
+        for conn, entries in self._indices.items():
+            entries.sort()
+            fields = {
+                "op": b"\x04",
+                "ver": UINT32.pack(1),
+                "conn": UINT32.pack(conn),
+                "count": UINT32.pack(len(entries)),
+            }
+            index = b"".join(_INDEX_ENTRY.pack(*entry) for entry in entries)
+            records.append(_record(fields, index))
+            counts += _CHUNK_CONNECTION.pack(conn, len(entries))
+        self._file.write(b"".join(records))
+
+        assert self._start_time is not None and self._end_time is not None
+        fields = {
+            "op": b"\x06",
+            "ver": UINT32.pack(1),
+            "chunk_pos": UINT64.pack(position),
+            "start_time": _time(self._start_time),
+            "end_time": _time(self._end_time),
+            "count": UINT32.pack(len(self._indices)),
+        }
+        self._chunk_infos.append(_record(fields, counts))
+        self._buffer = bytearray()
+        self._indices = {}
+        self._start_time = self._end_time = None
+
+    def close(self) -> None:
+        """Write the last chunk, the index and the final bag header."""
+
+        if self._closed:
+            return
+        self._closed = True
+        self.flush()
+        index_position = self._file.tell()
+        self._file.write(b"".join(record for _, record in self._connections))
+        self._file.write(b"".join(self._chunk_infos))
+        end = self._file.tell()
+        self._file.seek(len(MAGIC))
+        self._write_header(index_position)
+        self._file.seek(end)
+        if self._owns_file:
+            self._file.close()
+
+    def _write_header(self, index_position: int) -> None:
+        fields = {
+            "op": b"\x03",
+            "index_pos": UINT64.pack(index_position),
+            "conn_count": INT32.pack(len(self._connections)),
+            "chunk_count": INT32.pack(len(self._chunk_infos)),
+        }
+        header = _header(fields)
+        padding = _HEADER_LENGTH - len(header) - 8
+        record = INT32.pack(len(header)) + header + INT32.pack(padding)
+        self._file.write(record + b" " * padding)
@@ -1,5 +1,32 @@
-from .md5 import md5
-from .parse import fixup_types, normalize_type, parse
+from .cache import (
+    CacheInfo,
+    ParseCache,
+    cached_parse,
+    clear_parse_cache,
+    parse_cache_info,
+)
+from .disk_cache import DiskParseCache
+from .full_definition import FullDefinition, FullDefinitionBuilder
+from .md5 import Md5Cache, md5, md5_all
+from .parse import TypeIndex, fixup_types, normalize_type, parse, parse_stream
 from .stringify import stringify
 
-__all__ = ["parse", "stringify", "fixup_types", "normalize_type", "md5"]
+__all__ = [
+    "parse",
+    "parse_stream",
+    "stringify",
+    "fixup_types",
+    "normalize_type",
+    "TypeIndex",
+    "md5",
+    "md5_all",
+    "Md5Cache",
+    "CacheInfo",
+    "DiskParseCache",
+    "FullDefinition",
+    "FullDefinitionBuilder",
+    "ParseCache",
+    "cached_parse",
+    "clear_parse_cache",
+    "parse_cache_info",
+]
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import replace
+from typing import TYPE_CHECKING, List, NamedTuple, Optional, Tuple
+
+from python_ros.message_definition import MessageDefinition
+
+from .parse import parse
+
+if TYPE_CHECKING:
+    from .disk_cache import DiskParseCache
+
+DEFAULT_MAX_SIZE = 256
+
+CacheKey = Tuple[bytes, bool, bool]
+
+
+class CacheInfo(NamedTuple):
+    """Hit/miss statistics of a :class:`ParseCache`."""
+
+    hits: int
+    misses: int
+    evictions: int
+    maxsize: int
+    currsize: int
+
+
+class ParseCache:
+    """Bounded LRU cache around :func:`parse`.
+
+    Entries are keyed on a digest of the definition text plus the parse flags.
+    Every call returns a fresh copy of the cached definitions, so callers (and
+    ``fixup_types``) may mutate the result without corrupting the cache. An
+    optional *backend* such as :class:`DiskParseCache` is consulted on misses.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = DEFAULT_MAX_SIZE,
+        backend: Optional[DiskParseCache] = None,
+    ) -> None:
+        if maxsize <= 0:
+            raise ValueError(f"Cache size must be positive, got {maxsize}")
+        self.maxsize = maxsize
+        self.backend = backend
+        self._entries: OrderedDict[CacheKey, List[MessageDefinition]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def parse(
+        self, message_definition: str, ros2: bool = False, skip_type_fixup: bool = False
+    ) -> List[MessageDefinition]:
+        key = _cache_key(message_definition, ros2, skip_type_fixup)
+        cached = self._get(key)
+        if cached is None:
+            if self.backend is not None:
+                cached = self.backend.parse(message_definition, ros2, skip_type_fixup)
+            else:
+                cached = parse(message_definition, ros2, skip_type_fixup)
+            self._put(key, cached)
+        return copy_definitions(cached)
+
+    def cache_info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(
+                self._hits,
+                self._misses,
+                self._evictions,
+                self.maxsize,
+                len(self._entries),
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._hits = 0
+            self._misses = 0
+            self._evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _get(self, key: CacheKey) -> Optional[List[MessageDefinition]]:
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return cached
+
+    def _put(self, key: CacheKey, value: List[MessageDefinition]) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+
+def _cache_key(message_definition: str, ros2: bool, skip_type_fixup: bool) -> CacheKey:
+    digest = hashlib.sha256(message_definition.encode("utf-8")).digest()
+    return (digest, ros2, skip_type_fixup)
+
+
+def copy_definitions(msg_defs: List[MessageDefinition]) -> List[MessageDefinition]:
+    """Return a copy of *msg_defs* that shares no mutable state with it."""
+
+    return [
+        MessageDefinition(
+            name=msg_def.name,
+            definitions=[
+                replace(
+                    field,
+                    defaultValue=(
+                        list(field.defaultValue)
+                        if isinstance(field.defaultValue, list)
+                        else field.defaultValue
+                    ),
+                )
+                for field in msg_def.definitions
+            ],
+        )
+        for msg_def in msg_defs
+    ]
+
+
+_default_cache = ParseCache()
+
+
+def cached_parse(
+    message_definition: str, ros2: bool = False, skip_type_fixup: bool = False
+) -> List[MessageDefinition]:
+    """Like :func:`parse`, but memoized through a process-wide :class:`ParseCache`."""
+
+    return _default_cache.parse(message_definition, ros2, skip_type_fixup)
+
+
+def parse_cache_info() -> CacheInfo:
+    return _default_cache.cache_info()
+
+
+def clear_parse_cache() -> None:
+    _default_cache.clear()
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import hashlib
+import marshal
+import os
+import tempfile
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+from python_ros.message_definition import MessageDefinition, MessageDefinitionField
+
+from .parse import PARSER_VERSION, parse
+
+_MAGIC = b"RMDC"
+_FORMAT_VERSION = 1
+_SUFFIX = ".msgdef"
+
+
+class DiskParseCache:
+    """Persistent cache of :func:`parse` results stored as one file per entry.
+
+    Entries are keyed by a SHA-256 digest of the definition text, the parse
+    flags, the parser version and the ``marshal`` format, so results produced by
+    another parser version are never loaded. Files are written to a temporary
+    name and atomically renamed into place, which makes concurrent writers from
+    several processes safe; unreadable or truncated entries count as misses.
+    """
+
+    def __init__(self, directory: Union[str, os.PathLike]) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def parse(
+        self, message_definition: str, ros2: bool = False, skip_type_fixup: bool = False
+    ) -> List[MessageDefinition]:
+        cached = self.get(message_definition, ros2, skip_type_fixup)
+        if cached is not None:
+            return cached
+        result = parse(message_definition, ros2, skip_type_fixup)
+        self.put(message_definition, ros2, skip_type_fixup, result)
+        return result
+
+    def get(
+        self, message_definition: str, ros2: bool, skip_type_fixup: bool
+    ) -> Optional[List[MessageDefinition]]:
+        path = self._path(message_definition, ros2, skip_type_fixup)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return None
+        try:
+            return decode_definitions(data)
+        except (EOFError, ValueError, TypeError):
+            return None
+
+    def put(
+        self,
+        message_definition: str,
+        ros2: bool,
+        skip_type_fixup: bool,
+        msg_defs: List[MessageDefinition],
+    ) -> None:
+        path = self._path(message_definition, ros2, skip_type_fixup)
+        fd, tmp_name = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(encode_definitions(msg_defs))
+            os.replace(tmp_name, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_name)
+            except OSError:
+                pass
+            raise
+
+    def clear(self) -> None:
+        for path in self.directory.glob(f"*{_SUFFIX}"):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _path(self, message_definition: str, ros2: bool, skip_type_fixup: bool) -> Path:
+        digest = hashlib.sha256()
+        digest.update(
+            f"{PARSER_VERSION}:{_FORMAT_VERSION}:{marshal.version}:"
+            f"{int(ros2)}:{int(skip_type_fixup)}:".encode()
+        )
+        digest.update(message_definition.encode("utf-8"))
+        return self.directory / (digest.hexdigest() + _SUFFIX)
+
+
+def encode_definitions(msg_defs: List[MessageDefinition]) -> bytes:
+    """Serialize *msg_defs* into the compact binary form used by the cache."""
+
+    payload = [(d.name, [f.key() for f in d.definitions]) for d in msg_defs]
+    return _MAGIC + marshal.dumps((_FORMAT_VERSION, PARSER_VERSION, payload))
+
+
+def decode_definitions(data: bytes) -> List[MessageDefinition]:
+    if not data.startswith(_MAGIC):
+        raise ValueError("Not a cached message definition")
+    version, parser_version, payload = marshal.loads(data[len(_MAGIC) :])
+    if version != _FORMAT_VERSION or parser_version != PARSER_VERSION:
+        raise ValueError("Cached message definition has an incompatible version")
+    return [
+        MessageDefinition(name=name, definitions=[_decode_field(k) for k in fields])
+        for name, fields in payload
+    ]
+
+
+def _decode_field(key: Tuple) -> MessageDefinitionField:
+    default = key[-1]
+    return MessageDefinitionField(
+        *key[:-1], defaultValue=list(default) if isinstance(default, tuple) else default
+    )
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from python_ros.message_definition import MessageDefinitionRegistry
+
+from .md5 import Md5Cache, _Md5Computer
+from .stringify import stringify
+
+
+@dataclass(frozen=True)
+class FullDefinition:
+    """A dependency-closed message definition, as written by ``gendeps --cat``."""
+
+    name: str
+    text: str
+    md5: str
+    dependencies: Tuple[str, ...]
+
+
+class FullDefinitionBuilder:
+    """Builds :class:`FullDefinition` objects from a registry, cached per root type.
+
+    A single walk over the dependency graph yields both the MD5 and the
+    depth-first dependency order used for the ``MSG:`` blocks. A cached entry
+    is reused only while every dependency the registry returns still has the
+    fingerprint it was built with.
+    """
+
+    def __init__(
+        self, registry: MessageDefinitionRegistry, md5_cache: Optional[Md5Cache] = None
+    ) -> None:
+        self.registry = registry
+        self.md5_cache = md5_cache if md5_cache is not None else Md5Cache()
+        self._lock = threading.Lock()
+        # Each entry is stored with the fingerprints of its dependencies
+        self._entries: Dict[
+            Tuple[str, str], Tuple[FullDefinition, Tuple[Optional[str], ...]]
+        ] = {}
+
+    def build(self, root_name: str) -> FullDefinition:
+        root = self.registry.get(root_name)
+        if root is None:
+            raise ValueError(f"Unknown message type '{root_name}'")
+        key = (root_name, root.fingerprint())
+        with self._lock:
+            cached = self._entries.get(key)
+        if cached is not None and self._fingerprints(cached[0]) == cached[1]:
+            return cached[0]
+
+        computer = _Md5Computer(self.registry.get, self.md5_cache)
+        md5 = computer.md5(root)
+        ordered = computer.visited
+        result = FullDefinition(
+            name=root_name,
+            text=stringify(ordered),
+            md5=md5,
+            dependencies=tuple(d.name or "" for d in ordered[1:]),
+        )
+        fingerprints = tuple(d.fingerprint() for d in ordered[1:])
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[1] == fingerprints:
+                return cached[0]
+            self._entries[key] = (result, fingerprints)
+        return result
+
+    def _fingerprints(self, full: FullDefinition) -> Tuple[Optional[str], ...]:
+        dependencies = map(self.registry.get, full.dependencies)
+        return tuple(None if d is None else d.fingerprint() for d in dependencies)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,341 @@
+"""Single-pass scanners for message definition lines.
+
+Every scanner walks its line once from left to right using ``str`` primitives,
+so the cost stays linear in the length of the line even for hostile inputs such
+as long quoted defaults or huge default arrays. The accepted syntax mirrors the
+grammar documented at http://wiki.ros.org/msg and
+https://design.ros2.org/articles/legacy_interface_definition.html.
+"""
+
+from __future__ import annotations
+
+from typing import NamedTuple, Optional, Sequence, Tuple
+
+_UPPER = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+_LOWER = "abcdefghijklmnopqrstuvwxyz"
+_DIGITS = "0123456789"
+_NAME_CHARS = frozenset(_UPPER + _LOWER + _DIGITS + "_")
+_TYPE_CHARS = _NAME_CHARS | {"/"}
+_CONSTANT_NAME_CHARS = frozenset(_UPPER + _DIGITS + "_")
+_FIELD_NAME_CHARS = frozenset(_LOWER + _DIGITS + "_")
+_QUOTES = "'\""
+
+# Characters that end an unquoted literal after a constant assignment or a
+# scalar default, and inside a default value array.
+COMMENT_STOPS = ("#",)
+ARRAY_STOPS = ("#", "]", ",")
+
+
+class FieldTokens(NamedTuple):
+    """The lexical parts of one ROS 2 field or constant line."""
+
+    type: str
+    name: str
+    string_bound: Optional[str] = None
+    is_array: bool = False
+    array_length: Optional[str] = None
+    array_bound: Optional[str] = None
+    constant_value: Optional[str] = None
+    default_value: Optional[str] = None
+
+
+def _error(line: str) -> ValueError:
+    return ValueError(f"Could not parse line: '{line}'")
+
+
+def _skip_chars(text: str, start: int, chars: frozenset) -> int:
+    i = start
+    n = len(text)
+    while i < n and text[i] in chars:
+        i += 1
+    return i
+
+
+def _skip_decimal(text: str, start: int) -> int:
+    i = start
+    n = len(text)
+    while i < n and text[i].isdecimal():
+        i += 1
+    return i
+
+
+def is_trailer(text: str) -> bool:
+    """Return ``True`` if *text* holds nothing but whitespace and a comment."""
+
+    stripped = text.lstrip()
+    return not stripped or stripped[0] == "#"
+
+
+def scan_quoted(text: str, start: int) -> int:
+    """Return the end of the quoted string starting at *start*, or -1."""
+
+    quote = text[start]
+    i = start + 1
+    end = text.find(quote, i)
+    while end >= 0:
+        backslash = text.find("\\", i, end)
+        if backslash < 0:
+            return end + 1
+        i = backslash + 2
+        if i > end:
+            end = text.find(quote, i)
+    return -1
+
+
+def _scan_unquoted(text: str, start: int, stops: Sequence[str]) -> int:
+    n = len(text)
+    if stops == COMMENT_STOPS:
+        limit = text.find("#", start)
+        if limit < 0:
+            limit = n
+        i = start
+        while True:
+            backslash = text.find("\\", i, limit)
+            if backslash < 0:
+                return limit
+            if backslash + 1 >= n:
+                return backslash
+            i = backslash + 2
+            if i > limit:
+                limit = text.find("#", i)
+                if limit < 0:
+                    limit = n
+    i = start
+    while i < n:
+        c = text[i]
+        if c == "\\":
+            if i + 1 >= n:
+                break
+            i += 2
+        elif c in stops:
+            break
+        else:
+            i += 1
+    return i
+
+
+def scan_literal(text: str, start: int, stops: Sequence[str]) -> int:
+    """Return the end of the literal starting at *start*, or -1 if there is none.
+
+    A literal is either a quoted string or a run of characters up to the first
+    unescaped character in *stops*. Unquoted literals may not start with
+    whitespace or a quote.
+    """
+
+    if start >= len(text):
+        return -1
+    first = text[start]
+    if first in _QUOTES:
+        return scan_quoted(text, start)
+    if first == "\\":
+        if start + 1 >= len(text):
+            return -1
+        return _scan_unquoted(text, start + 2, stops)
+    if first.isspace() or first in stops:
+        return -1
+    return _scan_unquoted(text, start + 1, stops)
+
+
+def scan_array(text: str) -> int:
+    """Return the end of the ``[a,b,...]`` default value array opening *text*."""
+
+    n = len(text)
+    i = 1
+    while True:
+        if i < n and text[i] == "]":
+            return i + 1
+        end = scan_literal(text, i, ARRAY_STOPS)
+        if end < 0:
+            return -1
+        i = end
+        if i < n and text[i] == ",":
+            i += 1
+        elif i < n and text[i] == "]":
+            return i + 1
+        else:
+            return -1
+
+
+def _scan_constant_value(rest: str) -> Optional[str]:
+    stripped = rest.lstrip()
+    if not stripped.startswith("="):
+        return None
+    value = stripped[1:].lstrip()
+    end = max(scan_literal(value, 0, COMMENT_STOPS), 0)
+    return value[:end] if is_trailer(value[end:]) else None
+
+
+def _scan_default_value(rest: str) -> Optional[str]:
+    if not rest or not rest[0].isspace():
+        return None
+    value = rest.lstrip()
+    if value.startswith("["):
+        end = scan_array(value)
+        if end >= 0 and is_trailer(value[end:]):
+            return value[:end]
+    end = scan_literal(value, 0, COMMENT_STOPS)
+    if end > 0 and is_trailer(value[end:]):
+        return value[:end]
+    return None
+
+
+def _scan_type_bounds(
+    line: str, head: str
+) -> Tuple[str, Optional[str], bool, Optional[str], Optional[str]]:
+    if _TYPE_CHARS.issuperset(head):
+        return head, None, False, None, None
+    i = _skip_chars(head, 0, _TYPE_CHARS)
+    if i == 0:
+        raise _error(line)
+    type_name = head[:i]
+
+    string_bound: Optional[str] = None
+    if head.startswith("<=", i):
+        end = _skip_decimal(head, i + 2)
+        if end == i + 2:
+            raise _error(line)
+        string_bound = head[i + 2 : end]
+        i = end
+
+    is_array = False
+    array_length: Optional[str] = None
+    array_bound: Optional[str] = None
+    if head.startswith("[", i):
+        is_array = True
+        if head.startswith("[]", i):
+            i += 2
+        else:
+            digits_start = i + 3 if head.startswith("[<=", i) else i + 1
+            end = _skip_decimal(head, digits_start)
+            if end == digits_start or not head.startswith("]", end):
+                raise _error(line)
+            if digits_start == i + 1:
+                array_length = head[digits_start:end]
+            else:
+                array_bound = head[digits_start:end]
+            i = end + 1
+
+    if i != len(head):
+        raise _error(line)
+    return type_name, string_bound, is_array, array_length, array_bound
+
+
+def scan_ros2_line(line: str) -> FieldTokens:
+    """Split a ROS 2 field or constant line into its tokens."""
+
+    parts = line.split(None, 1)
+    if len(parts) < 2 or line[0].isspace():
+        raise _error(line)
+    head, rest = parts
+    type_name, string_bound, is_array, array_length, array_bound = _scan_type_bounds(
+        line, head
+    )
+
+    word = rest.split(None, 1)[0]
+    if _NAME_CHARS.issuperset(word):
+        name_end = len(word)
+    else:
+        name_end = _skip_chars(rest, 0, _NAME_CHARS)
+        if name_end == 0:
+            raise _error(line)
+    name = rest[:name_end]
+
+    constant_value: Optional[str] = None
+    default_value: Optional[str] = None
+    if name_end < len(rest):
+        trailer = rest[name_end:]
+        constant_value = _scan_constant_value(trailer)
+        if constant_value is None:
+            default_value = _scan_default_value(trailer)
+            if default_value is None and not is_trailer(trailer):
+                raise _error(line)
+
+    return FieldTokens(
+        type_name,
+        name,
+        string_bound,
+        is_array,
+        array_length,
+        array_bound,
+        constant_value,
+        default_value,
+    )
+
+
+def scan_ros2_msg_line(line: str) -> Optional[str]:
+    """Return the type name of a ROS 2 ``MSG: pkg/Type`` line, else ``None``."""
+
+    if not line.startswith("MSG: "):
+        return None
+    rest = line[5:]
+    space = rest.find(" ")
+    name, tail = (rest, "") if space < 0 else (rest[:space], rest[space:])
+    if not name:
+        return None
+    stripped = tail.lstrip()
+    if not stripped or (stripped[0] == "#" and len(stripped) > 1):
+        return name
+    # A comment may also follow the name without a separating space
+    hash_index = name.rfind("#")
+    if hash_index == len(name) - 1 and not tail:
+        hash_index = name.rfind("#", 0, hash_index)
+    return name[:hash_index] if hash_index >= 1 else None
+
+
+def scan_ros1_line(line: str) -> Optional[Tuple[str, str, Optional[str]]]:
+    """Split a ROS 1 field or constant line into ``(type, name, value_text)``.
+
+    Returns ``None`` for lines that only hold a comment.
+    """
+
+    text = line.partition("#")[0].strip()
+    if not text:
+        return None
+    parts = text.split(None, 1)
+    if len(parts) < 2:
+        raise _error(text)
+    type_name, rest = parts
+    name = rest.split(None, 1)[0]
+    equals = name.find("=")
+    if equals == 0:
+        raise _error(text)
+    if equals > 0:
+        return type_name, name[:equals], rest[equals + 1 :].strip()
+    after = rest[len(name) :].lstrip()
+    if after.startswith("="):
+        return type_name, name, after[1:].strip()
+    return type_name, name, None
+
+
+def split_array_suffix(type_name: str) -> Tuple[str, bool, Optional[int]]:
+    """Split ``base[N]`` or ``base[]`` into ``(base, is_array, array_length)``."""
+
+    bracket = type_name.find("[")
+    if bracket <= 0 or not type_name.endswith("]"):
+        return type_name, False, None
+    length = type_name[bracket + 1 : -1]
+    if length and not length.isdecimal():
+        return type_name, False, None
+    return type_name[:bracket], True, int(length) if length else None
+
+
+def _is_snake_name(name: str, first_chars: str, chars: frozenset) -> bool:
+    return (
+        bool(name)
+        and name[0] in first_chars
+        and name[-1] != "_"
+        and "__" not in name
+        and chars.issuperset(name)
+    )
+
+
+def is_constant_name(name: str) -> bool:
+    """Return ``True`` for UPPER_SNAKE_CASE names such as ``FOO_BAR2``."""
+
+    return _is_snake_name(name, _UPPER, _CONSTANT_NAME_CHARS)
+
+
+def is_field_name(name: str) -> bool:
+    """Return ``True`` for lower_snake_case names such as ``foo_bar2``."""
+
+    return _is_snake_name(name, _LOWER, _FIELD_NAME_CHARS)
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
 import hashlib
-from typing import Dict, List
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
 
-from python_ros.message_definition import MessageDefinition
+from python_ros.message_definition import MessageDefinition, MessageDefinitionRegistry
 
 BUILTIN_TYPES = {
     "int8",
@@ -24,20 +26,160 @@ BUILTIN_TYPES = {
     "duration",
 }
 
+# Default number of type MD5s kept by an Md5Cache
+DEFAULT_MD5_CACHE_SIZE = 4096
 
-def md5(msg_defs: List[MessageDefinition]) -> str:
+
+class Md5Cache:
+    """Thread-safe LRU cache of message MD5s shared across :func:`md5` calls.
+
+    A definition's MD5 depends on its own structure and on the MD5s of its
+    sub-messages, so entries are keyed on the structural fingerprint of the
+    definition plus the MD5s of its complex fields. At most *maxsize* types
+    are kept.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_MD5_CACHE_SIZE) -> None:
+        if maxsize <= 0:
+            raise ValueError(f"Cache size must be positive, got {maxsize}")
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Tuple[str, Tuple[str, ...]], str] = OrderedDict()
+
+    def get(self, key: Tuple[str, Tuple[str, ...]]) -> Optional[str]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Tuple[str, Tuple[str, ...]], value: str) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+def md5(msg_defs: List[MessageDefinition], cache: Optional[Md5Cache] = None) -> str:
     if not msg_defs:
         raise ValueError("Cannot produce md5sum for empty msgDefs")
     sub_defs: Dict[str, MessageDefinition] = {
         d.name: d for d in msg_defs if d.name is not None
     }
     first = msg_defs[0]
-    return _compute_md5(first, sub_defs)
+    return _Md5Computer(sub_defs.get, cache).md5(first)
+
+
+def md5_all(
+    types: Union[MessageDefinitionRegistry, Iterable[MessageDefinition]],
+    cache: Optional[Md5Cache] = None,
+) -> Dict[str, str]:
+    """Return the MD5 of every named type, hashing each type exactly once.
+
+    Types are visited in dependency order, so every sub-message MD5 is computed
+    once and reused by all the types that reference it.
+    """
 
+    if isinstance(types, MessageDefinitionRegistry):
+        registry = types
+        # get() raises if several different definitions share a name
+        names = {d.name for d in registry if d.name is not None}
+        named = [registry.get(name) for name in sorted(names)]
+        lookup: Callable[[str], Optional[MessageDefinition]] = registry.get
+    else:
+        sub_defs = {d.name: d for d in types if d.name is not None}
+        named = list(sub_defs.values())
+        lookup = sub_defs.get
+    computer = _Md5Computer(lookup, cache)
+    return {d.name: computer.md5(d) for d in named}  # type: ignore[misc]
 
-def _compute_md5(
-    msg_def: MessageDefinition, sub_defs: Dict[str, MessageDefinition]
-) -> str:
+
+class _Md5Computer:
+    def __init__(
+        self,
+        lookup: Callable[[str], Optional[MessageDefinition]],
+        cache: Optional[Md5Cache],
+    ) -> None:
+        self._lookup = lookup
+        self._cache = cache
+        # Keyed on id(); the definitions stay referenced by the lookup table
+        self._memo: Dict[int, str] = {}
+        # Definitions in the order the walk first reached them (pre-order)
+        self.visited: List[MessageDefinition] = []
+
+    def md5(self, root: MessageDefinition) -> str:
+        memo = self._memo
+        if id(root) in memo:
+            return memo[id(root)]
+        # Iterative post-order walk so deep hierarchies cannot hit the
+        # recursion limit, and each sub-message is hashed once per walk.
+        path: List[MessageDefinition] = []
+        on_path: Set[int] = set()
+        stack: List[Tuple[MessageDefinition, bool]] = [(root, False)]
+        while stack:
+            msg_def, expanded = stack.pop()
+            if expanded:
+                memo[id(msg_def)] = self._compute(msg_def)
+                on_path.discard(id(msg_def))
+                path.pop()
+                continue
+            if id(msg_def) in memo:
+                continue
+            if id(msg_def) in on_path:
+                raise self._cycle_error(path, msg_def)
+            on_path.add(id(msg_def))
+            path.append(msg_def)
+            self.visited.append(msg_def)
+            stack.append((msg_def, True))
+            for sub in reversed(self._dependencies(msg_def)):
+                if id(sub) in on_path:
+                    raise self._cycle_error(path, sub)
+                if id(sub) not in memo:
+                    stack.append((sub, False))
+        return memo[id(root)]
+
+    def _dependencies(self, msg_def: MessageDefinition) -> List[MessageDefinition]:
+        deps: List[MessageDefinition] = []
+        for d in msg_def.definitions:
+            if d.isConstant or _is_builtin(d.type):
+                continue
+            sub = self._lookup(d.type)
+            if sub is None:
+                raise ValueError(f'Missing definition for submessage type "{d.type}"')
+            deps.append(sub)
+        return deps
+
+    def _compute(self, msg_def: MessageDefinition) -> str:
+        sub_md5s = tuple(self._memo[id(sub)] for sub in self._dependencies(msg_def))
+        key = (msg_def.fingerprint(), sub_md5s) if self._cache is not None else None
+        if key is not None:
+            cached = self._cache.get(key)  # type: ignore[union-attr]
+            if cached is not None:
+                return cached
+        result = _compute_md5(msg_def, iter(sub_md5s))
+        if key is not None:
+            self._cache.put(key, result)  # type: ignore[union-attr]
+        return result
+
+    @staticmethod
+    def _cycle_error(
+        path: List[MessageDefinition], repeated: MessageDefinition
+    ) -> ValueError:
+        start = next(i for i, d in enumerate(path) if d is repeated)
+        names = [d.name or "<root>" for d in path[start:]] + [repeated.name or "<root>"]
+        return ValueError(f"Cyclic message definition: {' -> '.join(names)}")
+
+
+def _compute_md5(msg_def: MessageDefinition, sub_md5s: Iterator[str]) -> str:
     constants = [d for d in msg_def.definitions if d.isConstant]
     variables = [d for d in msg_def.definitions if not d.isConstant]
     lines: List[str] = []
@@ -50,11 +192,7 @@ def _compute_md5(
             array = f"[{array_len}]" if d.isArray else ""
             lines.append(f"{d.type}{array} {d.name}")
         else:
-            sub = sub_defs.get(d.type)
-            if sub is None:
-                raise ValueError(f'Missing definition for submessage type "{d.type}"')
-            sub_md5 = _compute_md5(sub, sub_defs)
-            lines.append(f"{sub_md5} {d.name}")
+            lines.append(f"{next(sub_md5s)} {d.name}")
     text = "\n".join(lines)
     return hashlib.md5(text.encode()).hexdigest()
 
@@ -1,14 +1,27 @@
 from __future__ import annotations
 
-import re
-from typing import List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
 
 from python_ros.message_definition import (
     MessageDefinition,
     MessageDefinitionField,
-    is_msg_def_equal,
+    MessageDefinitionRegistry,
 )
 
+from .lexer import (
+    ARRAY_STOPS,
+    is_constant_name,
+    is_field_name,
+    scan_literal,
+    scan_ros1_line,
+    scan_ros2_line,
+    scan_ros2_msg_line,
+    split_array_suffix,
+)
+
+# Bump whenever the output of parse() changes, so persisted results are discarded
+PARSER_VERSION = 2
+
 BUILTIN_TYPES = {
     "int8",
     "uint8",
@@ -53,56 +66,21 @@ ROS2_BUILTIN_TYPES = {
     "builtin_interfaces/msg/Duration",
 }
 
-TYPE = r"(?P<type>[a-zA-Z0-9_/]+)"
-STRING_BOUND = r"(?:<=(?P<stringBound>\d+))"
-ARRAY_BOUND = (
-    r"(?:(?P<unboundedArray>\[\])|\[(?P<arrayLength>\d+)\]|\[<=(?P<arrayBound>\d+)\])"
-)
-NAME = r"(?P<name>[a-zA-Z0-9_]+)"
-QUOTED_STRING = r"'(?:\\.|[^'\\])*'|\"(?:\\.|[^\"\\])*\""
-COMMENT_TERMINATED_LITERAL = (
-    r"(?:" + QUOTED_STRING + r"|(?:\\.|[^\s'\"#\\])(?:\\.|[^#\\])*)"
-)
-ARRAY_TERMINATED_LITERAL = (
-    r"(?:" + QUOTED_STRING + r"|(?:\\.|[^\s'\"\],#\\])(?:\\.|[^\],#\\])*)"
-)
-CONSTANT_ASSIGNMENT = r"\s*=\s*(?P<constantValue>" + COMMENT_TERMINATED_LITERAL + r"?)"
-DEFAULT_VALUE_ARRAY = (
-    r"\[(?:" + ARRAY_TERMINATED_LITERAL + r",)*" + ARRAY_TERMINATED_LITERAL + r"?\]"
-)
-DEFAULT_VALUE = (
-    r"(?P<defaultValue>"
-    + DEFAULT_VALUE_ARRAY
-    + r"|"
-    + COMMENT_TERMINATED_LITERAL
-    + r")"
-)
-COMMENT = r"(?:#.*)"
-DEFINITION_LINE_REGEX = re.compile(
-    r"^"
-    + TYPE
-    + STRING_BOUND
-    + r"?"
-    + ARRAY_BOUND
-    + r"?\s+"
-    + NAME
-    + r"(?:"
-    + CONSTANT_ASSIGNMENT
-    + r"|\s+"
-    + DEFAULT_VALUE
-    + r")?\s*"
-    + COMMENT
-    + r"?$"
-)
-
-STRING_ESCAPES = (
-    r"\\(?P<char>['\"abfnrtv\\])|\\(?P<oct>[0-7]{1,3})|"
-    r"\\x(?P<hex2>[a-fA-F0-9]{2})|\\u(?P<hex4>[a-fA-F0-9]{4})|"
-    r"\\U(?P<hex8>[a-fA-F0-9]{8})"
-)
-
-LITERAL_REGEX = re.compile(ARRAY_TERMINATED_LITERAL)
-COMMA_OR_END_REGEX = re.compile(r"\s*(,)?\s*|\s*$")
+_SIMPLE_ESCAPES = {
+    "'": "'",
+    '"': '"',
+    "a": "\x07",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+    "v": "\v",
+    "\\": "\\",
+}
+_OCTAL_DIGITS = "01234567"
+_HEX_ESCAPE_LENGTHS = {"x": 2, "u": 4, "U": 8}
+_HEX_DIGITS = frozenset("0123456789abcdefABCDEF")
 
 
 def _parse_big_int_literal(text: str, min_value: int, max_value: int) -> int:
@@ -134,33 +112,40 @@ def _parse_string_literal(maybe_quoted: str) -> str:
             quote = q
             s = s[len(q) : -len(q)]
             break
-    pattern = rf"^(?:[^\\{quote}]|{STRING_ESCAPES})*$"
-    if re.fullmatch(pattern, s) is None:
-        raise ValueError(f"Invalid string literal: {s}")
-
-    def replace(match: re.Match) -> str:
-        groups = match.groupdict()
-        if groups.get("char"):
-            return {
-                "'": "'",
-                '"': '"',
-                "a": "\x07",
-                "b": "\b",
-                "f": "\f",
-                "n": "\n",
-                "r": "\r",
-                "t": "\t",
-                "v": "\v",
-                "\\": "\\",
-            }[groups["char"]]
-        if groups.get("oct"):
-            return chr(int(groups["oct"], 8))
-        hex_val = groups.get("hex2") or groups.get("hex4") or groups.get("hex8")
-        if hex_val:
-            return chr(int(hex_val, 16))
-        raise ValueError("Expected exactly one matched group")
-
-    return re.sub(STRING_ESCAPES, replace, s)
+
+    parts: List[str] = []
+    offset = 0
+    while True:
+        backslash = s.find("\\", offset)
+        chunk = s[offset:] if backslash < 0 else s[offset:backslash]
+        if quote and quote in chunk:
+            raise ValueError(f"Invalid string literal: {s}")
+        parts.append(chunk)
+        if backslash < 0:
+            return "".join(parts)
+        escaped, offset = _parse_escape(s, backslash + 1)
+        if escaped is None:
+            raise ValueError(f"Invalid string literal: {s}")
+        parts.append(escaped)
+
+
+def _parse_escape(s: str, start: int) -> Tuple[Optional[str], int]:
+    if start >= len(s):
+        return None, start
+    c = s[start]
+    if c in _SIMPLE_ESCAPES:
+        return _SIMPLE_ESCAPES[c], start + 1
+    if c in _OCTAL_DIGITS:
+        end = start + 1
+        while end < len(s) and end < start + 3 and s[end] in _OCTAL_DIGITS:
+            end += 1
+        return chr(int(s[start:end], 8)), end
+    length = _HEX_ESCAPE_LENGTHS.get(c)
+    if length is not None:
+        digits = s[start + 1 : start + 1 + length]
+        if len(digits) == length and all(d in _HEX_DIGITS for d in digits):
+            return chr(int(digits, 16)), start + 1 + length
+    return None, start
 
 
 def _parse_primitive_literal(type_name: str, text: str):
@@ -204,16 +189,15 @@ def _parse_array_literal(type_name: str, raw: str):
         while offset < len(inner):
             if inner[offset] == ",":
                 raise ValueError("Expected array element before comma")
-            m = LITERAL_REGEX.match(inner, offset)
-            if m:
-                results.append(_parse_string_literal(m.group(0)))
-                offset = m.end()
-            m = COMMA_OR_END_REGEX.match(inner, offset)
-            if not m:
-                raise ValueError("Expected comma or end of array")
-            if not m.group(1):
+            end = scan_literal(inner, offset, ARRAY_STOPS)
+            if end >= 0:
+                results.append(_parse_string_literal(inner[offset:end]))
+                offset = end
+            offset = len(inner) - len(inner[offset:].lstrip())
+            if not inner.startswith(",", offset):
                 break
-            offset = m.end()
+            offset += 1
+            offset = len(inner) - len(inner[offset:].lstrip())
         return results
     return [
         _parse_primitive_literal(type_name, part.strip())
@@ -238,35 +222,30 @@ def _build_ros2_type(lines: List[str]) -> MessageDefinition:
     for line in lines:
         if line.startswith("#"):
             continue
-        m_msg = re.match(r"^MSG: ([^ ]+)\s*(?:#.+)?$", line)
-        if m_msg:
-            complex_type_name = m_msg.group(1)
+        msg_name = scan_ros2_msg_line(line)
+        if msg_name is not None:
+            complex_type_name = msg_name
             continue
-        m = DEFINITION_LINE_REGEX.match(line)
-        if not m:
-            raise ValueError(f"Could not parse line: '{line}'")
-        groups = m.groupdict()
-        raw_type = groups["type"]
-        type_name = _normalize_type_ros2(raw_type)
-        string_bound = groups.get("stringBound")
-        unbounded_array = groups.get("unboundedArray")
-        array_length = groups.get("arrayLength")
-        array_bound = groups.get("arrayBound")
-        name = groups["name"]
-        constant_value = groups.get("constantValue")
-        default_value = groups.get("defaultValue")
+        tokens = scan_ros2_line(line)
+        type_name = _normalize_type_ros2(tokens.type)
+        string_bound = tokens.string_bound
+        array_length = tokens.array_length
+        array_bound = tokens.array_bound
+        name = tokens.name
+        constant_value = tokens.constant_value
+        default_value = tokens.default_value
 
         if string_bound is not None and type_name not in {"string", "wstring"}:
             raise ValueError(f"Invalid string bound for type {type_name}")
         if constant_value is not None:
-            if re.fullmatch(r"[A-Z](?:_?[A-Z0-9]+)*", name) is None:
+            if not is_constant_name(name):
                 raise ValueError(f"Invalid constant name: {name}")
         else:
-            if re.fullmatch(r"[a-z](?:_?[a-z0-9]+)*", name) is None:
+            if not is_field_name(name):
                 raise ValueError(f"Invalid field name: {name}")
 
         is_complex = type_name not in ROS2_BUILTIN_TYPES
-        is_array = bool(unbounded_array or array_length or array_bound)
+        is_array = tokens.is_array
 
         field = MessageDefinitionField(
             name=name,
@@ -298,47 +277,183 @@ def _build_ros2_type(lines: List[str]) -> MessageDefinition:
 
 
 def parse(
-    message_definition: str, ros2: bool = False, skip_type_fixup: bool = False
+    message_definition: str,
+    ros2: bool = False,
+    skip_type_fixup: bool = False,
+    registry: Optional[MessageDefinitionRegistry] = None,
+) -> List[MessageDefinition]:
+    """Parse a message definition into a list of ``MessageDefinition`` objects.
+
+    When a *registry* is given, complex types missing from the text are resolved
+    against it and appended to the result, and the parsed definitions are
+    interned into it so the returned objects are shared with earlier parses of
+    the same types.
+    """
+
+    unique = list(_iter_unique_types(message_definition.splitlines(), ros2))
+
+    if registry is not None and skip_type_fixup:
+        raise ValueError("Cannot intern definitions into a registry without fixup")
+    if not skip_type_fixup:
+        fixup_types(unique, registry)
+    if registry is not None:
+        unique = [registry.intern(t) for t in unique]
+        unique.extend(_registry_dependencies(unique, registry))
+
+    return unique
+
+
+def _registry_dependencies(
+    types: List[MessageDefinition], registry: MessageDefinitionRegistry
 ) -> List[MessageDefinition]:
-    lines = [line.strip() for line in message_definition.splitlines() if line.strip()]
+    """Definitions reachable from *types* that only the registry provides."""
+
+    names = {t.name for t in types}
+    found: List[MessageDefinition] = []
+    pending = list(types)
+    while pending:
+        msg = pending.pop(0)
+        for field in msg.definitions:
+            if field.isComplex and field.type not in names:
+                names.add(field.type)
+                dependency = registry.get(field.type)
+                if dependency is None:
+                    raise ValueError(f"Missing type definition for {field.type}")
+                found.append(dependency)
+                pending.append(dependency)
+    return found
+
+
+def parse_stream(
+    stream: Iterable[Union[str, bytes]], ros2: bool = False, encoding: str = "utf-8"
+) -> Iterator[MessageDefinition]:
+    """Incrementally parse a message definition read from *stream*.
+
+    *stream* may be a text or binary file object or any iterable of lines. Each
+    ``MessageDefinition`` is yielded as soon as its section ends, so only one
+    section is buffered at a time. Type names are left as written; call
+    :func:`fixup_types` on the collected definitions to resolve them.
+    """
+
+    lines = (
+        line.decode(encoding) if isinstance(line, bytes) else line for line in stream
+    )
+    return _iter_unique_types(lines, ros2)
+
+
+def _iter_unique_types(lines: Iterable[str], ros2: bool) -> Iterator[MessageDefinition]:
+    seen: Set[str] = set()
+    for t in _iter_types(lines, ros2):
+        fingerprint = t.fingerprint()
+        if fingerprint not in seen:
+            seen.add(fingerprint)
+            yield t
+
+
+def _iter_types(lines: Iterable[str], ros2: bool) -> Iterator[MessageDefinition]:
+    build = _build_ros2_type if ros2 else _build_type
     definition_lines: List[str] = []
-    types: List[MessageDefinition] = []
-    for line in lines:
-        if line.startswith("#"):
+    for raw_line in lines:
+        line = raw_line.strip()
+        if not line or line.startswith("#"):
             continue
         if line.startswith("=="):
-            types.append(
-                _build_ros2_type(definition_lines)
-                if ros2
-                else _build_type(definition_lines)
-            )
+            yield build(definition_lines)
             definition_lines = []
         else:
             definition_lines.append(line)
-    types.append(
-        _build_ros2_type(definition_lines) if ros2 else _build_type(definition_lines)
-    )
+    yield build(definition_lines)
 
-    unique: List[MessageDefinition] = []
-    for t in types:
-        if not any(is_msg_def_equal(t, other) for other in unique):
-            unique.append(t)
 
-    if not skip_type_fixup:
-        fixup_types(unique)
+class TypeIndex:
+    """Lookup tables for resolving field type names to message definitions.
 
-    return unique
+    Built once over a set of definitions, it answers each lookup with dict
+    accesses keyed on the fully-qualified name or on the short name, applying
+    the same matching rules as a linear scan would.
+    """
+
+    def __init__(self, types: Iterable[MessageDefinition] = ()) -> None:
+        self._by_name: Dict[str, List[MessageDefinition]] = {}
+        self._by_short_name: Dict[str, List[MessageDefinition]] = {}
+        for msg_def in types:
+            self.add(msg_def)
+
+    def add(self, msg_def: MessageDefinition) -> None:
+        type_name = msg_def.name or ""
+        self._by_name.setdefault(type_name, []).append(msg_def)
+        if "/" in type_name:
+            short_name = type_name.rsplit("/", 1)[1]
+            self._by_short_name.setdefault(short_name, []).append(msg_def)
+
+    def candidates(
+        self, name: str, type_namespace: Optional[str] = None
+    ) -> List[MessageDefinition]:
+        if not name:
+            # If the search is empty, return unnamed types
+            return self._by_name.get("", [])
+        if "/" in name:
+            return self._by_name.get(name, [])
+        if name == "Header":
+            # Header is a special case, see http://wiki.ros.org/msg#Fields
+            return self._by_name.get("std_msgs/Header", [])
+        if type_namespace:
+            return self._by_name.get(f"{type_namespace}/{name}", [])
+        return self._by_short_name.get(name, [])
+
+    def find(
+        self, name: str, type_namespace: Optional[str] = None
+    ) -> MessageDefinition:
+        matches = self.candidates(name, type_namespace)
+        if not matches:
+            raise ValueError(
+                f"Expected 1 top level type definition for '{name}' "
+                f"but found {len(matches)}"
+            )
+        if len(matches) > 1:
+            raise ValueError(
+                f"Cannot unambiguously determine fully-qualified type name for '{name}'"
+            )
+        return matches[0]
 
 
-def fixup_types(types: List[MessageDefinition]) -> None:
+def fixup_types(
+    types: List[MessageDefinition],
+    registry: Optional[MessageDefinitionRegistry] = None,
+) -> None:
+    index = TypeIndex(types)
     for msg in types:
         namespace = "/".join(msg.name.split("/")[:-1]) if msg.name else None
         for field in msg.definitions:
             if field.isComplex:
-                found = _find_type_by_name(types, field.type, namespace)
+                found = _resolve_type(index, registry, field.type, namespace)
                 if found.name is None:
                     raise ValueError(f"Missing type definition for {field.type}")
-                field.type = found.name
+                if field.type != found.name:
+                    field.type = found.name
+                    msg.invalidate_fingerprint()
+
+
+def _resolve_type(
+    index: TypeIndex,
+    registry: Optional[MessageDefinitionRegistry],
+    name: str,
+    type_namespace: Optional[str],
+) -> MessageDefinition:
+    # Types missing from the definition text may already be known to the registry
+    if registry is not None and not index.candidates(name, type_namespace):
+        if "/" in name:
+            qualified: Optional[str] = name
+        elif name == "Header":
+            qualified = "std_msgs/Header"
+        elif type_namespace:
+            qualified = f"{type_namespace}/{name}"
+        else:
+            qualified = None
+        found = registry.get(qualified) if qualified else None
+        if found is not None:
+            return found
+    return index.find(name, type_namespace)
 
 
 def _build_type(lines: List[str]) -> MessageDefinition:
@@ -348,26 +463,11 @@ def _build_type(lines: List[str]) -> MessageDefinition:
         if line.startswith("MSG:"):
             complex_type_name = line.split(":", 1)[1].strip()
             continue
-        line = re.sub(r"#.*", "", line).strip()
-        if not line:
+        tokens = scan_ros1_line(line)
+        if tokens is None:
             continue
-        m = re.match(
-            r"(?P<type>[^\s]+)\s+(?P<name>[^\s=]+)(\s*=\s*(?P<value>.*))?", line
-        )
-        if not m:
-            raise ValueError(f"Could not parse line: '{line}'")
-        type_name = normalize_type(m.group("type"))
-        name = m.group("name")
-        value_text = m.group("value")
-        is_array = False
-        array_length: Optional[int] = None
-        array_match = re.match(r"^(?P<base>[^\[]+)\[(?P<len>\d*)\]$", type_name)
-        if array_match:
-            type_name = array_match.group("base")
-            is_array = True
-            length = array_match.group("len")
-            if length:
-                array_length = int(length)
+        raw_type, name, value_text = tokens
+        type_name, is_array, array_length = split_array_suffix(normalize_type(raw_type))
         isComplex = not _is_builtin(type_name)
         field = MessageDefinitionField(
             type=type_name,
@@ -375,46 +475,13 @@ def _build_type(lines: List[str]) -> MessageDefinition:
             isArray=is_array,
             arrayLength=array_length,
             isConstant=value_text is not None,
-            valueText=value_text.strip() if value_text is not None else None,
+            valueText=value_text,
             isComplex=isComplex,
         )
         definitions.append(field)
     return MessageDefinition(name=complex_type_name, definitions=definitions)
 
 
-def _find_type_by_name(
-    types: List[MessageDefinition], name: str, type_namespace: Optional[str]
-) -> MessageDefinition:
-    matches: List[MessageDefinition] = []
-    for t in types:
-        type_name = t.name or ""
-        if not name:
-            if not type_name:
-                matches.append(t)
-        elif "/" in name:
-            if type_name == name:
-                matches.append(t)
-        elif name == "Header":
-            if type_name == "std_msgs/Header":
-                matches.append(t)
-        elif type_namespace:
-            if type_name == f"{type_namespace}/{name}":
-                matches.append(t)
-        else:
-            if type_name.endswith(f"/{name}"):
-                matches.append(t)
-    if not matches:
-        raise ValueError(
-            f"Expected 1 top level type definition for '{name}' "
-            f"but found {len(matches)}"
-        )
-    if len(matches) > 1:
-        raise ValueError(
-            f"Cannot unambiguously determine fully-qualified type name for '{name}'"
-        )
-    return matches[0]
-
-
 def normalize_type(type_name: str) -> str:
     if type_name == "char":
         return "uint8"
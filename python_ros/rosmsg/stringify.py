@@ -17,7 +17,7 @@ def _stringify_value(value: Any) -> str:
 
 
 def stringify_default_value(value: Any) -> str:
-    if isinstance(value, list):
+    if isinstance(value, (list, tuple)):
         return "[" + ", ".join(_stringify_value(x) for x in value) + "]"
     return _stringify_value(value)
 
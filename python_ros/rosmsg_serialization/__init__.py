@@ -0,0 +1,78 @@
+from .cdr import (
+    CdrMessageReader,
+    CdrMessageWriter,
+    clear_cdr_cache,
+    compile_cdr_reader,
+    compile_cdr_writer,
+)
+from .classes import MessageClassFactory, clear_message_class_cache, message_class
+from .columnar import ColumnarReader, ListColumn
+from .layout import FieldLayout, LayoutAnalyzer, MessageLayout, analyze_layouts
+from .lazy import (
+    CompiledLazyReader,
+    LazyArray,
+    LazyMessage,
+    LazyMessageReader,
+    clear_lazy_reader_cache,
+    compile_lazy_reader,
+)
+from .projection import (
+    CompiledProjector,
+    MessageProjector,
+    clear_projector_cache,
+    compile_projector,
+)
+from .reader import CompiledReader, MessageReader, clear_reader_cache, compile_reader
+from .transcoder import (
+    CompiledTranscoder,
+    MessageTranscoder,
+    clear_transcoder_cache,
+    compile_transcoder,
+)
+from .writer import (
+    CompiledWriter,
+    MessageWriter,
+    SerializedBatch,
+    clear_writer_cache,
+    compile_writer,
+)
+
+__all__ = [
+    "MessageReader",
+    "MessageWriter",
+    "CdrMessageReader",
+    "CdrMessageWriter",
+    "MessageTranscoder",
+    "MessageClassFactory",
+    "LazyMessageReader",
+    "MessageProjector",
+    "ColumnarReader",
+    "ListColumn",
+    "LazyMessage",
+    "LazyArray",
+    "CompiledReader",
+    "CompiledWriter",
+    "CompiledLazyReader",
+    "CompiledProjector",
+    "CompiledTranscoder",
+    "SerializedBatch",
+    "LayoutAnalyzer",
+    "MessageLayout",
+    "FieldLayout",
+    "analyze_layouts",
+    "message_class",
+    "compile_reader",
+    "compile_writer",
+    "compile_lazy_reader",
+    "compile_projector",
+    "compile_cdr_reader",
+    "compile_cdr_writer",
+    "compile_transcoder",
+    "clear_reader_cache",
+    "clear_writer_cache",
+    "clear_lazy_reader_cache",
+    "clear_projector_cache",
+    "clear_cdr_cache",
+    "clear_transcoder_cache",
+    "clear_message_class_cache",
+]
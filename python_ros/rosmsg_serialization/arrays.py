@@ -0,0 +1,47 @@
+"""Zero-copy views of the primitive arrays inside serialized messages.
+
+With NumPy installed, arrays are ``numpy.frombuffer`` views with an explicit
+little-endian dtype. Without it they are ``memoryview`` casts of the source
+buffer, which use the host byte order; on big-endian hosts, and whenever a copy
+is requested, they are ``array.array`` copies in host order instead.
+"""
+
+from __future__ import annotations
+
+import sys
+from array import array
+from typing import Any
+
+from .primitives import PRIMITIVE_FORMATS
+
+try:
+    import numpy
+    from numpy.lib.stride_tricks import sliding_window_view
+except ImportError:  # pragma: no cover - depends on the environment
+    numpy = None
+    sliding_window_view = None
+
+HAVE_NUMPY = numpy is not None
+
+LITTLE_ENDIAN_HOST = sys.byteorder == "little"
+
+
+def numpy_dtype(type_name: str) -> Any:
+    """Return the little-endian NumPy dtype of a fixed-size builtin type."""
+
+    if numpy is None:
+        raise ImportError("NumPy is required for NumPy array views")
+    return numpy.dtype("<" + PRIMITIVE_FORMATS[type_name])
+
+
+def copy_array(code: str, data: memoryview) -> array:
+    """Copy little-endian *data* into an ``array.array`` in host byte order.
+
+    ``bool`` arrays have no ``array`` typecode and are copied as ``"B"``.
+    """
+
+    values = array("B" if code == "?" else code)
+    values.frombytes(data)
+    if not LITTLE_ENDIAN_HOST and values.itemsize > 1:
+        values.byteswap()
+    return values
@@ -0,0 +1,159 @@
+"""Benchmark the compiled reader against the interpreted reference decoder.
+
+Run with ``python -m python_ros.rosmsg_serialization.benchmark``. Messages are
+synthesized from the definitions in the ``rosmsg-msgs-common`` corpus. With
+``--projections`` the projectors of :data:`PROJECTION_BENCHMARKS` are timed
+against the full compiled decode instead.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import struct
+import timeit
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from python_ros.message_definition import MessageDefinition, MessageDefinitionField
+from python_ros.rosmsg import parse
+
+from .interpreted import InterpretedMessageReader
+from .primitives import BYTE_TYPES, PRIMITIVE_FORMATS
+from .projection import MessageProjector
+from .reader import MessageReader
+
+MSGDEFS_DIR = (
+    Path(__file__).resolve().parents[2] / "packages/rosmsg-msgs-common/msgdefs/ros1"
+)
+
+BENCHMARK_TYPES = [
+    "std_msgs/Header",
+    "geometry_msgs/PoseStamped",
+    "geometry_msgs/TransformStamped",
+    "nav_msgs/Odometry",
+    "sensor_msgs/Imu",
+    "sensor_msgs/JointState",
+    "sensor_msgs/LaserScan",
+    "sensor_msgs/PointCloud2",
+    "tf2_msgs/TFMessage",
+    "visualization_msgs/MarkerArray",
+]
+
+PROJECTION_BENCHMARKS = {
+    "nav_msgs/Odometry": ["header.stamp", "pose.pose.position"],
+    "sensor_msgs/PointCloud2": ["header.stamp", "width", "is_dense"],
+}
+
+
+def load_definitions(
+    name: str, msgdefs_dir: Path = MSGDEFS_DIR
+) -> List[MessageDefinition]:
+    return parse((msgdefs_dir / f"{name}.msg").read_text())
+
+
+def synthesize_message(
+    definitions: List[MessageDefinition], array_length: int = 8, seed: int = 0
+) -> bytes:
+    """Serialize a message of random values; every array gets *array_length* items."""
+
+    rng = random.Random(seed)
+    types: Dict[str, MessageDefinition] = {
+        d.name: d for d in definitions if d.name is not None
+    }
+    out = bytearray()
+
+    def write_value(field: MessageDefinitionField) -> None:
+        if field.isComplex:
+            write_message(types[field.type])
+        elif field.type == "string":
+            text = "".join(rng.choice("abcdefgh_/") for _ in range(rng.randrange(16)))
+            data = text.encode()
+            out.extend(struct.pack("<I", len(data)) + data)
+        else:
+            fmt = "<" + PRIMITIVE_FORMATS[field.type]
+            if fmt[1] in "fd":
+                values = [rng.uniform(-1e3, 1e3)]
+            elif fmt[1] == "?":
+                values = [rng.random() < 0.5]
+            else:
+                bits = struct.calcsize(fmt) * 8 // (len(fmt) - 1)
+                low, high = (-(1 << bits - 1), (1 << bits - 1) - 1)
+                if fmt[1].isupper():
+                    low, high = 0, (1 << bits) - 1
+                values = [rng.randint(low, high) for _ in fmt[1:]]
+            out.extend(struct.pack(fmt, *values))
+
+    def write_message(msg_def: MessageDefinition) -> None:
+        for field in msg_def.definitions:
+            if field.isConstant:
+                continue
+            if not field.isArray:
+                write_value(field)
+                continue
+            length = field.arrayLength
+            if length is None:
+                length = array_length
+                out.extend(struct.pack("<I", length))
+            if field.type in BYTE_TYPES:
+                out.extend(rng.randbytes(length))
+            else:
+                for _ in range(length):
+                    write_value(field)
+
+    write_message(definitions[0])
+    return bytes(out)
+
+
+def _best_time(func, number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--msgdefs", type=Path, default=MSGDEFS_DIR)
+    parser.add_argument("--array-length", type=int, default=32)
+    parser.add_argument("--number", type=int, default=2000)
+    parser.add_argument("--projections", action="store_true")
+    parser.add_argument("types", nargs="*")
+    args = parser.parse_args(argv)
+    if args.projections:
+        _benchmark_projections(args)
+        return
+
+    print(
+        f"{'type':<32} {'bytes':>8} {'interpreted':>12} {'compiled':>10} {'speedup':>8}"
+    )
+    for name in args.types or BENCHMARK_TYPES:
+        definitions = load_definitions(name, args.msgdefs)
+        data = synthesize_message(definitions, args.array_length)
+        interpreted = InterpretedMessageReader(definitions)
+        compiled = MessageReader(definitions)
+        assert compiled.read_message(data) == interpreted.read_message(data)
+
+        slow = _best_time(lambda: interpreted.read_message(data), args.number)
+        fast = _best_time(lambda: compiled.read_message(data), args.number)
+        print(
+            f"{name:<32} {len(data):>8} {slow * 1e6:>10.1f}us {fast * 1e6:>8.1f}us "
+            f"{slow / fast:>7.1f}x"
+        )
+
+
+def _benchmark_projections(args: argparse.Namespace) -> None:
+    print(f"{'type':<32} {'bytes':>8} {'full':>10} {'projected':>10} {'speedup':>8}")
+    for name in args.types or PROJECTION_BENCHMARKS:
+        definitions = load_definitions(name, args.msgdefs)
+        data = synthesize_message(definitions, args.array_length)
+        reader = MessageReader(definitions)
+        projector = MessageProjector(definitions, PROJECTION_BENCHMARKS[name])
+
+        slow = _best_time(lambda: reader.read_message(data), args.number)
+        fast = _best_time(lambda: projector.project(data), args.number)
+        print(
+            f"{name:<32} {len(data):>8} {slow * 1e6:>8.1f}us {fast * 1e6:>8.1f}us "
+            f"{slow / fast:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1065 @@
+"""Compile CDR message decoders and encoders for ROS 2 message definitions.
+
+ROS 2 serializes messages with the OMG Common Data Representation behind a
+four-byte encapsulation header whose second byte selects the byte order. Every
+primitive is aligned to its own size, counted from the end of that header.
+Strings are prefixed with a ``uint32`` length that includes their NUL
+terminator, and sequences with a ``uint32`` element count.
+
+As for ROS 1, one function is generated per message type and runs of fixed-size
+fields share a single ``struct`` call. While the alignment of the offset is
+known when the code is generated, padding becomes ``x`` codes in those runs;
+the offset is only aligned at run time after fields of variable size.
+"""
+
+from __future__ import annotations
+
+import struct
+from typing import Any, Dict, FrozenSet, List, Mapping, Optional, Sequence, Tuple
+
+from python_ros.message_definition import MessageDefinition, MessageDefinitionField
+
+from .classes import MessageClassFactory
+from .codegen import (
+    CodeGenerator,
+    CompiledCache,
+    RunFunctionBuilder,
+    attribute_access,
+    compact_format,
+)
+from .primitives import (
+    BYTE_TYPES,
+    PRIMITIVE_FORMATS,
+    TIME_TYPES,
+    as_byte_view,
+    length_error,
+)
+from .reader import CompiledReader
+from .writer import CompiledWriter, _serialize_error, _utf8_len
+
+# Encapsulation kinds of plain CDR in the second byte of the header
+CDR_BE = 0x00
+CDR_LE = 0x01
+
+# ``time`` and ``duration`` are ``builtin_interfaces`` messages with a signed
+# ``sec`` and an unsigned ``nanosec`` in ROS 2
+CDR_FORMATS = {**PRIMITIVE_FORMATS, "byte": "B", "time": "iI", "duration": "iI"}
+
+_WSTRING_ERROR = "wstring is implementation-defined and therefore not supported"
+
+
+def cdr_format(type_name: str) -> str:
+    """Return the ``struct`` format of a fixed-size CDR primitive."""
+
+    fmt = CDR_FORMATS.get(type_name)
+    if fmt is None:
+        if type_name == "wstring":
+            raise ValueError(_WSTRING_ERROR)
+        raise ValueError(f"Unsupported type '{type_name}'")
+    return fmt
+
+
+def cdr_alignment(type_name: str) -> int:
+    """Alignment of a fixed-size CDR primitive, which is the size of its values."""
+
+    return (
+        4 if type_name in TIME_TYPES else struct.calcsize("<" + cdr_format(type_name))
+    )
+
+
+class CdrMessageReader:
+    """Decode CDR-serialized ROS 2 messages into dictionaries.
+
+    Values decode as with :class:`MessageReader`, except that ``time`` and
+    ``duration`` decode to ``{"sec": ..., "nanosec": ...}`` dictionaries like
+    the ``builtin_interfaces`` messages they stand for. Both byte orders are
+    read; the decoder for big-endian buffers is compiled on first use.
+
+    With *message_classes* set, messages decode to instances of the classes of
+    :mod:`.classes` instead of dictionaries.
+    """
+
+    def __init__(
+        self, definitions: List[MessageDefinition], message_classes: bool = False
+    ) -> None:
+        self._definitions = definitions
+        self._message_classes = message_classes
+        self._compiled = {True: compile_cdr_reader(definitions, True, message_classes)}
+
+    def read_message(self, buffer: Any) -> Dict[str, Any]:
+        view = as_byte_view(buffer)
+        if len(view) < 4:
+            raise ValueError(
+                f"Buffer too short for the CDR encapsulation header: {len(view)} bytes"
+            )
+        kind = view[1]
+        if kind not in (CDR_BE, CDR_LE):
+            raise ValueError(f"Unsupported CDR encapsulation kind {kind:#04x}")
+        try:
+            message, _ = self._reader(kind == CDR_LE).read(view[4:], 0)
+        except struct.error as exc:
+            raise ValueError(f"Buffer too short to read message: {exc}") from exc
+        return message
+
+    def source(self, little_endian: bool = True) -> str:
+        return self._reader(little_endian).source
+
+    def _reader(self, little_endian: bool) -> CompiledReader:
+        compiled = self._compiled.get(little_endian)
+        if compiled is None:
+            compiled = compile_cdr_reader(
+                self._definitions, little_endian, self._message_classes
+            )
+            self._compiled[little_endian] = compiled
+        return compiled
+
+
+class CdrMessageWriter:
+    """Serialize messages shaped like the output of :class:`CdrMessageReader`.
+
+    ``time`` and ``duration`` values may be mappings with ``sec`` and
+    ``nanosec`` (or ``nsec``) keys or objects with ``sec`` and ``nsec``
+    attributes. A missing field takes the default value of its definition, or
+    zero. String and sequence upper bounds and the length of fixed-size arrays
+    are checked before anything is written.
+
+    With *message_classes* set, messages and nested messages are instead read
+    through attributes, as on the classes of :mod:`.classes`.
+    """
+
+    def __init__(
+        self,
+        definitions: List[MessageDefinition],
+        little_endian: bool = True,
+        message_classes: bool = False,
+    ) -> None:
+        self._compiled = compile_cdr_writer(definitions, little_endian, message_classes)
+        self._header = bytes((0, CDR_LE if little_endian else CDR_BE, 0, 0))
+
+    def calculate_byte_size(self, message: Any) -> int:
+        try:
+            return 4 + self._compiled.size(message)
+        except (KeyError, TypeError, AttributeError) as exc:
+            raise _serialize_error(exc) from exc
+
+    def write_message(self, message: Any, output: Optional[Any] = None) -> Any:
+        """Serialize *message* into *output*, or into a new ``bytearray``."""
+
+        size = self.calculate_byte_size(message)
+        if output is None:
+            output = bytearray(size)
+        elif len(output) < size:
+            raise ValueError(
+                f"Output buffer too small: need {size} bytes, got {len(output)}"
+            )
+        with memoryview(output) as view:
+            view[:4] = self._header
+            try:
+                written = self._compiled.write(view[4:size], 0, message)
+            except (KeyError, TypeError, AttributeError, struct.error) as exc:
+                raise _serialize_error(exc) from exc
+        if written != size - 4:
+            raise ValueError(
+                f"Message size changed during serialization: expected {size - 4} "
+                f"bytes, wrote {written}"
+            )
+        return output
+
+    def source(self) -> str:
+        return self._compiled.source
+
+
+_compiled_readers: CompiledCache[CompiledReader] = CompiledCache()
+_compiled_writers: CompiledCache[CompiledWriter] = CompiledCache()
+
+
+def compile_cdr_reader(
+    definitions: List[MessageDefinition],
+    little_endian: bool = True,
+    message_classes: bool = False,
+) -> CompiledReader:
+    """Return the CDR decoder for *definitions* and a byte order, compiling it once.
+
+    The compiled function decodes the message behind the encapsulation header.
+    """
+
+    definitions = _rooted(definitions)
+    return _compiled_readers.get(
+        definitions,
+        lambda: _CdrReaderCompiler(
+            definitions, little_endian, message_classes
+        ).compile(),
+        little_endian,
+        message_classes,
+    )
+
+
+def compile_cdr_writer(
+    definitions: List[MessageDefinition],
+    little_endian: bool = True,
+    message_classes: bool = False,
+) -> CompiledWriter:
+    """Return the CDR encoder for *definitions* and a byte order, compiling it once.
+
+    The compiled functions size and write the message behind the encapsulation
+    header.
+    """
+
+    definitions = _rooted(definitions)
+    return _compiled_writers.get(
+        definitions,
+        lambda: _CdrWriterCompiler(
+            definitions, little_endian, message_classes
+        ).compile(),
+        little_endian,
+        message_classes,
+    )
+
+
+def clear_cdr_cache() -> None:
+    _compiled_readers.clear()
+    _compiled_writers.clear()
+
+
+def _rooted(definitions: List[MessageDefinition]) -> List[MessageDefinition]:
+    """Move the root type to the front; modules of constants are skipped."""
+
+    if not definitions:
+        return definitions
+    root = next(
+        (
+            d
+            for d in definitions
+            if not d.definitions or not all(f.isConstant for f in d.definitions)
+        ),
+        None,
+    )
+    if root is None:
+        raise ValueError("No root message definition in msgDefs")
+    if root is definitions[0]:
+        return definitions
+    return [root, *(d for d in definitions if d is not root)]
+
+
+def _fingerprints(definitions: List[MessageDefinition]) -> Tuple[str, ...]:
+    return tuple(d.fingerprint() for d in definitions)
+
+
+def _times(values: Sequence[int]) -> List[Dict[str, int]]:
+    it = iter(values)
+    return [{"sec": sec, "nanosec": nanosec} for sec, nanosec in zip(it, it)]
+
+
+def _time(value: Any) -> Tuple[int, int]:
+    if isinstance(value, Mapping):
+        nanosec = value.get("nanosec")
+        return value["sec"], value["nsec"] if nanosec is None else nanosec
+    return value.sec, value.nsec
+
+
+def _flat_times(values: Sequence[Any]) -> List[int]:
+    return [part for value in values for part in _time(value)]
+
+
+def _read_strings(
+    buf: memoryview, offset: int, count: int, unpack_u32: Any
+) -> Tuple[List[str], int]:
+    end = len(buf)
+    strings = []
+    for _ in range(count):
+        offset += -offset & 3
+        (size,) = unpack_u32(buf, offset)
+        offset += 4
+        if size > end - offset:
+            raise length_error("String", size, end - offset)
+        strings.append(str(buf[offset : offset + size - 1], "utf-8", "replace"))
+        offset += size
+    return strings, offset
+
+
+def _strings_size(
+    offset: int, strings: Sequence[str], bound: Optional[int], name: str
+) -> int:
+    for text in strings:
+        size = _utf8_len(text)
+        if bound is not None and size > bound:
+            raise _bound_error(name, size, bound)
+        offset += (-offset & 3) + 5 + size
+    return offset
+
+
+def _write_strings(buf: Any, offset: int, strings: Sequence[str], pack_u32: Any) -> int:
+    for text in strings:
+        padding = -offset & 3
+        buf[offset : offset + padding] = _ZEROS[padding]
+        offset += padding
+        data = text.encode()
+        size = len(data)
+        pack_u32(buf, offset, size + 1)
+        buf[offset + 4 : offset + 4 + size] = data
+        buf[offset + 4 + size] = 0
+        offset += 5 + size
+    return offset
+
+
+def _bound_error(name: str, size: int, bound: int) -> ValueError:
+    return ValueError(
+        f"Field '{name}' has length {size}, which exceeds its upper bound of {bound}"
+    )
+
+
+def _length_mismatch(name: str, size: int, length: int) -> ValueError:
+    return ValueError(f"Field '{name}' has length {size}, expected {length}")
+
+
+_ZEROS = tuple(bytes(n) for n in range(8))
+
+
+class _CdrFunctionBuilder(RunFunctionBuilder):
+    """Function builder that tracks the alignment of the offset.
+
+    ``residue`` is the offset plus the size of the pending run modulo
+    ``modulus``; a modulus of 1 means nothing is known.
+    """
+
+    generator: _CdrCompiler
+
+    def __init__(self, generator: _CdrCompiler, aligned: bool) -> None:
+        super().__init__(generator)
+        self.modulus = 8 if aligned else 1
+        self.residue = 0
+        self.run_size = 0
+
+    def queue(self, fmt: str, size: int) -> None:
+        self.run_formats.append(fmt)
+        self.run_size += size
+        self.advance(size)
+
+    def advance(self, size: int) -> None:
+        self.residue = (self.residue + size) % self.modulus
+
+    def assume(self, alignment: int) -> None:
+        """Record that the offset is now a multiple of *alignment*."""
+
+        self.modulus = alignment
+        self.residue = 0
+
+    def align(self, alignment: int) -> None:
+        """Pad so that the next item starts at a multiple of *alignment*."""
+
+        if alignment <= self.modulus:
+            padding = -self.residue % alignment
+            if padding:
+                self.queue(f"{padding}x", padding)
+            return
+        self.flush()
+        self.lines.extend(self.padding(f"-offset & {alignment - 1}"))
+        self.assume(alignment)
+
+    def align_elements(self, count: str, alignment: int) -> None:
+        """Align for the elements of a sequence; empty sequences are not padded."""
+
+        self.flush()
+        if alignment <= self.modulus:
+            padding = -self.residue % alignment
+            if not padding:
+                return
+            lines = self.padding(str(padding))
+        else:
+            lines = self.padding(f"-offset & {alignment - 1}")
+        self.lines.append(f"if {count}:")
+        self.lines.extend("    " + line for line in lines)
+
+    def padding(self, size: str) -> List[str]:
+        """Lines advancing the offset over *size* bytes of padding."""
+
+        return [f"offset += {size}"]
+
+    def flush(self) -> None:
+        if not self.run_formats:
+            return
+        fmt = self.generator.endian + compact_format("".join(self.run_formats))
+        self.emit_run(fmt)
+        self.lines.append(f"offset += {self.run_size}")
+        self.run_formats = []
+        self.run_size = 0
+
+    def emit_run(self, fmt: str) -> None:
+        pass
+
+
+class _CdrReaderBuilder(_CdrFunctionBuilder):
+    def __init__(
+        self, generator: _CdrCompiler, aligned: bool, tuple_name: Optional[str] = None
+    ) -> None:
+        super().__init__(generator, aligned)
+        self.tuple_name = tuple_name
+        self._run_var: Optional[str] = None
+        self.run_count = 0
+
+    def add_fixed(self, fmt: str, count: int, size: int) -> Tuple[str, int]:
+        """Queue a fixed-size item; returns the tuple and index of its values."""
+
+        if self._run_var is None:
+            self._run_var = self.tuple_name or self.variable("_t")
+        index = self.run_count
+        self.run_count += count
+        self.queue(fmt, size)
+        return self._run_var, index
+
+    def emit_run(self, fmt: str) -> None:
+        if self.run_count:
+            unpack = self.generator.struct_method(fmt, "unpack_from")
+            self.lines.append(f"{self._run_var} = {unpack}(buf, offset)")
+        self._run_var = None
+        self.run_count = 0
+
+    def read_count(self) -> str:
+        self.align(4)
+        self.flush()
+        self.lines.append("(_n,) = _u32(buf, offset)")
+        self.lines.append("offset += 4")
+        self.advance(4)
+        return "_n"
+
+    def check_size(self, kind: str, size: str) -> None:
+        self.lines.append(f"if {size} > _end - offset:")
+        self.lines.append(f"    raise _length_error({kind!r}, {size}, _end - offset)")
+
+
+class _CdrSizeBuilder(_CdrFunctionBuilder):
+    pass
+
+
+class _CdrWriterBuilder(_CdrFunctionBuilder):
+    def __init__(
+        self,
+        generator: _CdrCompiler,
+        aligned: bool,
+        parent: Optional[_CdrWriterBuilder] = None,
+    ) -> None:
+        super().__init__(generator, aligned)
+        self._parent = parent
+        self.args: List[str] = []
+
+    def variable(self, prefix: str = "v") -> str:
+        # Inlined loop bodies must not reuse the names of the enclosing function
+        if self._parent is not None:
+            return self._parent.variable(prefix)
+        return super().variable(prefix)
+
+    def add_fixed(self, fmt: str, size: int, *args: str) -> None:
+        self.args.extend(args)
+        self.queue(fmt, size)
+
+    def emit_run(self, fmt: str) -> None:
+        pack = self.generator.struct_method(fmt, "pack_into")
+        self.lines.append(f"{pack}(buf, offset, {', '.join(self.args)})")
+        self.args = []
+
+    def padding(self, size: str) -> List[str]:
+        lines = []
+        if not size.isdigit():
+            lines.append(f"_p = {size}")
+            size = "_p"
+        lines.append(f"buf[offset : offset + {size}] = _zeros[{size}]")
+        lines.append(f"offset += {size}")
+        return lines
+
+
+class _CdrCompiler(CodeGenerator):
+    def __init__(
+        self,
+        definitions: List[MessageDefinition],
+        little_endian: bool,
+        namespace: Dict[str, Any],
+    ) -> None:
+        super().__init__(definitions, namespace)
+        self.endian = "<" if little_endian else ">"
+        self._alignments: Dict[str, Optional[FrozenSet[int]]] = {}
+
+    @staticmethod
+    def data_fields(msg_def: MessageDefinition) -> List[MessageDefinitionField]:
+        return [f for f in msg_def.definitions if not f.isConstant]
+
+    @staticmethod
+    def is_empty_array(field: MessageDefinitionField) -> bool:
+        """Whether *field* is an array of length zero.
+
+        Such arrays take no space and, like empty sequences, are not padded.
+        """
+
+        if field.arrayLength != 0:
+            return False
+        if field.type == "wstring":
+            raise ValueError(_WSTRING_ERROR)
+        return True
+
+    @staticmethod
+    def align_elements(
+        fb: _CdrFunctionBuilder, count: str, alignment: int, length: Optional[int]
+    ) -> None:
+        """Align for the elements of a sequence, or of an array of *length*."""
+
+        if length is None:
+            fb.align_elements(count, alignment)
+            return
+        if length:
+            fb.align(alignment)
+        fb.flush()
+
+    def stride_alignment(self, type_name: str) -> Optional[int]:
+        """Alignment shared by every field of a fixed-size type, else ``None``.
+
+        Such messages have no padding inside, and arrays of them none between
+        elements, so one format repeats per element.
+        """
+
+        alignments = self._leaf_alignments(type_name)
+        if alignments is None or len(alignments) != 1:
+            return None
+        return next(iter(alignments))
+
+    def _leaf_alignments(self, type_name: str) -> Optional[FrozenSet[int]]:
+        if type_name not in self._alignments:
+            alignments = set()
+            fields = self.data_fields(self.lookup(type_name))
+            if not fields:
+                alignments.add(1)
+            for field in fields:
+                if self.is_empty_array(field):
+                    continue
+                if field.type in ("string", "wstring") or (
+                    field.isArray and field.arrayLength is None
+                ):
+                    self._alignments[type_name] = None
+                    return None
+                if field.isComplex:
+                    nested = self._leaf_alignments(field.type)
+                    if nested is None:
+                        self._alignments[type_name] = None
+                        return None
+                    alignments |= nested
+                else:
+                    alignments.add(cdr_alignment(field.type))
+            self._alignments[type_name] = frozenset(alignments)
+        return self._alignments[type_name]
+
+
+class _CdrReaderCompiler(_CdrCompiler):
+    def __init__(
+        self,
+        definitions: List[MessageDefinition],
+        little_endian: bool,
+        message_classes: bool = False,
+    ):
+        endian = "<" if little_endian else ">"
+        super().__init__(
+            definitions,
+            little_endian,
+            {
+                "_u32": struct.Struct(endian + "I").unpack_from,
+                "_unpack_from": struct.unpack_from,
+                "_times": _times,
+                "_read_strings": _read_strings,
+                "_length_error": length_error,
+            },
+        )
+        self._classes = MessageClassFactory(definitions) if message_classes else None
+        self._class_names: Dict[Optional[str], str] = {}
+
+    def compile(self) -> CompiledReader:
+        entry = self._reader_function(self.root, aligned=True)
+        source = self.execute("<rosmsg_serialization cdr reader>")
+        return CompiledReader(self.namespace[entry], source)
+
+    def _reader_function(
+        self, msg_def: MessageDefinition, aligned: bool = False
+    ) -> str:
+        name, new = self.function_name("read", msg_def)
+        if new:
+            fb = _CdrReaderBuilder(self, aligned)
+            fb.lines.append("_end = len(buf)")
+            expr = self._emit_message(fb, msg_def)
+            self.sources.append(fb.function(f"{name}(buf, offset)", f"{expr}, offset"))
+        return name
+
+    def _builder_function(
+        self, msg_def: MessageDefinition
+    ) -> Tuple[str, str, int, int]:
+        """Function building a stride-aligned message from its unpacked values.
+
+        Returns its name, the format of one element, the element size and the
+        number of values of an element.
+        """
+
+        fb = _CdrReaderBuilder(self, True, "t")
+        expr = self._emit_message(fb, msg_def)
+        fmt = self.endian + compact_format("".join(fb.run_formats))
+        name, new = self.function_name("build", msg_def)
+        if new:
+            self.sources.append(f"def {name}(t):\n    return {expr}")
+        return name, fmt, fb.run_size, fb.run_count
+
+    def _emit_message(self, fb: _CdrReaderBuilder, msg_def: MessageDefinition) -> str:
+        fields = self.data_fields(msg_def)
+        if not fields:
+            # ROS 2 gives empty messages a uint8 placeholder member
+            fb.queue("x", 1)
+        items = [self._emit_field(fb, f) for f in fields]
+        return self.message_expr(msg_def, items)
+
+    def message_expr(self, msg_def: MessageDefinition, items: List[str]) -> str:
+        """Expression building a message of *msg_def* from its field values."""
+
+        if self._classes is None:
+            fields = self.data_fields(msg_def)
+            pairs = [f"{f.name!r}: {item}" for f, item in zip(fields, items)]
+            return "{" + ", ".join(pairs) + "}"
+        name = self._class_names.get(msg_def.name)
+        if name is None:
+            name = f"_cls{len(self._class_names)}"
+            self.namespace[name] = self._classes.for_definition(msg_def)
+            self._class_names[msg_def.name] = name
+        return f"{name}({', '.join(items)})"
+
+    def _emit_field(self, fb: _CdrReaderBuilder, field: MessageDefinitionField) -> str:
+        type_name = field.type
+        if not field.isArray:
+            if field.isComplex:
+                return self._emit_message(fb, self.lookup(type_name))
+            if type_name == "string":
+                return self._emit_string(fb)
+            fb.align(cdr_alignment(type_name))
+            fmt = cdr_format(type_name)
+            t, i = fb.add_fixed(fmt, len(fmt), struct.calcsize("<" + fmt))
+            if type_name in TIME_TYPES:
+                return f"{{'sec': {t}[{i}], 'nanosec': {t}[{i + 1}]}}"
+            return f"{t}[{i}]"
+
+        if self.is_empty_array(field):
+            return "b''" if type_name in BYTE_TYPES else "[]"
+        length = field.arrayLength
+        if length is not None and not field.isComplex and type_name != "string":
+            return self._emit_fixed_array(fb, type_name, length)
+        if length is not None and fb.tuple_name is not None:
+            return self._emit_fixed_messages(fb, type_name, length)
+        count = fb.read_count() if length is None else str(length)
+        var = fb.variable()
+        lines = fb.lines
+        if type_name == "string":
+            fb.flush()
+            lines.append(f"{var}, offset = _read_strings(buf, offset, {count}, _u32)")
+            fb.assume(1)
+            return var
+        if field.isComplex:
+            alignment = self.stride_alignment(type_name)
+            if alignment is None:
+                reader = self._reader_function(self.lookup(type_name))
+                fb.flush()
+                lines.append(f"{var} = []")
+                lines.append(f"for _ in range({count}):")
+                lines.append(f"    _e, offset = {reader}(buf, offset)")
+                lines.append(f"    {var}.append(_e)")
+                fb.assume(1)
+                return var
+            builder, fmt, size, _ = self._builder_function(self.lookup(type_name))
+            iter_unpack = self.struct_method(fmt, "iter_unpack")
+            self.align_elements(fb, count, alignment, length)
+            size_expr = f"{count} * {size}"
+            fb.check_size("Array", size_expr)
+            lines.append(
+                f"{var} = [{builder}(_e) for _e in "
+                f"{iter_unpack}(buf[offset : offset + {size_expr}])]"
+            )
+        else:
+            alignment = cdr_alignment(type_name)
+            fmt = cdr_format(type_name)
+            size = struct.calcsize("<" + fmt)
+            self.align_elements(fb, count, alignment, length)
+            size_expr = count if size == 1 else f"{count} * {size}"
+            fb.check_size("Array", size_expr)
+            if type_name in BYTE_TYPES:
+                lines.append(f"{var} = bytes(buf[offset : offset + {count}])")
+            elif type_name in TIME_TYPES:
+                lines.append(
+                    f"{var} = _times(_unpack_from({self.endian!r} + 'iI' * {count}, "
+                    "buf, offset))"
+                )
+            else:
+                lines.append(
+                    f"{var} = list(_unpack_from(f'{self.endian}{{{count}}}{fmt}', "
+                    "buf, offset))"
+                )
+        lines.append(f"offset += {size_expr}")
+        fb.assume(alignment if length else min(alignment, 4))
+        return var
+
+    def _emit_string(self, fb: _CdrReaderBuilder) -> str:
+        fb.read_count()
+        fb.check_size("String", "_n")
+        var = fb.variable()
+        # The length includes the NUL terminator
+        fb.lines.append(
+            f'{var} = str(buf[offset : offset + _n - 1], "utf-8", "replace")'
+        )
+        fb.lines.append("offset += _n")
+        fb.assume(1)
+        return var
+
+    def _emit_fixed_messages(
+        self, fb: _CdrReaderBuilder, type_name: str, length: int
+    ) -> str:
+        """A fixed array of messages inside an element built from unpacked values."""
+
+        builder, fmt, size, count = self._builder_function(self.lookup(type_name))
+        t, i = fb.add_fixed(
+            compact_format(fmt[1:] * length), count * length, size * length
+        )
+        if not count:
+            return f"[{builder}(()) for _ in range({length})]"
+        items = f"range({i}, {i + count * length}, {count})"
+        return f"[{builder}({t}[_j : _j + {count}]) for _j in {items}]"
+
+    def _emit_fixed_array(
+        self, fb: _CdrReaderBuilder, type_name: str, length: int
+    ) -> str:
+        fb.align(cdr_alignment(type_name))
+        fmt = cdr_format(type_name)
+        size = struct.calcsize("<" + fmt) * length
+        if type_name in BYTE_TYPES:
+            t, i = fb.add_fixed(f"{length}s", 1, size)
+            return f"{t}[{i}]"
+        count = len(fmt) * length
+        t, i = fb.add_fixed(compact_format(fmt * length), count, size)
+        if type_name in TIME_TYPES:
+            return f"_times({t}[{i}:{i + count}])"
+        return f"list({t}[{i}:{i + count}])"
+
+
+class _CdrWriterCompiler(_CdrCompiler):
+    def __init__(
+        self,
+        definitions: List[MessageDefinition],
+        little_endian: bool,
+        message_classes: bool = False,
+    ):
+        endian = "<" if little_endian else ">"
+        super().__init__(
+            definitions,
+            little_endian,
+            {
+                "_u32_into": struct.Struct(endian + "I").pack_into,
+                "_pack_into": struct.pack_into,
+                "_time": _time,
+                "_flat_times": _flat_times,
+                "_utf8_len": _utf8_len,
+                "_strings_size": _strings_size,
+                "_write_strings": _write_strings,
+                "_bound_error": _bound_error,
+                "_length_mismatch": _length_mismatch,
+                "_zeros": _ZEROS,
+                "_empty": {},
+            },
+        )
+        self._constants: Dict[str, str] = {}
+        self._needs_values: Dict[str, bool] = {}
+        self.message_classes = message_classes
+
+    def compile(self) -> CompiledWriter:
+        size = self._size_function(self.root, aligned=True)
+        write = self._write_function(self.root, aligned=True)
+        source = self.execute("<rosmsg_serialization cdr writer>")
+        return CompiledWriter(self.namespace[size], self.namespace[write], source)
+
+    # -- values -------------------------------------------------------------------
+
+    def constant(self, value: Any) -> str:
+        """Name of a namespace constant holding *value*."""
+
+        key = repr((type(value), value))
+        name = self._constants.get(key)
+        if name is None:
+            name = f"_d{len(self._constants)}"
+            self.namespace[name] = value
+            self._constants[key] = name
+        return name
+
+    def value(self, msg: str, field: MessageDefinitionField) -> str:
+        if self.message_classes:
+            # Instances of the generated classes set every field
+            return attribute_access(msg, field)
+        default = field.defaultValue
+        if default is None:
+            default = self._zero(field)
+        elif field.isArray and field.type in BYTE_TYPES:
+            default = bytes(default)
+        elif field.isArray:
+            default = tuple(default)
+        return f"{msg}.get({field.name!r}, {self.constant(default)})"
+
+    def _zero(self, field: MessageDefinitionField) -> Any:
+        if field.isArray:
+            if field.type in BYTE_TYPES:
+                return bytes(field.arrayLength or 0)
+            if field.arrayLength is None:
+                return ()
+        if field.isComplex:
+            value: Any = self.namespace["_empty"]
+        elif field.type in TIME_TYPES:
+            value = {"sec": 0, "nanosec": 0}
+        elif field.type in ("string", "wstring"):
+            value = ""
+        elif field.type == "bool":
+            value = False
+        elif field.type in ("float32", "float64"):
+            value = 0.0
+        else:
+            value = 0
+        if field.isArray:
+            return (value,) * (field.arrayLength or 0)
+        return value
+
+    def needs_values(self, type_name: str) -> bool:
+        """Whether sizing the type reads any of its values."""
+
+        if type_name not in self._needs_values:
+            self._needs_values[type_name] = any(
+                f.isArray
+                or f.type in ("string", "wstring")
+                or (f.isComplex and self.needs_values(f.type))
+                for f in self.data_fields(self.lookup(type_name))
+            )
+        return self._needs_values[type_name]
+
+    # -- size functions -----------------------------------------------------------
+
+    def _size_function(self, msg_def: MessageDefinition, aligned: bool = False) -> str:
+        name, new = self.function_name("size", msg_def)
+        if new:
+            fb = _CdrSizeBuilder(self, aligned)
+            self._emit_size_message(fb, msg_def, "msg")
+            self.sources.append(fb.function(f"{name}(msg, offset=0)", "offset"))
+        return name
+
+    def _emit_size_message(
+        self, fb: _CdrSizeBuilder, msg_def: MessageDefinition, msg: Optional[str]
+    ) -> None:
+        fields = self.data_fields(msg_def)
+        if not fields:
+            fb.queue("x", 1)
+        for field in fields:
+            self._emit_size_field(fb, field, msg)
+
+    def _emit_size_field(
+        self, fb: _CdrSizeBuilder, field: MessageDefinitionField, msg: Optional[str]
+    ) -> None:
+        type_name = field.type
+        lines = fb.lines
+        if not field.isArray:
+            if field.isComplex:
+                sub: Optional[str] = None
+                if self.needs_values(type_name):
+                    assert msg is not None
+                    sub = fb.variable("_m")
+                    lines.append(f"{sub} = {self.value(msg, field)}")
+                self._emit_size_message(fb, self.lookup(type_name), sub)
+            elif type_name == "string":
+                assert msg is not None
+                fb.align(4)
+                fb.flush()
+                lines.append(f"_k = _utf8_len({self.value(msg, field)})")
+                self._check_bound(fb, field, "_k", field.upperBound)
+                lines.append("offset += 5 + _k")
+                fb.assume(1)
+            else:
+                fb.align(cdr_alignment(type_name))
+                fb.queue(
+                    cdr_format(type_name), struct.calcsize("<" + cdr_format(type_name))
+                )
+            return
+
+        length = field.arrayLength
+        if msg is None:
+            # A fixed array in a stride-sized element; its size needs no values
+            assert length is not None
+            count = str(length)
+        else:
+            var = fb.variable("_a")
+            lines.append(f"{var} = {self.value(msg, field)}")
+            if length is None:
+                count = fb.variable("_k")
+                lines.append(f"{count} = len({var})")
+                self._check_bound(fb, field, count, field.arrayUpperBound)
+                fb.align(4)
+                fb.queue("I", 4)
+            else:
+                count = str(length)
+                lines.append(f"if len({var}) != {length}:")
+                lines.append(
+                    f"    raise _length_mismatch({field.name!r}, len({var}), {length})"
+                )
+        if self.is_empty_array(field):
+            return
+
+        if type_name == "string":
+            fb.flush()
+            lines.append(
+                f"offset = _strings_size(offset, {var}, {field.upperBound!r}, "
+                f"{field.name!r})"
+            )
+            fb.assume(1)
+            return
+        if field.isComplex:
+            alignment = self.stride_alignment(type_name)
+            if alignment is None:
+                size_function = self._size_function(self.lookup(type_name))
+                fb.flush()
+                lines.append(f"for _e in {var}:")
+                lines.append(f"    offset = {size_function}(_e, offset)")
+                fb.assume(1)
+                return
+            element = _CdrSizeBuilder(self, True)
+            self._emit_size_message(element, self.lookup(type_name), None)
+            size = element.run_size
+        else:
+            alignment = cdr_alignment(type_name)
+            size = struct.calcsize("<" + cdr_format(type_name))
+        if length is not None:
+            fb.align(alignment)
+            fb.queue(f"{size * length}x", size * length)
+            return
+        self.align_elements(fb, count, alignment, None)
+        lines.append(
+            f"offset += {count}" if size == 1 else f"offset += {count} * {size}"
+        )
+        fb.assume(min(alignment, 4))
+
+    @staticmethod
+    def _check_bound(
+        fb: _CdrFunctionBuilder,
+        field: MessageDefinitionField,
+        size: str,
+        bound: Optional[int],
+    ) -> None:
+        if bound is not None:
+            fb.lines.append(f"if {size} > {bound}:")
+            fb.lines.append(f"    raise _bound_error({field.name!r}, {size}, {bound})")
+
+    # -- write functions ----------------------------------------------------------
+
+    def _write_function(self, msg_def: MessageDefinition, aligned: bool = False) -> str:
+        name, new = self.function_name("write", msg_def)
+        if new:
+            fb = _CdrWriterBuilder(self, aligned)
+            self._emit_write_message(fb, msg_def, "msg")
+            self.sources.append(fb.function(f"{name}(buf, offset, msg)", "offset"))
+        return name
+
+    def _emit_write_message(
+        self, fb: _CdrWriterBuilder, msg_def: MessageDefinition, msg: str
+    ) -> None:
+        fields = self.data_fields(msg_def)
+        if not fields:
+            fb.queue("x", 1)
+        for field in fields:
+            self._emit_write_field(fb, field, msg)
+
+    def _emit_write_field(
+        self, fb: _CdrWriterBuilder, field: MessageDefinitionField, msg: str
+    ) -> None:
+        type_name = field.type
+        lines = fb.lines
+        value = self.value(msg, field)
+        if not field.isArray:
+            if field.isComplex:
+                sub = fb.variable("_m")
+                lines.append(f"{sub} = {value}")
+                self._emit_write_message(fb, self.lookup(type_name), sub)
+            elif type_name == "string":
+                fb.align(4)
+                fb.flush()
+                lines.append(f"_b = {value}.encode()")
+                lines.append("_k = len(_b)")
+                lines.append("_u32_into(buf, offset, _k + 1)")
+                lines.append("buf[offset + 4 : offset + 4 + _k] = _b")
+                lines.append("buf[offset + 4 + _k] = 0")
+                lines.append("offset += 5 + _k")
+                fb.assume(1)
+            elif type_name in TIME_TYPES:
+                fb.align(4)
+                fb.add_fixed("iI", 8, f"*_time({value})")
+            else:
+                fb.align(cdr_alignment(type_name))
+                fmt = cdr_format(type_name)
+                fb.add_fixed(fmt, struct.calcsize("<" + fmt), value)
+            return
+
+        if self.is_empty_array(field):
+            return
+        length = field.arrayLength
+        if length is not None and not field.isComplex and type_name != "string":
+            fb.align(cdr_alignment(type_name))
+            fmt = cdr_format(type_name)
+            size = struct.calcsize("<" + fmt) * length
+            if type_name in BYTE_TYPES:
+                fb.add_fixed(f"{length}s", size, f"bytes({value})")
+            elif type_name in TIME_TYPES:
+                fb.add_fixed(fmt * length, size, f"*_flat_times({value})")
+            else:
+                fb.add_fixed(compact_format(fmt * length), size, f"*{value}")
+            return
+
+        var = fb.variable("_a")
+        lines.append(f"{var} = {value}")
+        if length is None:
+            count = fb.variable("_k")
+            lines.append(f"{count} = len({var})")
+            fb.align(4)
+            fb.add_fixed("I", 4, count)
+        else:
+            count = str(length)
+
+        if type_name == "string":
+            fb.flush()
+            lines.append(f"offset = _write_strings(buf, offset, {var}, _u32_into)")
+            fb.assume(1)
+            return
+        if field.isComplex:
+            alignment = self.stride_alignment(type_name)
+            if alignment is None:
+                write = self._write_function(self.lookup(type_name))
+                fb.flush()
+                lines.append(f"for _e in {var}:")
+                lines.append(f"    offset = {write}(buf, offset, _e)")
+                fb.assume(1)
+                return
+            self.align_elements(fb, count, alignment, length)
+            # Loops over nested arrays must not rebind the enclosing element
+            item = fb.variable("_e")
+            element = _CdrWriterBuilder(self, True, fb)
+            self._emit_write_message(element, self.lookup(type_name), item)
+            fmt = self.endian + compact_format("".join(element.run_formats))
+            pack = self.struct_method(fmt, "pack_into")
+            lines.append(f"for {item} in {var}:")
+            lines.extend("    " + line for line in element.lines)
+            lines.append(f"    {pack}(buf, offset, {', '.join(element.args)})")
+            lines.append(f"    offset += {element.run_size}")
+        else:
+            alignment = cdr_alignment(type_name)
+            fmt = cdr_format(type_name)
+            self.align_elements(fb, count, alignment, length)
+            if type_name in BYTE_TYPES:
+                lines.append(f"buf[offset : offset + {count}] = {var}")
+                lines.append(f"offset += {count}")
+            else:
+                size = struct.calcsize("<" + fmt)
+                if type_name in TIME_TYPES:
+                    fmt_expr = f"{self.endian!r} + 'iI' * {count}"
+                    values = f"_flat_times({var})"
+                else:
+                    fmt_expr = f"f'{self.endian}{{{count}}}{fmt}'"
+                    values = var
+                lines.append(f"_pack_into({fmt_expr}, buf, offset, *{values})")
+                lines.append(f"offset += {count} * {size}")
+        fb.assume(alignment if length else min(alignment, 4))
@@ -0,0 +1,327 @@
+"""Generate Python classes with ``__slots__`` for message types.
+
+Instances of a generated class hold one slot per field, which takes far less
+memory than a dictionary and gives fast attribute access. Following ``genpy``,
+a class has the attributes ``_type``, ``_md5sum`` and ``_slot_types``, and the
+constants of the type as class attributes. Missing constructor arguments take
+the ROS 2 default value of the field, or else the zero value of its type:
+``0``, ``0.0``, ``False``, ``""``, ``Time(0, 0)``, an empty array or a default
+constructed message. The compiled methods ``from_dict`` and ``to_dict``
+convert from and to the dictionaries of :class:`MessageReader`.
+
+Classes are created once per type structure and reused, so every decoder of
+the same type hands out instances of one class. ``_md5sum`` is computed on
+first access, since ROS 2 types may use fields, like ``wstring``, that the ROS 1
+MD5 does not cover.
+"""
+
+from __future__ import annotations
+
+import keyword
+import math
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from python_ros.message_definition import MessageDefinition, MessageDefinitionField
+from python_ros.rosmsg import md5
+from python_ros.rostime import Time
+
+from .codegen import _md5_cache, attribute_access, sanitize_name
+from .primitives import BYTE_TYPES, TIME_TYPES
+
+_lock = threading.Lock()
+_classes: Dict[Tuple[str, ...], type] = {}
+
+
+def message_class(
+    definitions: List[MessageDefinition], type_name: Optional[str] = None
+) -> type:
+    """Return the class of *type_name*, or of the root type if it is ``None``."""
+
+    return MessageClassFactory(definitions).get(type_name)
+
+
+def clear_message_class_cache() -> None:
+    with _lock:
+        _classes.clear()
+
+
+class MessageClassFactory:
+    """Looks up or generates the classes of the types in a definition list."""
+
+    def __init__(self, definitions: List[MessageDefinition]) -> None:
+        if not definitions:
+            raise ValueError("Cannot generate a message class for empty msgDefs")
+        self.definitions = definitions
+        self._types = {d.name: d for d in definitions if d.name is not None}
+        self._built: Dict[Optional[str], type] = {}
+
+    def get(self, type_name: Optional[str] = None) -> type:
+        msg_def = self.definitions[0] if type_name is None else self.lookup(type_name)
+        return self.for_definition(msg_def)
+
+    def lookup(self, type_name: str) -> MessageDefinition:
+        msg_def = self._types.get(type_name)
+        if msg_def is None:
+            raise ValueError(f'Missing definition for submessage type "{type_name}"')
+        return msg_def
+
+    def for_definition(self, msg_def: MessageDefinition) -> type:
+        cls = self._built.get(msg_def.name)
+        if cls is not None:
+            return cls
+        # The fingerprints of every reachable type determine the class
+        key = self._fingerprints(msg_def)
+        with _lock:
+            cls = _classes.get(key)
+        if cls is None:
+            cls = _ClassCompiler(self, msg_def).compile()
+            with _lock:
+                cls = _classes.setdefault(key, cls)
+        self._built[msg_def.name] = cls
+        return cls
+
+    def _fingerprints(self, msg_def: MessageDefinition) -> Tuple[str, ...]:
+        seen: Dict[Optional[str], str] = {}
+        stack = [msg_def]
+        while stack:
+            current = stack.pop()
+            if current.name in seen:
+                continue
+            seen[current.name] = current.fingerprint()
+            stack.extend(
+                self.lookup(f.type)
+                for f in current.definitions
+                if f.isComplex and not f.isConstant
+            )
+        return tuple(seen.values())
+
+
+class _Md5Sum:
+    """The ``_md5sum`` of a generated class, computed on first access."""
+
+    def __init__(self, definitions: List[MessageDefinition]) -> None:
+        self._definitions = definitions
+        self._digest: Optional[str] = None
+
+    def __get__(self, instance: Any, owner: Optional[type] = None) -> str:
+        if self._digest is None:
+            self._digest = md5(self._definitions, _md5_cache)
+        return self._digest
+
+
+def _literal(value: Any) -> bool:
+    """Whether ``repr(value)`` evaluates back to *value*."""
+
+    if isinstance(value, float):
+        return math.isfinite(value)
+    return isinstance(value, (bool, int, str, bytes))
+
+
+class _ClassCompiler:
+    def __init__(
+        self, factory: MessageClassFactory, msg_def: MessageDefinition
+    ) -> None:
+        self.factory = factory
+        self.msg_def = msg_def
+        self.fields = [f for f in msg_def.definitions if not f.isConstant]
+        self.namespace: Dict[str, Any] = {"Time": Time, "_setattr": object.__setattr__}
+        self._names: Dict[Any, str] = {}
+
+    def compile(self) -> type:
+        msg_def = self.msg_def
+        class_name = sanitize_name((msg_def.name or "Message").split("/")[-1])
+        source = "\n\n".join(
+            [self._init(), self._from_dict(), self._to_dict(), self._eq(), self._repr()]
+        )
+        exec(compile(source, f"<message class {class_name}>", "exec"), self.namespace)
+        attributes: Dict[str, Any] = {
+            f.name: _constant_value(f) for f in msg_def.definitions if f.isConstant
+        }
+        attributes.update(
+            __slots__=tuple(f.name for f in self.fields),
+            __module__=__name__,
+            _type=msg_def.name,
+            _md5sum=_Md5Sum([msg_def, *self.factory.definitions]),
+            _slot_types=tuple(_type_text(f) for f in self.fields),
+            _source=source,
+            from_dict=classmethod(self.namespace["from_dict"]),
+        )
+        for method in ("__init__", "to_dict", "__eq__", "__repr__"):
+            attributes[method] = self.namespace[method]
+        return type(class_name, (), attributes)
+
+    # -- names in the namespace -----------------------------------------------------
+
+    def sub_class(self, field: MessageDefinitionField) -> str:
+        cls = self.factory.for_definition(self.factory.lookup(field.type))
+        return self._name(("class", field.type), cls, "_c")
+
+    def constant(self, value: Any) -> str:
+        if _literal(value):
+            return repr(value)
+        return self._name(repr((type(value), value)), value, "_d")
+
+    def _name(self, key: Any, value: Any, prefix: str) -> str:
+        name = self._names.get(key)
+        if name is None:
+            name = f"{prefix}{len(self._names)}"
+            self.namespace[name] = value
+            self._names[key] = name
+        return name
+
+    # -- default values -------------------------------------------------------------
+
+    def default(self, field: MessageDefinitionField) -> Tuple[str, Optional[str]]:
+        """Parameter default of *field* and an expression for a fresh value.
+
+        The expression is ``None`` unless the parameter default is ``None``,
+        which stands for a mutable value that each instance gets its own of.
+        """
+
+        default = field.defaultValue
+        if field.isArray:
+            length = field.arrayLength
+            if field.type in BYTE_TYPES:
+                value = bytes(default) if default is not None else bytes(length or 0)
+                return self.constant(value), None
+            if default is not None:
+                return "None", f"list({self.constant(tuple(default))})"
+            if length is None:
+                return "None", "[]"
+            element = self._element_default(field)
+            if element is None:
+                return "None", f"[{self.constant(self._zero(field))}] * {length}"
+            return "None", f"[{element} for _ in range({length})]"
+        element = self._element_default(field)
+        if element is not None:
+            return "None", element
+        return (
+            self.constant(default if default is not None else self._zero(field)),
+            None,
+        )
+
+    def _element_default(self, field: MessageDefinitionField) -> Optional[str]:
+        """Expression for a new mutable element of *field*, ``None`` if immutable."""
+
+        if field.isComplex:
+            return f"{self.sub_class(field)}()"
+        if field.type in TIME_TYPES:
+            return "Time(0, 0)"
+        return None
+
+    @staticmethod
+    def _zero(field: MessageDefinitionField) -> Any:
+        if field.type in ("string", "wstring"):
+            return ""
+        if field.type == "bool":
+            return False
+        if field.type in ("float32", "float64"):
+            return 0.0
+        return 0
+
+    # -- methods --------------------------------------------------------------------
+
+    def _init(self) -> str:
+        params = ["self"]
+        lines = []
+        for field in self.fields:
+            param = _param(field)
+            default, fresh = self.default(field)
+            params.append(f"{param}={default}")
+            value = (
+                param if fresh is None else f"{fresh} if {param} is None else {param}"
+            )
+            lines.append(_assign("self", field, value))
+        return _function(f"__init__({', '.join(params)})", lines or ["pass"])
+
+    def _from_dict(self) -> str:
+        args = []
+        for field in self.fields:
+            value = f"d[{field.name!r}]"
+            if field.isComplex:
+                sub_class = self.sub_class(field)
+                if field.isArray:
+                    value = f"[{sub_class}.from_dict(_e) for _e in {value}]"
+                else:
+                    value = f"{sub_class}.from_dict({value})"
+            default, fresh = self.default(field)
+            if fresh is None and not field.isComplex:
+                args.append(f"d.get({field.name!r}, {default})")
+            else:
+                args.append(f"{value} if {field.name!r} in d else None")
+        return _function("from_dict(cls, d)", [_call("return cls(", args)])
+
+    def _to_dict(self) -> str:
+        items = []
+        for field in self.fields:
+            value = attribute_access("self", field)
+            if field.isComplex and field.isArray:
+                value = f"[_e.to_dict() for _e in {value}]"
+            elif field.isComplex:
+                value = f"{value}.to_dict()"
+            items.append(f"{field.name!r}: {value}")
+        return _function("to_dict(self)", [_call("return {", items, "}")])
+
+    def _eq(self) -> str:
+        comparisons = [
+            f"{attribute_access('self', f)} == {attribute_access('other', f)}"
+            for f in self.fields
+        ]
+        return _function(
+            "__eq__(self, other)",
+            [
+                "if other.__class__ is not self.__class__:",
+                "    return NotImplemented",
+                f"return {' and '.join(comparisons) or 'True'}",
+            ],
+        )
+
+    def _repr(self) -> str:
+        text = ", ".join(f"{f.name}=%r" for f in self.fields)
+        values = [attribute_access("self", f) for f in self.fields]
+        name = self.msg_def.name or "Message"
+        return _function(
+            "__repr__(self)", [_call(f"return {name + '(' + text + ')'!r} % (", values)]
+        )
+
+
+def _constant_value(field: MessageDefinitionField) -> Any:
+    # The ROS 1 parser only keeps the text of constants
+    text = field.valueText
+    if field.value is not None or text is None:
+        return field.value
+    if field.type in ("string", "wstring"):
+        return text
+    if field.type == "bool":
+        return text in ("true", "True", "1")
+    if field.type in ("float32", "float64"):
+        return float(text)
+    return int(text)
+
+
+def _type_text(field: MessageDefinitionField) -> str:
+    if not field.isArray:
+        return field.type
+    return f"{field.type}[{'' if field.arrayLength is None else field.arrayLength}]"
+
+
+def _param(field: MessageDefinitionField) -> str:
+    return field.name + "_" if keyword.iskeyword(field.name) else field.name
+
+
+def _assign(base: str, field: MessageDefinitionField, value: str) -> str:
+    if keyword.iskeyword(field.name):
+        return f"_setattr({base}, {field.name!r}, {value})"
+    return f"{base}.{field.name} = {value}"
+
+
+def _call(head: str, items: List[str], close: str = ")") -> str:
+    if not items:
+        return head + close
+    return head + "\n" + "".join(f"    {item},\n" for item in items) + close
+
+
+def _function(signature: str, lines: List[str]) -> str:
+    body = "\n".join("    " + line for text in lines for line in text.split("\n"))
+    return f"def {signature}:\n{body}"
@@ -0,0 +1,240 @@
+"""Shared machinery of the generated message readers and writers."""
+
+from __future__ import annotations
+
+import keyword
+import re
+import struct
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Generic, List, Optional, Set, Tuple, TypeVar
+
+from python_ros.message_definition import MessageDefinition, MessageDefinitionField
+from python_ros.rosmsg import Md5Cache
+
+from .primitives import BYTE_TYPES, primitive_format
+
+# Format and number of packed values of one instance of a fixed-size type
+Layout = Tuple[str, int]
+
+_FORMAT_TOKEN = re.compile(r"(\d*)(\D)")
+
+T = TypeVar("T")
+
+# Shared by the generated message classes for their _md5sum
+_md5_cache = Md5Cache()
+
+
+class CompiledCache(Generic[T]):
+    """Thread-safe cache of compiled code keyed on the definitions and options.
+
+    The key is the structural fingerprint of every definition, which unlike
+    the ROS1 MD5 also tells ``Point p`` from ``Point[] p``; definitions that
+    differ only in comments or whitespace share one compiled entry.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[Any, ...], T] = {}
+
+    def get(
+        self,
+        definitions: List[MessageDefinition],
+        compile: Callable[[], T],
+        *options: Any,
+    ) -> T:
+        key = (tuple(d.fingerprint() for d in definitions), *options)
+        with self._lock:
+            compiled = self._entries.get(key)
+        if compiled is None:
+            compiled = compile()
+            with self._lock:
+                compiled = self._entries.setdefault(key, compiled)
+        return compiled
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def sanitize_name(name: str) -> str:
+    return re.sub(r"^[0-9]|[^a-zA-Z0-9_]", "_", name)
+
+
+def compact_format(fmt: str) -> str:
+    """Merge repeated codes, e.g. ``"ddd3d"`` becomes ``"6d"``."""
+
+    tokens: List[List[Any]] = []
+    for count, code in _FORMAT_TOKEN.findall(fmt):
+        n = int(count) if count else 1
+        if tokens and tokens[-1][1] == code and code != "s":
+            tokens[-1][0] += n
+        else:
+            tokens.append([n, code])
+    return "".join(f"{n}{code}" if n != 1 else code for n, code in tokens)
+
+
+def field_access(base: str, field: MessageDefinitionField) -> str:
+    return f"{base}[{field.name!r}]"
+
+
+def attribute_access(base: str, field: MessageDefinitionField) -> str:
+    if keyword.iskeyword(field.name):
+        return f"getattr({base}, {field.name!r})"
+    return f"{base}.{field.name}"
+
+
+class CodeGenerator:
+    """Base class of the compilers that turn definitions into Python source.
+
+    It owns the namespace the source is executed in, hands out unique function
+    names per message type and computes the static layout of fixed-size types.
+    """
+
+    def __init__(self, definitions: List[MessageDefinition], namespace: Dict[str, Any]):
+        if not definitions:
+            raise ValueError("Cannot compile a serializer for empty msgDefs")
+        self.root = definitions[0]
+        self._types = {d.name: d for d in definitions if d.name is not None}
+        self.namespace = dict(namespace)
+        self.sources: List[str] = []
+        self._structs: Dict[Tuple[str, str], str] = {}
+        self._functions: Dict[Tuple[str, Optional[str]], str] = {}
+        self._function_names: Set[str] = set()
+        self._layouts: Dict[str, Optional[Layout]] = {}
+
+    def execute(self, filename: str) -> str:
+        """Run the collected source in the namespace and return the source."""
+
+        source = "\n\n".join(self.sources) + "\n"
+        exec(compile(source, filename, "exec"), self.namespace)
+        return source
+
+    def struct_method(self, fmt: str, method: str) -> str:
+        """Name of a bound method of a precompiled ``struct.Struct``."""
+
+        key = (fmt, method)
+        name = self._structs.get(key)
+        if name is None:
+            name = f"_s{len(self._structs)}_{method}"
+            self.namespace[name] = getattr(struct.Struct(fmt), method)
+            self._structs[key] = name
+        return name
+
+    def function_name(self, kind: str, msg_def: MessageDefinition) -> Tuple[str, bool]:
+        """Return the function name for *kind* and *msg_def*, and whether it is new."""
+
+        key = (kind, msg_def.name)
+        name = self._functions.get(key)
+        if name is not None:
+            return name, False
+        base = f"_{kind}_{sanitize_name(msg_def.name or 'message')}"
+        name = base
+        suffix = 1
+        while name in self._function_names:
+            suffix += 1
+            name = f"{base}_{suffix}"
+        self._function_names.add(name)
+        self._functions[key] = name
+        return name, True
+
+    def lookup(self, type_name: str) -> MessageDefinition:
+        msg_def = self._types.get(type_name)
+        if msg_def is None:
+            raise ValueError(f'Missing definition for submessage type "{type_name}"')
+        return msg_def
+
+    def type_layout(self, field: MessageDefinitionField) -> Optional[Layout]:
+        """Layout of one element of *field*, or ``None`` if it is variable-size."""
+
+        if not field.isComplex:
+            fmt = primitive_format(field.type)
+            if fmt is None:
+                if field.type == "string":
+                    return None
+                raise ValueError(f"Unsupported type '{field.type}'")
+            return fmt, len(fmt)
+        if field.type not in self._layouts:
+            self._layouts[field.type] = self.message_layout(self.lookup(field.type))
+        return self._layouts[field.type]
+
+    def message_layout(self, msg_def: MessageDefinition) -> Optional[Layout]:
+        fmt = ""
+        count = 0
+        for field in msg_def.definitions:
+            if field.isConstant:
+                continue
+            layout = self.field_layout(field)
+            if layout is None:
+                return None
+            fmt += layout[0]
+            count += layout[1]
+        return fmt, count
+
+    def field_layout(self, field: MessageDefinitionField) -> Optional[Layout]:
+        layout = self.type_layout(field)
+        if layout is None or not field.isArray:
+            return layout
+        length = field.arrayLength
+        if length is None:
+            return None
+        if field.type in BYTE_TYPES:
+            return f"{length}s", 1
+        fmt, count = layout
+        return compact_format(fmt * length), count * length
+
+    @staticmethod
+    def layout_size(layout: Layout) -> int:
+        return struct.calcsize("<" + layout[0])
+
+
+class FunctionBuilder(ABC):
+    """Collects the body of one generated function.
+
+    Subclasses queue fixed-size items and emit the code for them in
+    :meth:`flush`, once a variable-size field needs the offset.
+    """
+
+    def __init__(self, generator: CodeGenerator) -> None:
+        self.generator = generator
+        self.lines: List[str] = []
+        self._variables = 0
+
+    def variable(self, prefix: str = "v") -> str:
+        self._variables += 1
+        return f"{prefix}{self._variables}"
+
+    @abstractmethod
+    def flush(self) -> None:
+        """Emit the code for the pending fixed-size items."""
+
+    def function(self, signature: str, result: str) -> str:
+        self.flush()
+        body = [*self.lines, f"return {result}"]
+        return f"def {signature}:\n" + "\n".join("    " + line for line in body)
+
+
+class RunFunctionBuilder(FunctionBuilder):
+    """Function builder whose pending items form a single ``struct`` run.
+
+    Subclasses emit the ``struct`` call for the run in :meth:`emit_run`.
+    """
+
+    def __init__(self, generator: CodeGenerator) -> None:
+        super().__init__(generator)
+        self.run_formats: List[str] = []
+
+    def flush(self) -> None:
+        if not self.run_formats:
+            return
+        fmt = "<" + compact_format("".join(self.run_formats))
+        self.emit_run(fmt)
+        self.lines.append(f"offset += {struct.calcsize(fmt)}")
+        self.run_formats = []
+
+    @abstractmethod
+    def emit_run(self, fmt: str) -> None:
+        """Emit the code handling the run of struct format *fmt*."""
@@ -0,0 +1,352 @@
+"""Decode batches of ROS 1 messages of one type into NumPy columns.
+
+The messages are concatenated into one ``uint8`` array. Decoding then moves a
+cursor array, holding one position per message, field by field through all
+messages at once. Runs of fixed-size fields are gathered into one block per
+run and viewed with a structured dtype. Lengths of strings and arrays are read
+for all messages at once too. Only arrays of variable-size elements need a
+Python loop, and it runs once per element index, not once per message.
+
+Fixed-size leaf fields become arrays with one row per message. ``time`` and
+``duration`` become structured ``sec``/``nsec`` arrays. Strings, variable-length
+arrays and arrays of variable-size elements become :class:`ListColumn` objects.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from python_ros.message_definition import MessageDefinition, MessageDefinitionField
+
+from .arrays import HAVE_NUMPY, numpy, sliding_window_view
+from .codegen import CodeGenerator
+from .layout import LayoutAnalyzer
+from .primitives import as_byte_view
+
+# Above this average length, ranges are copied slice by slice
+_SLICE_COPY_LENGTH = 64
+
+
+@dataclass(frozen=True)
+class ListColumn:
+    """Variable-length values of a field, one list per row.
+
+    Row ``i`` is ``values[offsets[i]:offsets[i + 1]]``. *values* is an array,
+    another :class:`ListColumn` for arrays of strings, or a dict of columns for
+    arrays of messages. Strings are lists of UTF-8 bytes.
+    """
+
+    offsets: Any
+    values: Any
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> Any:
+        start, end = self.offsets[index], self.offsets[index + 1]
+        if isinstance(self.values, dict):
+            return {p: _slice(c, start, end) for p, c in self.values.items()}
+        return _slice(self.values, start, end)
+
+    def strings(self) -> List[str]:
+        """Decode every row of a string column."""
+
+        data = self.values.tobytes()
+        offsets = self.offsets.tolist()
+        return [
+            str(data[start:end], "utf-8", "replace")
+            for start, end in zip(offsets, offsets[1:])
+        ]
+
+
+Column = Union[Any, ListColumn]
+
+
+class ColumnarReader:
+    """Decode sequences of serialized messages of one type into columns.
+
+    :meth:`read_batch` returns a dict from dotted leaf field path to column.
+    Needs NumPy.
+    """
+
+    def __init__(self, definitions: List[MessageDefinition]) -> None:
+        if not HAVE_NUMPY:
+            raise ImportError("NumPy is required for columnar decoding")
+        self._steps = _Planner(definitions).plan(definitions[0])
+
+    def read_batch(self, buffers: Sequence[Any]) -> Dict[str, Column]:
+        data = numpy.frombuffer(b"".join(buffers), numpy.uint8)
+        sizes = numpy.fromiter(map(len, buffers), numpy.int64, len(buffers))
+        if sizes.sum() != len(data):
+            # Some buffers have items larger than a byte
+            sizes = numpy.fromiter(
+                (len(as_byte_view(b)) for b in buffers), numpy.int64, len(buffers)
+            )
+        limits = numpy.cumsum(sizes)
+        columns, _ = _walk(self._steps, data, limits - sizes, limits)
+        return columns
+
+
+class _Segment(NamedTuple):
+    """A run of fixed-size fields read as one structured record."""
+
+    size: int
+    dtype: Any
+    leaves: List[Tuple[str, Tuple[str, ...]]]
+
+
+class _Nested(NamedTuple):
+    name: str
+    steps: List[Any]
+
+
+class _String(NamedTuple):
+    name: str
+
+
+class _Array(NamedTuple):
+    name: str
+    length: Optional[int]
+    # Fixed-size elements: their dtype and size; messages: their steps
+    dtype: Any
+    size: Optional[int]
+    steps: Optional[List[Any]]
+
+
+class _Planner:
+    def __init__(self, definitions: List[MessageDefinition]) -> None:
+        self._generator = CodeGenerator(definitions, {})
+        self._analyzer = LayoutAnalyzer(definitions)
+
+    def plan(self, msg_def: MessageDefinition) -> List[Any]:
+        generator = self._generator
+        steps: List[Any] = []
+        fields: List[Tuple[MessageDefinitionField, int]] = []
+        size = 0
+        for field in msg_def.definitions:
+            if field.isConstant:
+                continue
+            layout = generator.field_layout(field)
+            if layout is not None:
+                fields.append((field, size))
+                size += generator.layout_size(layout)
+                continue
+            if fields:
+                steps.append(self._segment(fields, size))
+                fields, size = [], 0
+            steps.append(self._variable_step(field))
+        if fields:
+            steps.append(self._segment(fields, size))
+        return steps
+
+    def _segment(
+        self, fields: List[Tuple[MessageDefinitionField, int]], size: int
+    ) -> _Segment:
+        names, formats, offsets = [], [], []
+        leaves: List[Tuple[str, Tuple[str, ...]]] = []
+        for field, offset in fields:
+            dtype = self._analyzer.element_dtype(field)
+            names.append(field.name)
+            formats.append((dtype, (field.arrayLength,)) if field.isArray else dtype)
+            offsets.append(offset)
+            leaves.extend(self._leaves(field, (field.name,)))
+        dtype = numpy.dtype(
+            {"names": names, "formats": formats, "offsets": offsets, "itemsize": size}
+        )
+        return _Segment(size, dtype, leaves)
+
+    def _leaves(
+        self, field: MessageDefinitionField, keys: Tuple[str, ...]
+    ) -> List[Tuple[str, Tuple[str, ...]]]:
+        if not field.isComplex:
+            return [(".".join(keys), keys)]
+        leaves = []
+        for sub in self._generator.lookup(field.type).definitions:
+            if not sub.isConstant:
+                leaves.extend(self._leaves(sub, (*keys, sub.name)))
+        return leaves
+
+    def _variable_step(self, field: MessageDefinitionField) -> Any:
+        if field.isComplex and not field.isArray:
+            return _Nested(field.name, self.plan(self._generator.lookup(field.type)))
+        if not field.isArray:
+            return _String(field.name)
+        element = self._generator.type_layout(field)
+        size = None if element is None else self._generator.layout_size(element)
+        steps = None
+        if field.isComplex:
+            steps = self.plan(self._generator.lookup(field.type))
+        dtype = None if element is None else self._analyzer.element_dtype(field)
+        return _Array(field.name, field.arrayLength, dtype, size, steps)
+
+
+def _walk(
+    steps: List[Any], data: Any, pos: Any, limits: Any
+) -> Tuple[Dict[str, Column], Any]:
+    """Decode the rows starting at *pos*; return the columns and end positions."""
+
+    columns: Dict[str, Column] = {}
+    for step in steps:
+        if isinstance(step, _Segment):
+            _check(pos + step.size, limits)
+            records = _gather_block(data, pos, step.size).view(step.dtype)[:, 0]
+            for path, keys in step.leaves:
+                column = records
+                for key in keys:
+                    column = column[key]
+                columns[path] = numpy.ascontiguousarray(column)
+            pos = pos + step.size
+        elif isinstance(step, _Nested):
+            sub_columns, pos = _walk(step.steps, data, pos, limits)
+            for path, column in sub_columns.items():
+                columns[f"{step.name}.{path}"] = column
+        elif isinstance(step, _String):
+            columns[step.name], pos = _read_strings(data, pos, limits)
+        else:
+            columns[step.name], pos = _read_array(step, data, pos, limits)
+    return columns, pos
+
+
+def _read_strings(data: Any, pos: Any, limits: Any) -> Tuple[ListColumn, Any]:
+    lengths = _read_u32(data, pos, limits)
+    starts = pos + 4
+    _check(starts + lengths, limits)
+    offsets, values = _gather_ranges(data, starts, lengths)
+    return ListColumn(offsets, values), starts + lengths
+
+
+def _read_array(
+    step: _Array, data: Any, pos: Any, limits: Any
+) -> Tuple[ListColumn, Any]:
+    if step.length is None:
+        counts = _read_u32(data, pos, limits)
+        pos = pos + 4
+    else:
+        counts = numpy.full(len(pos), step.length, numpy.int64)
+    offsets = _offsets(counts)
+    if step.size is not None:
+        # Fixed-size elements
+        lengths = counts * step.size
+        end = pos + lengths
+        _check(end, limits)
+        if step.steps is None:
+            _, values = _gather_ranges(data, pos, lengths)
+            return ListColumn(offsets, values.view(step.dtype)), end
+        starts = numpy.repeat(pos - offsets[:-1] * step.size, counts)
+        starts += numpy.arange(offsets[-1], dtype=numpy.int64) * step.size
+        element_limits = numpy.repeat(limits, counts)
+        values, _ = _walk(step.steps, data, starts, element_limits)
+        return ListColumn(offsets, values), end
+
+    starts, end = _element_starts(step, data, pos, counts, offsets, limits)
+    element_limits = numpy.repeat(limits, counts)
+    if step.steps is None:
+        values, _ = _read_strings(data, starts, element_limits)
+    else:
+        values, _ = _walk(step.steps, data, starts, element_limits)
+    return ListColumn(offsets, values), end
+
+
+def _element_starts(
+    step: _Array, data: Any, pos: Any, counts: Any, offsets: Any, limits: Any
+) -> Tuple[Any, Any]:
+    """Find the variable-size elements of an array, one element index at a time."""
+
+    starts = numpy.empty(offsets[-1], numpy.int64)
+    rows = numpy.arange(len(pos))
+    pos = pos.copy()
+    for index in range(int(counts.max(initial=0))):
+        rows = rows[counts[rows] > index]
+        starts[offsets[rows] + index] = pos[rows]
+        if step.steps is None:
+            pos[rows] += 4 + _read_u32(data, pos[rows], limits[rows])
+        else:
+            pos[rows] = _advance(step.steps, data, pos[rows], limits[rows])
+    return starts, pos
+
+
+def _advance(steps: List[Any], data: Any, pos: Any, limits: Any) -> Any:
+    """Return the end positions of the rows starting at *pos* without decoding."""
+
+    for step in steps:
+        if isinstance(step, _Segment):
+            pos = pos + step.size
+        elif isinstance(step, _Nested):
+            pos = _advance(step.steps, data, pos, limits)
+        elif isinstance(step, _String):
+            pos = pos + 4 + _read_u32(data, pos, limits)
+        else:
+            if step.length is None:
+                counts = _read_u32(data, pos, limits)
+                pos = pos + 4
+            else:
+                counts = numpy.full(len(pos), step.length, numpy.int64)
+            if step.size is not None:
+                pos = pos + counts * step.size
+            else:
+                offsets = _offsets(counts)
+                _, pos = _element_starts(step, data, pos, counts, offsets, limits)
+    _check(pos, limits)
+    return pos
+
+
+def _check(end: Any, limits: Any) -> None:
+    if len(end) and (end > limits).any():
+        row = int(numpy.argmax(end > limits))
+        raise ValueError(
+            f"Buffer too short to read message: row {row} needs {int(end[row])} "
+            f"bytes, ends at {int(limits[row])}"
+        )
+
+
+def _offsets(counts: Any) -> Any:
+    offsets = numpy.zeros(len(counts) + 1, numpy.int64)
+    numpy.cumsum(counts, out=offsets[1:])
+    return offsets
+
+
+def _read_u32(data: Any, pos: Any, limits: Any) -> Any:
+    _check(pos + 4, limits)
+    return _gather_block(data, pos, 4).view("<u4")[:, 0].astype(numpy.int64)
+
+
+def _gather_block(data: Any, starts: Any, size: int) -> Any:
+    """Copy ``data[start:start + size]`` for every start into an (n, size) array."""
+
+    if not size or not len(starts):
+        return numpy.empty((len(starts), size), numpy.uint8)
+    # Rows of the window view start at every byte, so indexing it copies rows
+    return sliding_window_view(data, size)[starts]
+
+
+def _gather_ranges(data: Any, starts: Any, lengths: Any) -> Tuple[Any, Any]:
+    """Concatenate ``data[start:start + length]`` for every range."""
+
+    offsets = _offsets(lengths)
+    total = int(offsets[-1])
+    if not total:
+        return offsets, numpy.empty(0, numpy.uint8)
+    if total >= _SLICE_COPY_LENGTH * len(starts):
+        values = numpy.empty(total, numpy.uint8)
+        for start, begin, end in zip(
+            starts.tolist(), offsets.tolist(), offsets[1:].tolist()
+        ):
+            values[begin:end] = data[start : start + end - begin]
+        return offsets, values
+    index = numpy.repeat(starts - offsets[:-1], lengths)
+    index += numpy.arange(total, dtype=numpy.int64)
+    return offsets, data[index]
+
+
+def _slice(column: Column, start: int, end: int) -> Column:
+    if isinstance(column, ListColumn):
+        offsets = column.offsets[start : end + 1]
+        first, last = int(offsets[0]), int(offsets[-1])
+        values = column.values
+        if isinstance(values, dict):
+            values = {p: _slice(c, first, last) for p, c in values.items()}
+        else:
+            values = _slice(values, first, last)
+        return ListColumn(offsets - first, values)
+    return column[start:end]
@@ -0,0 +1,94 @@
+"""Reference ROS 1 decoder that interprets the definition tree per message.
+
+This is the straightforward way to decode a message: walk the fields of the
+definition for every message and read one value at a time. It produces the
+same output as :class:`~python_ros.rosmsg_serialization.MessageReader` and
+serves as the baseline it is tested and benchmarked against.
+"""
+
+from __future__ import annotations
+
+import struct
+from typing import Any, Dict, List, Tuple
+
+from python_ros.message_definition import MessageDefinition, MessageDefinitionField
+from python_ros.rostime import Time
+
+from .primitives import (
+    BYTE_TYPES,
+    PRIMITIVE_FORMATS,
+    TIME_TYPES,
+    as_byte_view,
+    length_error,
+)
+
+
+class InterpretedMessageReader:
+    def __init__(self, definitions: List[MessageDefinition]) -> None:
+        if not definitions:
+            raise ValueError("Cannot read messages without msgDefs")
+        self._root = definitions[0]
+        self._types = {d.name: d for d in definitions if d.name is not None}
+
+    def read_message(self, buffer: Any) -> Dict[str, Any]:
+        view = as_byte_view(buffer)
+        try:
+            message, _ = self._read_message(self._root, view, 0)
+        except struct.error as exc:
+            raise ValueError(f"Buffer too short to read message: {exc}") from exc
+        return message
+
+    def _read_message(
+        self, msg_def: MessageDefinition, buf: memoryview, offset: int
+    ) -> Tuple[Dict[str, Any], int]:
+        message = {}
+        for field in msg_def.definitions:
+            if field.isConstant:
+                continue
+            message[field.name], offset = self._read_field(field, buf, offset)
+        return message, offset
+
+    def _read_field(
+        self, field: MessageDefinitionField, buf: memoryview, offset: int
+    ) -> Tuple[Any, int]:
+        if not field.isArray:
+            return self._read_value(field, buf, offset)
+        length = field.arrayLength
+        if length is None:
+            (length,) = struct.unpack_from("<I", buf, offset)
+            offset += 4
+        if field.type in BYTE_TYPES:
+            if length > len(buf) - offset:
+                raise length_error("Array", length, len(buf) - offset)
+            return bytes(buf[offset : offset + length]), offset + length
+        values = []
+        for _ in range(length):
+            value, offset = self._read_value(field, buf, offset)
+            values.append(value)
+        return values, offset
+
+    def _read_value(
+        self, field: MessageDefinitionField, buf: memoryview, offset: int
+    ) -> Tuple[Any, int]:
+        if field.isComplex:
+            sub = self._types.get(field.type)
+            if sub is None:
+                raise ValueError(
+                    f'Missing definition for submessage type "{field.type}"'
+                )
+            return self._read_message(sub, buf, offset)
+        if field.type == "string":
+            (size,) = struct.unpack_from("<I", buf, offset)
+            offset += 4
+            if size > len(buf) - offset:
+                raise length_error("String", size, len(buf) - offset)
+            text = str(buf[offset : offset + size], "utf-8", "replace")
+            return text, offset + size
+        fmt = PRIMITIVE_FORMATS.get(field.type)
+        if fmt is None:
+            raise ValueError(f"Unsupported type '{field.type}'")
+        values = struct.unpack_from("<" + fmt, buf, offset)
+        offset += struct.calcsize("<" + fmt)
+        if field.type in TIME_TYPES:
+            return Time(*values), offset
+        return values[0], offset
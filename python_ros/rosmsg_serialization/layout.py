@@ -0,0 +1,129 @@
+"""Static layout analysis of ROS 1 message definitions.
+
+For every type the analysis reports where each field sits in a serialized
+message and whether the whole message has a fixed size. Fixed-size types also
+get the ``struct`` format and, with NumPy installed, a packed little-endian
+structured ``numpy.dtype`` whose records have the same bytes as the message.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from python_ros.message_definition import MessageDefinition, MessageDefinitionField
+
+from .arrays import HAVE_NUMPY, numpy, numpy_dtype
+from .codegen import CodeGenerator, compact_format
+from .primitives import TIME_TYPES
+
+
+@dataclass(frozen=True)
+class FieldLayout:
+    """Position of one field in a serialized message.
+
+    ``offset`` counts bytes from the end of the variable-size field named
+    ``after``, or from the start of the message if ``after`` is ``None``.
+    ``size`` is ``None`` for variable-size fields.
+    """
+
+    name: str
+    type: str
+    offset: int
+    after: Optional[str]
+    size: Optional[int]
+
+
+@dataclass(frozen=True)
+class MessageLayout:
+    """Field positions of a message type and, if it is fixed-size, its format."""
+
+    name: Optional[str]
+    fields: Tuple[FieldLayout, ...]
+    byteSize: Optional[int]
+    format: Optional[str]
+    dtype: Any = None
+
+    @property
+    def isFixedSize(self) -> bool:
+        return self.byteSize is not None
+
+
+class LayoutAnalyzer:
+    """Computes :class:`MessageLayout` objects for a definition list, memoized."""
+
+    def __init__(self, definitions: List[MessageDefinition]) -> None:
+        self._generator = CodeGenerator(definitions, {})
+        self._layouts: Dict[Optional[str], MessageLayout] = {}
+
+    def layout(self, type_name: Optional[str] = None) -> MessageLayout:
+        """Layout of *type_name*, or of the root type if it is ``None``."""
+
+        generator = self._generator
+        msg_def = generator.root if type_name is None else generator.lookup(type_name)
+        key = msg_def.name
+        if key not in self._layouts:
+            self._layouts[key] = self._analyze(msg_def)
+        return self._layouts[key]
+
+    def _analyze(self, msg_def: MessageDefinition) -> MessageLayout:
+        generator = self._generator
+        fields: List[FieldLayout] = []
+        after: Optional[str] = None
+        offset = 0
+        for field in msg_def.definitions:
+            if field.isConstant:
+                continue
+            layout = generator.field_layout(field)
+            size = None if layout is None else generator.layout_size(layout)
+            fields.append(FieldLayout(field.name, field.type, offset, after, size))
+            if size is None:
+                after = field.name
+                offset = 0
+            else:
+                offset += size
+
+        layout = generator.message_layout(msg_def)
+        if layout is None:
+            return MessageLayout(msg_def.name, tuple(fields), None, None)
+        fmt = "<" + compact_format(layout[0])
+        dtype = self._dtype(msg_def) if HAVE_NUMPY else None
+        return MessageLayout(
+            msg_def.name, tuple(fields), generator.layout_size(layout), fmt, dtype
+        )
+
+    def _dtype(self, msg_def: MessageDefinition) -> Any:
+        return numpy.dtype(
+            [
+                self._field_dtype(field)
+                for field in msg_def.definitions
+                if not field.isConstant
+            ]
+        )
+
+    def element_dtype(self, field: MessageDefinitionField) -> Any:
+        """The dtype of one element of *field*, ``None`` if it is variable-size."""
+
+        if field.isComplex:
+            return self.layout(field.type).dtype
+        if field.type in TIME_TYPES:
+            code = "<u4" if field.type == "time" else "<i4"
+            return numpy.dtype([("sec", code), ("nsec", code)])
+        if field.type == "string":
+            return None
+        return numpy_dtype(field.type)
+
+    def _field_dtype(self, field: MessageDefinitionField) -> Tuple[Any, ...]:
+        dtype = self.element_dtype(field)
+        if field.isArray:
+            return field.name, dtype, (field.arrayLength,)
+        return field.name, dtype
+
+
+def analyze_layouts(definitions: List[MessageDefinition]) -> List[MessageLayout]:
+    """Return the layout of every type in *definitions*, in the same order."""
+
+    analyzer = LayoutAnalyzer(definitions)
+    return [
+        analyzer.layout(d.name) if d.name else analyzer.layout() for d in definitions
+    ]
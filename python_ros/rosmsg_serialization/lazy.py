@@ -0,0 +1,419 @@
+"""Lazily decoded views of serialized ROS 1 messages.
+
+:class:`LazyMessageReader` generates one :class:`LazyMessage` subclass per
+message type. An instance only remembers the buffer and the offset of its
+message. Fields are decoded on first access and cached in ``__slots__``.
+
+Field offsets within the fixed-size prefix of a type are constants. The first
+access to a field behind a variable-size field builds an index by skipping over
+strings and arrays without decoding them. The index holds one offset per
+variable-size field. Nested messages decode to lazy messages, and arrays of
+messages decode to :class:`LazyArray` sequences of lazy messages.
+"""
+
+from __future__ import annotations
+
+import keyword
+import struct
+from abc import ABC, abstractmethod
+from collections.abc import Sequence
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+    overload,
+)
+
+from python_ros.message_definition import MessageDefinition, MessageDefinitionField
+
+from .codegen import CompiledCache
+from .primitives import as_byte_view
+from .reader import (
+    CompiledReader,
+    _ReaderCompiler,
+    _ReaderFunctionBuilder,
+    compile_reader,
+    reader_options,
+)
+
+SkipFunction = Callable[[memoryview, int], int]
+
+
+def _truncated(exc: struct.error) -> ValueError:
+    return ValueError(f"Buffer too short to read message: {exc}")
+
+
+class LazyMessage(ABC):
+    """Base class of the generated lazy message types.
+
+    Fields are attributes named like the fields of the definition. The helper
+    methods start with an underscore, since ROS field names cannot.
+    """
+
+    __slots__ = ("_buf", "_offset")
+
+    # Set on the generated subclasses
+    _fields: Tuple[str, ...] = ()
+    _type: Optional[str] = None
+    _definitions: List[MessageDefinition] = []
+    _options: Tuple[bool, ...] = ()
+    _reader: Optional[CompiledReader] = None
+
+    def __init__(self, buf: memoryview, offset: int = 0) -> None:
+        self._buf = buf
+        self._offset = offset
+
+    @abstractmethod
+    def _size(self) -> int:
+        """Serialized size of the message in bytes."""
+
+    def _asdict(self) -> Dict[str, Any]:
+        """Decode the whole message like :class:`MessageReader` would."""
+
+        cls = type(self)
+        if cls._reader is None:
+            cls._reader = compile_reader(cls._definitions, *cls._options)
+        try:
+            message, _ = cls._reader.read(self._buf, self._offset)
+        except struct.error as exc:
+            raise _truncated(exc) from exc
+        return message
+
+    def __repr__(self) -> str:
+        return f"<LazyMessage {self._type or 'message'} at offset {self._offset}>"
+
+
+class LazyArray(Sequence):
+    """Sequence of lazily decoded messages stored back to back.
+
+    Element offsets are computed from the element size when it is fixed, and
+    otherwise by skipping over all elements once.
+    """
+
+    __slots__ = ("_buf", "_start", "_count", "_element", "_size", "_skip", "_items")
+
+    def __init__(
+        self,
+        buf: memoryview,
+        start: int,
+        count: int,
+        element: Type[LazyMessage],
+        size: Optional[int],
+        skip: Optional[SkipFunction] = None,
+    ) -> None:
+        self._buf = buf
+        self._start = start
+        self._count = count
+        self._element = element
+        self._size = size
+        self._skip = skip
+        self._items: Optional[List[Any]] = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    @overload
+    def __getitem__(self, index: int) -> LazyMessage:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[LazyMessage]:
+        ...
+
+    def __getitem__(
+        self, index: Union[int, slice]
+    ) -> Union[LazyMessage, List[LazyMessage]]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("LazyArray index out of range")
+        if self._size is not None:
+            return self._element(self._buf, self._start + index * self._size)
+        if self._items is None:
+            self._items = self._elements()
+        return self._items[index]
+
+    def _elements(self) -> List[LazyMessage]:
+        assert self._skip is not None
+        buf, element, skip = self._buf, self._element, self._skip
+        items = []
+        offset = self._start
+        try:
+            for _ in range(self._count):
+                items.append(element(buf, offset))
+                offset = skip(buf, offset)
+        except struct.error as exc:
+            raise _truncated(exc) from exc
+        return items
+
+    def __repr__(self) -> str:
+        name = self._element._type or "message"
+        return f"<LazyArray of {self._count} {name} at offset {self._start}>"
+
+
+class CompiledLazyReader(NamedTuple):
+    """The generated lazy type of a root message and its source."""
+
+    message: Type[LazyMessage]
+    source: str
+
+
+class LazyMessageReader:
+    """Wrap serialized ROS 1 messages in lazily decoded :class:`LazyMessage` views.
+
+    Fields decode to the same values :class:`MessageReader` produces, except
+    that nested messages are lazy too, as are arrays of messages unless they
+    decode to structured arrays. The array options are described on
+    :class:`MessageReader`. The views read from *buffer*, so it must stay
+    unchanged while they are in use.
+    """
+
+    def __init__(
+        self,
+        definitions: List[MessageDefinition],
+        array_views: bool = False,
+        copy_arrays: bool = False,
+        use_numpy: Optional[bool] = None,
+        structured_arrays: bool = False,
+    ) -> None:
+        self._compiled = compile_lazy_reader(
+            definitions, array_views, copy_arrays, use_numpy, structured_arrays
+        )
+
+    def read_message(self, buffer: Any) -> LazyMessage:
+        return self._compiled.message(as_byte_view(buffer), 0)
+
+    def size(self, buffer: Any) -> int:
+        """Serialized size of the message at the start of *buffer*."""
+
+        view = as_byte_view(buffer)
+        try:
+            size = self._compiled.message(view, 0)._size()
+        except struct.error as exc:
+            raise _truncated(exc) from exc
+        if size > len(view):
+            raise ValueError(
+                f"Buffer too short to read message: need {size} bytes, "
+                f"got {len(view)}"
+            )
+        return size
+
+    def source(self) -> str:
+        return self._compiled.source
+
+
+_compiled_lazy_readers: CompiledCache[CompiledLazyReader] = CompiledCache()
+
+
+def compile_lazy_reader(
+    definitions: List[MessageDefinition],
+    array_views: bool = False,
+    copy_arrays: bool = False,
+    use_numpy: Optional[bool] = None,
+    structured_arrays: bool = False,
+) -> CompiledLazyReader:
+    """Return the lazy type for *definitions*, generating it once per structure."""
+
+    options = reader_options(array_views, copy_arrays, use_numpy, structured_arrays)
+    return _compiled_lazy_readers.get(
+        definitions, lambda: _LazyCompiler(definitions, *options).compile(), *options
+    )
+
+
+def clear_lazy_reader_cache() -> None:
+    _compiled_lazy_readers.clear()
+
+
+# Position of a field: index entry it follows (None for the message start) and
+# a constant byte offset from there
+_Position = Tuple[Optional[int], int]
+
+
+class _LazyCompiler(_ReaderCompiler):
+    def __init__(
+        self,
+        definitions: List[MessageDefinition],
+        array_views: bool = False,
+        copy_arrays: bool = False,
+        use_numpy: bool = False,
+        structured_arrays: bool = False,
+    ) -> None:
+        super().__init__(
+            definitions, array_views, copy_arrays, use_numpy, structured_arrays
+        )
+        self.definitions = definitions
+        self.options = (array_views, copy_arrays, use_numpy, structured_arrays)
+        self.namespace.update(
+            {
+                "_LazyMessage": LazyMessage,
+                "_LazyArray": LazyArray,
+                "_struct_error": struct.error,
+                "_truncated": _truncated,
+            }
+        )
+        self._classes: List[Tuple[str, MessageDefinition]] = []
+
+    def compile(self) -> CompiledLazyReader:
+        entry = self._lazy_class(self.root)
+        source = self.execute("<rosmsg_serialization lazy reader>")
+        for name, msg_def in self._classes:
+            cls = self.namespace[name]
+            cls._type = msg_def.name
+            cls._definitions = [msg_def] + [
+                d for d in self.definitions if d is not msg_def
+            ]
+            cls._options = self.options
+        return CompiledLazyReader(self.namespace[entry], source)
+
+    def _index_function(self, msg_def: MessageDefinition) -> str:
+        """Function returning the offsets just past each variable-size field.
+
+        The last entry is the offset just past the message.
+        """
+
+        name, new = self.function_name("index", msg_def)
+        if new:
+            lines: List[str] = []
+            anchors: List[str] = []
+            fixed = 0
+            for field in msg_def.definitions:
+                if field.isConstant:
+                    continue
+                variable = self.field_layout(field) is None
+                fixed = self._emit_skip_field(lines, field, fixed)
+                if variable:
+                    if fixed:
+                        lines.append(f"offset += {fixed}")
+                        fixed = 0
+                    anchors.append(f"_a{len(anchors)}")
+                    lines.append(f"{anchors[-1]} = offset")
+            if fixed:
+                lines.append(f"offset += {fixed}")
+            lines.append(f"return ({', '.join([*anchors, 'offset'])},)")
+            body = "\n".join("    " + line for line in lines)
+            self.sources.append(f"def {name}(buf, offset):\n{body}")
+        return name
+
+    # -- generated classes --------------------------------------------------------
+
+    def _lazy_class(self, msg_def: MessageDefinition) -> str:
+        name, new = self.function_name("Lazy", msg_def)
+        if not new:
+            return name
+        self._classes.append((name, msg_def))
+        fields = [f for f in msg_def.definitions if not f.isConstant]
+        positions: List[_Position] = []
+        anchor: Optional[int] = None
+        fixed = 0
+        for field in fields:
+            positions.append((anchor, fixed))
+            layout = self.field_layout(field)
+            if layout is not None:
+                fixed += self.layout_size(layout)
+            else:
+                anchor = 0 if anchor is None else anchor + 1
+                fixed = 0
+
+        slots = [f"_lazy_{field.name}" for field in fields]
+        lines = [f"class {name}(_LazyMessage):"]
+        if anchor is None:
+            lines += [f"    __slots__ = {tuple(slots)!r}", ""]
+            lines += ["    def _size(self):", f"        return {fixed}"]
+        else:
+            index = self._index_function(msg_def)
+            lines += [f"    __slots__ = {tuple([*slots, '_lazy_index'])!r}", ""]
+            lines += [
+                "    def _index(self):",
+                "        try:",
+                "            return self._lazy_index",
+                "        except AttributeError:",
+                "            pass",
+                f"        index = self._lazy_index = {index}(self._buf, self._offset)",
+                "        return index",
+                "",
+                "    def _size(self):",
+                "        return self._index()[-1] - self._offset",
+            ]
+        lines.insert(2, f"    _fields = {tuple(f.name for f in fields)!r}")
+        keywords = []
+        for field, slot, position in zip(fields, slots, positions):
+            lines.append("")
+            lines.extend(self._property_lines(field, slot, position))
+            if keyword.iskeyword(field.name):
+                keywords.append(field.name)
+        for field_name in keywords:
+            # Field names that are Python keywords cannot be defined in the body
+            lines.append(
+                f"setattr({name}, {field_name!r}, property({name}._get_{field_name}))"
+            )
+        self.sources.append("\n".join(lines))
+        return name
+
+    def _property_lines(
+        self, field: MessageDefinitionField, slot: str, position: _Position
+    ) -> List[str]:
+        anchor, fixed = position
+        start = "self._offset" if anchor is None else f"self._index()[{anchor}]"
+        if fixed:
+            start += f" + {fixed}"
+        fb = _ReaderFunctionBuilder(self)
+        fb.lines.append("buf = self._buf")
+        fb.lines.append(f"offset = {start}")
+        expr = self._value_expr(fb, field)
+        if fb.run_formats:
+            fb.flush()
+            # The offset past the field is not needed
+            fb.lines.pop()
+        body = [
+            "try:",
+            *("    " + line for line in fb.lines),
+            f"    value = self.{slot} = {expr}",
+            "except _struct_error as exc:",
+            "    raise _truncated(exc) from exc",
+            "return value",
+        ]
+        if keyword.iskeyword(field.name):
+            header = [f"    def _get_{field.name}(self):"]
+        else:
+            header = ["    @property", f"    def {field.name}(self):"]
+        return [
+            *header,
+            "        try:",
+            f"            return self.{slot}",
+            "        except AttributeError:",
+            "            pass",
+            *("        " + line for line in body),
+        ]
+
+    def _value_expr(
+        self, fb: _ReaderFunctionBuilder, field: MessageDefinitionField
+    ) -> str:
+        if not field.isComplex or self.is_view(field):
+            if self.field_layout(field) is None:
+                fb.lines.append("_end = len(buf)")
+            return self._emit_field(fb, field)
+        msg_def = self.lookup(field.type)
+        cls = self._lazy_class(msg_def)
+        if not field.isArray:
+            return f"{cls}(buf, offset)"
+        if field.arrayLength is None:
+            fb.read_count()
+            count = "_n"
+        else:
+            count = str(field.arrayLength)
+        element = self.type_layout(field)
+        if element is None:
+            skip = self._skip_function(msg_def)
+            return f"_LazyArray(buf, offset, {count}, {cls}, None, {skip})"
+        size = self.layout_size(element)
+        fb.lines.append("_end = len(buf)")
+        fb.check_size("Array", f"{count} * {size}")
+        return f"_LazyArray(buf, offset, {count}, {cls}, {size})"
@@ -0,0 +1,59 @@
+"""Wire formats of the ROS 1 builtin types.
+
+ROS 1 serializes every builtin little-endian and without padding, so each fixed
+size type maps to a ``struct`` format code used with the ``<`` prefix.
+"""
+
+from __future__ import annotations
+
+import struct
+from typing import Any, Optional
+
+# struct format of one value of each fixed-size builtin type
+PRIMITIVE_FORMATS = {
+    "bool": "?",
+    "int8": "b",
+    "uint8": "B",
+    "byte": "b",
+    "char": "B",
+    "int16": "h",
+    "uint16": "H",
+    "int32": "i",
+    "uint32": "I",
+    "int64": "q",
+    "uint64": "Q",
+    "float32": "f",
+    "float64": "d",
+    "time": "II",
+    "duration": "ii",
+}
+
+# Arrays of these types decode to ``bytes`` instead of a list of ints
+BYTE_TYPES = frozenset({"uint8", "char"})
+
+TIME_TYPES = frozenset({"time", "duration"})
+
+UINT32 = struct.Struct("<I")
+
+
+def primitive_format(type_name: str) -> Optional[str]:
+    """Return the ``struct`` format of a fixed-size builtin type, else ``None``."""
+
+    return PRIMITIVE_FORMATS.get(type_name)
+
+
+def primitive_size(type_name: str) -> int:
+    return struct.calcsize("<" + PRIMITIVE_FORMATS[type_name])
+
+
+def as_byte_view(buffer: Any) -> memoryview:
+    """Return a flat, byte-addressed ``memoryview`` of *buffer* without copying."""
+
+    view = memoryview(buffer)
+    if view.format != "B" or view.ndim != 1:
+        view = view.cast("B")
+    return view
+
+
+def length_error(kind: str, size: int, available: int) -> ValueError:
+    return ValueError(f"{kind} length error: size {size}, maxSize {available}")
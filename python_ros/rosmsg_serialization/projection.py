@@ -0,0 +1,197 @@
+"""Decode selected fields of serialized ROS 1 messages and skip the rest.
+
+A projector is compiled for a list of dotted field paths such as
+``header.stamp`` or ``pose.pose.position``. The generated function walks the
+message like the full decoder, but the fields that are not selected are only
+stepped over. Fixed-size fields become padding in the merged ``struct`` runs.
+Strings and arrays are skipped by reading their lengths. Decoding stops after
+the last selected field.
+"""
+
+from __future__ import annotations
+
+import struct
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from python_ros.message_definition import MessageDefinition, MessageDefinitionField
+
+from .codegen import CompiledCache
+from .primitives import as_byte_view
+from .reader import _ReaderCompiler, _ReaderFunctionBuilder, reader_options
+
+ProjectFunction = Callable[[memoryview, int], Dict[str, Any]]
+
+
+class CompiledProjector(NamedTuple):
+    """A compiled projection function together with its source."""
+
+    project: ProjectFunction
+    source: str
+
+
+class MessageProjector:
+    """Decode only the fields at *paths* from serialized ROS 1 messages.
+
+    Paths are field names joined with dots; every name before the last one
+    must be a nested message that is not an array. Values decode as with
+    :class:`MessageReader`, whose array options are accepted too.
+    """
+
+    def __init__(
+        self,
+        definitions: List[MessageDefinition],
+        paths: Iterable[str],
+        array_views: bool = False,
+        copy_arrays: bool = False,
+        use_numpy: Optional[bool] = None,
+        structured_arrays: bool = False,
+    ) -> None:
+        self._compiled = compile_projector(
+            definitions, paths, array_views, copy_arrays, use_numpy, structured_arrays
+        )
+
+    def project(self, buffer: Any) -> Dict[str, Any]:
+        """Return the selected values keyed on their paths."""
+
+        try:
+            return self._compiled.project(as_byte_view(buffer), 0)
+        except struct.error as exc:
+            raise ValueError(f"Buffer too short to read message: {exc}") from exc
+
+    def source(self) -> str:
+        return self._compiled.source
+
+
+_compiled_projectors: CompiledCache[CompiledProjector] = CompiledCache()
+
+
+def compile_projector(
+    definitions: List[MessageDefinition],
+    paths: Iterable[str],
+    array_views: bool = False,
+    copy_arrays: bool = False,
+    use_numpy: Optional[bool] = None,
+    structured_arrays: bool = False,
+) -> CompiledProjector:
+    """Return the projector for *definitions* and *paths*, compiling it once."""
+
+    paths = tuple(dict.fromkeys(paths))
+    options = reader_options(array_views, copy_arrays, use_numpy, structured_arrays)
+    return _compiled_projectors.get(
+        definitions,
+        lambda: _ProjectionCompiler(definitions, paths, *options).compile(),
+        paths,
+        *options,
+    )
+
+
+def clear_projector_cache() -> None:
+    _compiled_projectors.clear()
+
+
+class _Selection:
+    """Selected fields below one message; *path* is set if it is selected itself."""
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path
+        self.children: Dict[str, _Selection] = {}
+
+    def descendants(self, keys: Tuple[str, ...] = ()) -> Iterable[Tuple[str, str]]:
+        """Yield the selected paths below this one and their keys from here."""
+
+        for name, child in self.children.items():
+            if child.path is not None:
+                yield child.path, "".join(f"[{key!r}]" for key in (*keys, name))
+            yield from child.descendants((*keys, name))
+
+
+class _ProjectionCompiler(_ReaderCompiler):
+    def __init__(
+        self,
+        definitions: List[MessageDefinition],
+        paths: Tuple[str, ...],
+        array_views: bool = False,
+        copy_arrays: bool = False,
+        use_numpy: bool = False,
+        structured_arrays: bool = False,
+    ) -> None:
+        super().__init__(
+            definitions, array_views, copy_arrays, use_numpy, structured_arrays
+        )
+        self.paths = paths
+        self.selection = _Selection()
+        for path in paths:
+            self._select(path)
+
+    def compile(self) -> CompiledProjector:
+        fb = _ReaderFunctionBuilder(self)
+        fb.lines.append("_end = len(buf)")
+        values: Dict[str, str] = {}
+        self._emit_selection(fb, self.root, self.selection, values)
+        items = ", ".join(f"{path!r}: {values[path]}" for path in self.paths)
+        self.sources.append(fb.function("_project(buf, offset)", "{" + items + "}"))
+        source = self.execute("<rosmsg_serialization projector>")
+        return CompiledProjector(self.namespace["_project"], source)
+
+    def _select(self, path: str) -> None:
+        msg_def: Optional[MessageDefinition] = self.root
+        selection = self.selection
+        for name in path.split("."):
+            if msg_def is None:
+                raise ValueError(f"Cannot select '{path}': '{name}' is not a message")
+            field = next(
+                (f for f in msg_def.definitions if f.name == name and not f.isConstant),
+                None,
+            )
+            if field is None:
+                raise ValueError(f"Cannot select '{path}': no field '{name}'")
+            selection = selection.children.setdefault(name, _Selection())
+            is_message = field.isComplex and not field.isArray
+            msg_def = self.lookup(field.type) if is_message else None
+        selection.path = path
+
+    def _emit_selection(
+        self,
+        fb: _ReaderFunctionBuilder,
+        msg_def: MessageDefinition,
+        selection: _Selection,
+        values: Dict[str, str],
+        last: bool = True,
+    ) -> None:
+        """Emit the selected fields of *msg_def*.
+
+        If *last* is set nothing after the selection is needed, so the walk
+        ends at its final field.
+        """
+
+        remaining = len(selection.children)
+        for field in msg_def.definitions:
+            if not remaining and last:
+                break
+            if field.isConstant:
+                continue
+            child = selection.children.get(field.name)
+            if child is None:
+                self._emit_skip(fb, field)
+                continue
+            remaining -= 1
+            if child.path is None:
+                sub = self.lookup(field.type)
+                self._emit_selection(fb, sub, child, values, last and not remaining)
+                continue
+            expr = self._emit_field(fb, field)
+            values[child.path] = expr
+            for path, keys in child.descendants():
+                values[path] = expr + keys
+
+    def _emit_skip(
+        self, fb: _ReaderFunctionBuilder, field: MessageDefinitionField
+    ) -> None:
+        layout = self.field_layout(field)
+        if layout is not None:
+            fb.add_fixed((f"{self.layout_size(layout)}x", 0))
+            return
+        fb.flush()
+        fixed = self._emit_skip_field(fb.lines, field, 0)
+        if fixed:
+            fb.add_fixed((f"{fixed}x", 0))
@@ -0,0 +1,578 @@
+"""Compile specialized ROS 1 message decoders from message definitions.
+
+For every message type the compiler emits Python source for one decode
+function, then ``exec``s it. Runs of adjacent fixed-size fields, including the
+fields of fixed-size nested messages, are read with a single precompiled
+``struct.Struct.unpack_from`` call, and arrays of fixed-size messages are
+decoded with ``Struct.iter_unpack``. Decoders read straight from a
+``memoryview`` of the input, so no intermediate ``bytes`` copies are made.
+"""
+
+from __future__ import annotations
+
+import struct
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from python_ros.message_definition import MessageDefinition, MessageDefinitionField
+from python_ros.rostime import Time
+
+from .arrays import HAVE_NUMPY, LITTLE_ENDIAN_HOST, copy_array, numpy, numpy_dtype
+from .classes import MessageClassFactory
+from .codegen import (
+    CodeGenerator,
+    CompiledCache,
+    Layout,
+    RunFunctionBuilder,
+    sanitize_name,
+)
+from .layout import LayoutAnalyzer
+from .primitives import (
+    BYTE_TYPES,
+    PRIMITIVE_FORMATS,
+    TIME_TYPES,
+    UINT32,
+    as_byte_view,
+    length_error,
+    primitive_size,
+)
+
+ReadFunction = Callable[[memoryview, int], Tuple[Dict[str, Any], int]]
+
+
+class CompiledReader(NamedTuple):
+    """A compiled decoder together with the source it was generated from."""
+
+    read: ReadFunction
+    source: str
+
+
+class MessageReader:
+    """Decode serialized ROS 1 messages into dictionaries.
+
+    Fields decode to Python values: ``time`` and ``duration`` to
+    :class:`~python_ros.rostime.Time`, ``uint8``/``char`` arrays to ``bytes``,
+    other arrays to lists and nested messages to dictionaries. Constants are not
+    part of the result.
+
+    With *array_views* set, arrays of numeric and ``bool`` types instead decode
+    to views of the source buffer (see :mod:`.arrays`), which stay valid only as
+    long as the buffer does. *copy_arrays* makes those arrays own their data.
+    *use_numpy* selects the view type and defaults to whether NumPy is installed.
+    With *structured_arrays* also set, arrays of fixed-size messages decode to
+    NumPy structured arrays with the dtypes of :mod:`.layout` in a single
+    ``frombuffer`` call.
+
+    With *message_classes* set, messages decode to instances of the classes of
+    :mod:`.classes` instead of dictionaries.
+    """
+
+    def __init__(
+        self,
+        definitions: List[MessageDefinition],
+        array_views: bool = False,
+        copy_arrays: bool = False,
+        use_numpy: Optional[bool] = None,
+        structured_arrays: bool = False,
+        message_classes: bool = False,
+    ) -> None:
+        self._compiled = compile_reader(
+            definitions,
+            array_views,
+            copy_arrays,
+            use_numpy,
+            structured_arrays,
+            message_classes,
+        )
+
+    def read_message(self, buffer: Any) -> Any:
+        view = as_byte_view(buffer)
+        try:
+            message, _ = self._compiled.read(view, 0)
+        except struct.error as exc:
+            raise ValueError(f"Buffer too short to read message: {exc}") from exc
+        return message
+
+    def source(self) -> str:
+        return self._compiled.source
+
+
+_compiled_readers: CompiledCache[CompiledReader] = CompiledCache()
+
+
+def compile_reader(
+    definitions: List[MessageDefinition],
+    array_views: bool = False,
+    copy_arrays: bool = False,
+    use_numpy: Optional[bool] = None,
+    structured_arrays: bool = False,
+    message_classes: bool = False,
+) -> CompiledReader:
+    """Return the decoder for *definitions*, compiling it once per structure.
+
+    The options are described on :class:`MessageReader`.
+    """
+
+    options = reader_options(array_views, copy_arrays, use_numpy, structured_arrays)
+    return _compiled_readers.get(
+        definitions,
+        lambda: _ReaderCompiler(
+            definitions, *options, message_classes=message_classes
+        ).compile(),
+        *options,
+        message_classes,
+    )
+
+
+def clear_reader_cache() -> None:
+    _compiled_readers.clear()
+
+
+def reader_options(
+    array_views: bool,
+    copy_arrays: bool,
+    use_numpy: Optional[bool],
+    structured_arrays: bool = False,
+) -> Tuple[bool, bool, bool, bool]:
+    """Normalize the array options so equivalent ones share a cache entry."""
+
+    if not array_views:
+        return False, False, False, False
+    if use_numpy is None:
+        use_numpy = HAVE_NUMPY
+    if (use_numpy or structured_arrays) and not HAVE_NUMPY:
+        raise ImportError("NumPy is required for NumPy array views")
+    if structured_arrays and not use_numpy:
+        raise ValueError("Structured arrays need NumPy array views")
+    return True, copy_arrays, use_numpy, structured_arrays
+
+
+def _times(values: Tuple[int, ...]) -> List[Time]:
+    it = iter(values)
+    return [Time(sec, nsec) for sec, nsec in zip(it, it)]
+
+
+def _read_strings(buf: memoryview, offset: int, count: int) -> Tuple[List[str], int]:
+    end = len(buf)
+    unpack_u32 = UINT32.unpack_from
+    strings = []
+    for _ in range(count):
+        (size,) = unpack_u32(buf, offset)
+        offset += 4
+        if size > end - offset:
+            raise length_error("String", size, end - offset)
+        strings.append(str(buf[offset : offset + size], "utf-8", "replace"))
+        offset += size
+    return strings, offset
+
+
+class _ReaderFunctionBuilder(RunFunctionBuilder):
+    def __init__(self, generator: CodeGenerator) -> None:
+        super().__init__(generator)
+        self._run_var: Optional[str] = None
+        self._run_offset: Optional[str] = None
+        self._run_count = 0
+        self._run_size = 0
+
+    def add_fixed(self, layout: Layout) -> Tuple[str, int, int]:
+        """Queue a fixed-size item.
+
+        Returns the tuple and index holding its values, and its byte position
+        relative to :meth:`run_offset`.
+        """
+
+        if self._run_var is None:
+            self._run_var = self.variable("_t")
+        fmt, count = layout
+        index = self._run_count
+        position = self._run_size
+        self.run_formats.append(fmt)
+        self._run_count += count
+        self._run_size += self.generator.layout_size(layout)
+        return self._run_var, index, position
+
+    def run_offset(self) -> str:
+        """Name of a variable holding the buffer offset of the pending run."""
+
+        if self._run_offset is None:
+            self._run_offset = self.variable("_o")
+        return self._run_offset
+
+    def emit_run(self, fmt: str) -> None:
+        if self._run_offset is not None:
+            self.lines.append(f"{self._run_offset} = offset")
+        if self._run_count:
+            unpack = self.generator.struct_method(fmt, "unpack_from")
+            self.lines.append(f"{self._run_var} = {unpack}(buf, offset)")
+        self._run_var = None
+        self._run_offset = None
+        self._run_count = 0
+        self._run_size = 0
+
+    def read_count(self) -> None:
+        self.lines.append("(_n,) = _u32(buf, offset)")
+        self.lines.append("offset += 4")
+
+    def check_size(self, kind: str, size: str) -> None:
+        self.lines.append(f"if {size} > _end - offset:")
+        self.lines.append(f"    raise _length_error({kind!r}, {size}, _end - offset)")
+
+
+class _ReaderCompiler(CodeGenerator):
+    def __init__(
+        self,
+        definitions: List[MessageDefinition],
+        array_views: bool = False,
+        copy_arrays: bool = False,
+        use_numpy: bool = False,
+        structured_arrays: bool = False,
+        message_classes: bool = False,
+    ) -> None:
+        super().__init__(
+            definitions,
+            {
+                "Time": Time,
+                "_u32": UINT32.unpack_from,
+                "_unpack_from": struct.unpack_from,
+                "_times": _times,
+                "_read_strings": _read_strings,
+                "_length_error": length_error,
+                "_copy_array": copy_array,
+            },
+        )
+        self.array_views = array_views
+        self.copy_arrays = copy_arrays
+        self.use_numpy = use_numpy
+        self.structured_arrays = structured_arrays
+        self._has_views: Dict[str, bool] = {}
+        if use_numpy:
+            self.namespace["_frombuffer"] = numpy.frombuffer
+        if structured_arrays:
+            self._analyzer = LayoutAnalyzer(definitions)
+        self._classes = MessageClassFactory(definitions) if message_classes else None
+        self._class_names: Dict[Optional[str], str] = {}
+
+    def compile(self) -> CompiledReader:
+        entry = self._reader_function(self.root)
+        source = self.execute("<rosmsg_serialization reader>")
+        return CompiledReader(self.namespace[entry], source)
+
+    # -- decoded messages ---------------------------------------------------------
+
+    def message_expr(self, msg_def: MessageDefinition, items: List[str]) -> str:
+        """Expression building a message of *msg_def* from its field values."""
+
+        if self._classes is None:
+            fields = [f for f in msg_def.definitions if not f.isConstant]
+            pairs = [f"{f.name!r}: {item}" for f, item in zip(fields, items)]
+            return "{" + ", ".join(pairs) + "}"
+        name = self._class_names.get(msg_def.name)
+        if name is None:
+            name = f"_cls{len(self._class_names)}"
+            self.namespace[name] = self._classes.for_definition(msg_def)
+            self._class_names[msg_def.name] = name
+        return f"{name}({', '.join(items)})"
+
+    # -- array views --------------------------------------------------------------
+
+    def is_view(self, field: MessageDefinitionField) -> bool:
+        """Whether *field* decodes to a view of the source buffer."""
+
+        if not self.array_views or not field.isArray:
+            return False
+        if field.isComplex:
+            if not self.structured_arrays:
+                return False
+            element = self.type_layout(field)
+            return element is not None and self.layout_size(element) > 0
+        return field.type in PRIMITIVE_FORMATS and field.type not in TIME_TYPES
+
+    def has_views(self, type_name: str) -> bool:
+        """Whether a fixed-length array view sits at a fixed place in the type."""
+
+        if type_name not in self._has_views:
+            self._has_views[type_name] = any(
+                (self.is_view(f) and f.arrayLength is not None)
+                or (f.isComplex and not f.isArray and self.has_views(f.type))
+                for f in self.lookup(type_name).definitions
+                if not f.isConstant
+            )
+        return self._has_views[type_name]
+
+    def field_layout(self, field: MessageDefinitionField) -> Optional[Layout]:
+        if self.array_views and field.isArray and field.arrayLength is not None:
+            if self.is_view(field):
+                # Skip the array in the run; the view is taken at its position
+                element = self.type_layout(field)
+                assert element is not None
+                size = field.arrayLength * self.layout_size(element)
+                return f"{size}x", 0
+            if field.isComplex and self.has_views(field.type):
+                # Decoded element by element so every view knows its offset
+                return None
+        return super().field_layout(field)
+
+    def view_expr(self, type_name: str, offset: str, count: str) -> str:
+        if self.use_numpy:
+            dtype = f"_dtype_{sanitize_name(type_name)}"
+            if type_name in PRIMITIVE_FORMATS:
+                self.namespace[dtype] = numpy_dtype(type_name)
+            else:
+                layout = self._analyzer.layout(type_name)
+                self.namespace[dtype] = layout.dtype
+            expr = f"_frombuffer(buf, {dtype}, {count}, {offset})"
+            return expr + ".copy()" if self.copy_arrays else expr
+        code = PRIMITIVE_FORMATS[type_name]
+        size = primitive_size(type_name)
+        data = (
+            f"buf[{offset} : {offset} + {count if size == 1 else f'{count} * {size}'}]"
+        )
+        if self.copy_arrays or not LITTLE_ENDIAN_HOST:
+            return f"_copy_array({code!r}, {data})"
+        return f"{data}.cast({code!r})"
+
+    # -- expressions over unpacked tuples -----------------------------------------
+
+    def fixed_field_expr(
+        self,
+        field: MessageDefinitionField,
+        t: str,
+        i: int,
+        position: int = 0,
+        fb: Optional[_ReaderFunctionBuilder] = None,
+    ) -> str:
+        """Expression for a fixed-size field whose values start at ``t[i]``.
+
+        *position* is the byte offset of the field within the run of *fb*; it is
+        only needed for array views.
+        """
+
+        if self.is_view(field):
+            assert fb is not None
+            offset = fb.run_offset()
+            if position:
+                offset = f"{offset} + {position}"
+            return self.view_expr(field.type, offset, str(field.arrayLength))
+        if not field.isArray:
+            if field.isComplex:
+                return self.fixed_message_expr(
+                    self.lookup(field.type), t, i, position, fb
+                )
+            if field.type in TIME_TYPES:
+                return f"Time({t}[{i}], {t}[{i + 1}])"
+            return f"{t}[{i}]"
+        length = field.arrayLength
+        assert length is not None
+        if field.type in BYTE_TYPES:
+            return f"{t}[{i}]"
+        _, count = self.type_layout(field)  # type: ignore[misc]
+        end = i + count * length
+        if field.isComplex:
+            builder = self._builder_function(self.lookup(field.type))
+            if not count:
+                # Elements without values, which a zero step cannot range over
+                return f"[{builder}(()) for _ in range({length})]" if length else "[]"
+            items = f"range({i}, {end}, {count})"
+            return f"[{builder}({t}[_j : _j + {count}]) for _j in {items}]"
+        if not length:
+            # The run may have no values at all, leaving its tuple unassigned
+            return "[]"
+        if field.type in TIME_TYPES:
+            return f"_times({t}[{i}:{end}])"
+        return f"list({t}[{i}:{end}])"
+
+    def fixed_message_expr(
+        self,
+        msg_def: MessageDefinition,
+        t: str,
+        i: int,
+        position: int = 0,
+        fb: Optional[_ReaderFunctionBuilder] = None,
+    ) -> str:
+        items = []
+        for field in msg_def.definitions:
+            if field.isConstant:
+                continue
+            items.append(self.fixed_field_expr(field, t, i, position, fb))
+            layout = self.field_layout(field)
+            assert layout is not None
+            i += layout[1]
+            position += self.layout_size(layout)
+        return self.message_expr(msg_def, items)
+
+    # -- skipping over serialized fields ------------------------------------------
+
+    def _skip_function(self, msg_def: MessageDefinition) -> str:
+        """Function returning the offset just past a message."""
+
+        name, new = self.function_name("skip", msg_def)
+        if new:
+            lines: List[str] = []
+            fixed = self._emit_skip_message(lines, msg_def, 0)
+            if fixed:
+                lines.append(f"offset += {fixed}")
+            body = "\n".join("    " + line for line in [*lines, "return offset"])
+            self.sources.append(f"def {name}(buf, offset):\n{body}")
+        return name
+
+    def _emit_skip_message(
+        self, lines: List[str], msg_def: MessageDefinition, fixed: int
+    ) -> int:
+        for field in msg_def.definitions:
+            if not field.isConstant:
+                fixed = self._emit_skip_field(lines, field, fixed)
+        return fixed
+
+    def _emit_skip_field(
+        self, lines: List[str], field: MessageDefinitionField, fixed: int
+    ) -> int:
+        """Emit code skipping *field*.
+
+        *fixed* is a byte count not yet added to ``offset``; the count still
+        pending after the field is returned.
+        """
+
+        layout = self.field_layout(field)
+        if layout is not None:
+            return fixed + self.layout_size(layout)
+        if field.isComplex and not field.isArray:
+            return self._emit_skip_message(lines, self.lookup(field.type), fixed)
+        at = f"offset + {fixed}" if fixed else "offset"
+        if not field.isArray:
+            lines.append(f"(_n,) = _u32(buf, {at})")
+            lines.append(f"offset += {fixed + 4} + _n")
+            return 0
+        if field.arrayLength is None:
+            lines.append(f"(_n,) = _u32(buf, {at})")
+            fixed += 4
+            count = "_n"
+        else:
+            count = str(field.arrayLength)
+        if fixed:
+            lines.append(f"offset += {fixed}")
+        element = self.type_layout(field)
+        if element is None and not field.isComplex:
+            lines.append(f"for _ in range({count}):")
+            lines.append("    (_k,) = _u32(buf, offset)")
+            lines.append("    offset += 4 + _k")
+        elif element is None:
+            skip = self._skip_function(self.lookup(field.type))
+            lines.append(f"for _ in range({count}):")
+            lines.append(f"    offset = {skip}(buf, offset)")
+        elif self.layout_size(element):
+            lines.append(f"offset += {count} * {self.layout_size(element)}")
+        return 0
+
+    # -- generated functions ------------------------------------------------------
+
+    def _builder_function(self, msg_def: MessageDefinition) -> str:
+        """Function building a fixed-size message from its unpacked values."""
+
+        name, new = self.function_name("build", msg_def)
+        if new:
+            expr = self.fixed_message_expr(msg_def, "t", 0)
+            self.sources.append(f"def {name}(t):\n    return {expr}")
+        return name
+
+    def _reader_function(self, msg_def: MessageDefinition) -> str:
+        """Function decoding a message at an offset, returning the new offset."""
+
+        name, new = self.function_name("read", msg_def)
+        if new:
+            fb = _ReaderFunctionBuilder(self)
+            fb.lines.append("_end = len(buf)")
+            expr = self._emit_message(fb, msg_def)
+            self.sources.append(fb.function(f"{name}(buf, offset)", f"{expr}, offset"))
+        return name
+
+    def _emit_message(
+        self, fb: _ReaderFunctionBuilder, msg_def: MessageDefinition
+    ) -> str:
+        items = []
+        for field in msg_def.definitions:
+            if field.isConstant:
+                continue
+            items.append(self._emit_field(fb, field))
+        return self.message_expr(msg_def, items)
+
+    def _emit_field(
+        self, fb: _ReaderFunctionBuilder, field: MessageDefinitionField
+    ) -> str:
+        layout = self.field_layout(field)
+        if layout is not None:
+            t, i, position = fb.add_fixed(layout)
+            return self.fixed_field_expr(field, t, i, position, fb)
+        if field.isComplex and not field.isArray:
+            # Inline variable-size sub-messages so their leading fixed-size
+            # fields join the pending run
+            return self._emit_message(fb, self.lookup(field.type))
+
+        fb.flush()
+        var = fb.variable()
+        lines = fb.lines
+        if not field.isArray:
+            # Only strings are variable-size among the builtin scalars
+            fb.read_count()
+            fb.check_size("String", "_n")
+            lines.append(f'{var} = str(buf[offset : offset + _n], "utf-8", "replace")')
+            lines.append("offset += _n")
+            return var
+
+        if field.arrayLength is None:
+            fb.read_count()
+            count = "_n"
+        else:
+            count = str(field.arrayLength)
+
+        element = self.type_layout(field)
+        if element is None and not field.isComplex:
+            lines.append(f"{var}, offset = _read_strings(buf, offset, {count})")
+        elif (
+            element is None
+            or self.layout_size(element) == 0
+            or (
+                field.isComplex
+                and self.has_views(field.type)
+                and not self.is_view(field)
+            )
+        ):
+            reader = self._reader_function(self.lookup(field.type))
+            lines.append(f"{var} = []")
+            lines.append(f"for _ in range({count}):")
+            lines.append(f"    _e, offset = {reader}(buf, offset)")
+            lines.append(f"    {var}.append(_e)")
+        else:
+            self._emit_array(fb, field, element, var)
+        return var
+
+    def _emit_array(
+        self,
+        fb: _ReaderFunctionBuilder,
+        field: MessageDefinitionField,
+        element: Layout,
+        var: str,
+    ) -> None:
+        """Emit a variable-length array of fixed-size elements."""
+
+        lines = fb.lines
+        fmt = element[0]
+        size = self.layout_size(element)
+        size_expr = "_n" if size == 1 else f"_n * {size}"
+        fb.check_size("Array", size_expr)
+        data = f"buf[offset : offset + {size_expr}]"
+        if self.is_view(field):
+            lines.append(f"{var} = {self.view_expr(field.type, 'offset', '_n')}")
+        elif field.isComplex:
+            iterate = self.struct_method("<" + fmt, "iter_unpack")
+            expr = self.fixed_message_expr(self.lookup(field.type), "_e", 0)
+            lines.append(f"{var} = [{expr} for _e in {iterate}({data})]")
+        elif field.type in BYTE_TYPES:
+            lines.append(f"{var} = bytes({data})")
+        elif field.type in TIME_TYPES:
+            lines.append(
+                f'{var} = _times(_unpack_from("<%d{fmt[0]}" % (_n * 2), buf, offset))'
+            )
+        elif LITTLE_ENDIAN_HOST:
+            lines.append(f'{var} = {data}.cast("{fmt}").tolist()')
+        else:
+            lines.append(f'{var} = list(_unpack_from("<%d{fmt}" % _n, buf, offset))')
+        lines.append(f"offset += {size_expr}")
@@ -0,0 +1,880 @@
+"""Convert serialized messages between ROS 1 and ROS 2 without decoding them.
+
+A transcoder is compiled for a ROS 1 definition and the matching ROS 2
+definition, which are paired field by field. The generated function walks the
+source buffer and appends the target encoding to a ``bytearray``. Runs of
+fixed-size fields go through one ``struct`` call, or are copied as a slice if
+both encodings have the same bytes. Primitive arrays and arrays of messages
+that need no padding are copied as a whole.
+
+``time`` and ``duration`` keep their bits, so a ROS 1 ``time`` maps to the
+signed ``sec`` of ``builtin_interfaces/Time``. Fields that exist on one side
+only are listed in :attr:`MessageTranscoder.mismatches` when the transcoder is
+compiled. They are dropped, or written with their default value.
+"""
+
+from __future__ import annotations
+
+import re
+import struct
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from python_ros.message_definition import MessageDefinition, MessageDefinitionField
+
+from .cdr import (
+    CDR_BE,
+    CDR_LE,
+    _bound_error,
+    _fingerprints,
+    _rooted,
+    cdr_alignment,
+    cdr_format,
+)
+from .codegen import CodeGenerator, CompiledCache, FunctionBuilder, compact_format
+from .primitives import (
+    BYTE_TYPES,
+    PRIMITIVE_FORMATS,
+    TIME_TYPES,
+    as_byte_view,
+    length_error,
+)
+
+TranscodeFunction = Callable[[memoryview, int, bytearray], int]
+
+_INTEGER_TYPES = frozenset(
+    {"int8", "uint8", "byte", "char", "int16", "uint16", "int32", "uint32"}
+    | {"int64", "uint64"}
+)
+
+_LEADING_SKIP = re.compile(r"(\d*)x")
+
+_ZEROS = tuple(bytes(n) for n in range(8))
+_U32 = struct.Struct("<I")
+
+
+class CompiledTranscoder(NamedTuple):
+    """A compiled transcoding function, the field mismatches and the source."""
+
+    transcode: TranscodeFunction
+    mismatches: Tuple[str, ...]
+    source: str
+
+
+class MessageTranscoder:
+    """Convert messages between a ROS 1 definition and its ROS 2 counterpart.
+
+    Fields are paired by name and must have compatible types; integers of the
+    same size are copied bit for bit. *mismatches* lists the fields that exist
+    in one definition only. With *strict* set they raise ``ValueError``.
+    ROS 2 output is little-endian CDR; both byte orders are read.
+    """
+
+    def __init__(
+        self,
+        ros1_definitions: List[MessageDefinition],
+        ros2_definitions: List[MessageDefinition],
+        strict: bool = False,
+    ) -> None:
+        self._ros1 = ros1_definitions
+        self._ros2 = ros2_definitions
+        self._to_ros2 = compile_transcoder(ros1_definitions, ros2_definitions, True)
+        self._to_ros1: Dict[bool, CompiledTranscoder] = {}
+        self.mismatches = self._to_ros2.mismatches
+        if strict and self.mismatches:
+            raise ValueError("Definitions do not match: " + "; ".join(self.mismatches))
+
+    def to_ros2(self, buffer: Any) -> bytearray:
+        """Convert a serialized ROS 1 message to CDR."""
+
+        out = bytearray((0, CDR_LE, 0, 0))
+        try:
+            self._to_ros2.transcode(as_byte_view(buffer), 0, out)
+        except struct.error as exc:
+            raise ValueError(f"Buffer too short to read message: {exc}") from exc
+        return out
+
+    def to_ros1(self, buffer: Any) -> bytearray:
+        """Convert a CDR-serialized ROS 2 message to ROS 1."""
+
+        view = as_byte_view(buffer)
+        if len(view) < 4:
+            raise ValueError(
+                f"Buffer too short for the CDR encapsulation header: {len(view)} bytes"
+            )
+        kind = view[1]
+        if kind not in (CDR_BE, CDR_LE):
+            raise ValueError(f"Unsupported CDR encapsulation kind {kind:#04x}")
+        out = bytearray()
+        try:
+            self._transcoder(False, kind == CDR_LE).transcode(view[4:], 0, out)
+        except struct.error as exc:
+            raise ValueError(f"Buffer too short to read message: {exc}") from exc
+        return out
+
+    def source(self, to_ros2: bool = True, little_endian: bool = True) -> str:
+        return self._transcoder(to_ros2, little_endian).source
+
+    def _transcoder(self, to_ros2: bool, little_endian: bool) -> CompiledTranscoder:
+        if to_ros2:
+            return self._to_ros2
+        compiled = self._to_ros1.get(little_endian)
+        if compiled is None:
+            compiled = compile_transcoder(self._ros1, self._ros2, False, little_endian)
+            self._to_ros1[little_endian] = compiled
+        return compiled
+
+
+_compiled_transcoders: CompiledCache[CompiledTranscoder] = CompiledCache()
+
+
+def compile_transcoder(
+    ros1_definitions: List[MessageDefinition],
+    ros2_definitions: List[MessageDefinition],
+    to_ros2: bool,
+    little_endian: bool = True,
+) -> CompiledTranscoder:
+    """Return the transcoder for a pair of definitions, compiling it once.
+
+    *little_endian* is the byte order of the CDR input when converting to ROS 1.
+    The compiled function converts the message behind the encapsulation header
+    and appends the result, without a header, to its output.
+    """
+
+    ros2_definitions = _rooted(ros2_definitions)
+    little_endian = little_endian or to_ros2
+    return _compiled_transcoders.get(
+        ros1_definitions,
+        lambda: _TranscoderCompiler(
+            ros1_definitions, ros2_definitions, to_ros2, little_endian
+        ).compile(),
+        to_ros2,
+        little_endian,
+        # The cache keys on the ROS1 definitions; the ROS2 side is an option
+        _fingerprints(ros2_definitions),
+    )
+
+
+def clear_transcoder_cache() -> None:
+    _compiled_transcoders.clear()
+
+
+def _read_strings(
+    buf: memoryview,
+    offset: int,
+    out: Optional[bytearray],
+    count: int,
+    source_cdr: bool,
+    target_cdr: bool,
+    unpack_u32: Any,
+    bound: Optional[int],
+    name: str,
+) -> int:
+    """Convert or, without *out*, skip *count* strings."""
+
+    end = len(buf)
+    pack_u32 = _U32.pack
+    for _ in range(count):
+        if source_cdr:
+            offset += -offset & 3
+        (size,) = unpack_u32(buf, offset)
+        offset += 4
+        if size > end - offset:
+            raise length_error("String", size, end - offset)
+        if out is not None:
+            length = size - 1 if source_cdr and size else size
+            if target_cdr:
+                if bound is not None and length > bound:
+                    raise _bound_error(name, length, bound)
+                out += _ZEROS[(4 - len(out)) & 3]
+                out += pack_u32(length + 1)
+                out += buf[offset : offset + length]
+                out.append(0)
+            else:
+                out += pack_u32(length)
+                out += buf[offset : offset + length]
+        offset += size
+    return offset
+
+
+def _write_strings(out: bytearray, strings: List[str], target_cdr: bool) -> None:
+    for text in strings:
+        data = text.encode()
+        if target_cdr:
+            out += _ZEROS[(4 - len(out)) & 3]
+            out += _U32.pack(len(data) + 1) + data + b"\0"
+        else:
+            out += _U32.pack(len(data)) + data
+
+
+class _Cursor:
+    """Alignment bookkeeping of one side of a transcoder.
+
+    ``residue`` is the position plus the size of the pending run modulo
+    ``modulus``. ROS 1 data is never padded.
+    """
+
+    def __init__(self, cdr: bool, aligned: bool, is_source: bool) -> None:
+        self.cdr = cdr
+        self.is_source = is_source
+        self.modulus = 8 if aligned else 1
+        self.residue = 0
+        self.formats: List[str] = []
+        self.size = 0
+
+    def queue(self, fmt: str, size: int) -> None:
+        self.formats.append(fmt)
+        self.size += size
+        self.advance(size)
+
+    def advance(self, size: int) -> None:
+        self.residue = (self.residue + size) % self.modulus
+
+    def assume(self, alignment: int) -> None:
+        self.modulus = alignment
+        self.residue = 0
+
+    def padding(self, alignment: int) -> Optional[int]:
+        """Padding before an item of *alignment*, ``None`` if unknown until run time."""
+
+        if not self.cdr:
+            return 0
+        if alignment <= self.modulus:
+            return -self.residue % alignment
+        return None
+
+    def take(self) -> Tuple[str, int]:
+        fmt, size = compact_format("".join(self.formats)), self.size
+        self.formats = []
+        self.size = 0
+        return fmt, size
+
+
+class _TranscodeBuilder(FunctionBuilder):
+    """Collects a transcoding function.
+
+    The pending run has a source format whose values are unpacked into a tuple
+    and a target format packed from ``args``.
+    """
+
+    generator: _TranscoderCompiler
+
+    def __init__(self, generator: _TranscoderCompiler, aligned: bool) -> None:
+        super().__init__(generator)
+        self.source = _Cursor(generator.source_cdr, aligned, True)
+        self.target = _Cursor(generator.target_cdr, aligned, False)
+        self.args: List[str] = []
+        self._run_var: Optional[str] = None
+        self._run_count = 0
+
+    def read(self, fmt: str, count: int, size: int) -> List[str]:
+        """Queue a source item; returns expressions for its values."""
+
+        if count and self._run_var is None:
+            self._run_var = self.variable("_t")
+        index = self._run_count
+        self._run_count += count
+        self.source.queue(fmt, size)
+        return [f"{self._run_var}[{i}]" for i in range(index, index + count)]
+
+    def write(self, fmt: str, size: int, args: List[str]) -> None:
+        self.args.extend(args)
+        self.target.queue(fmt, size)
+
+    def align(self, source: Optional[int], target: Optional[int]) -> None:
+        """Pad both sides for items of the given alignments; ``None`` skips a side."""
+
+        sides = [
+            (cursor, alignment)
+            for cursor, alignment in ((self.source, source), (self.target, target))
+            if alignment is not None
+        ]
+        runtime = [(c, a) for c, a in sides if c.padding(a) is None]
+        if runtime:
+            self.flush()
+            for cursor, alignment in runtime:
+                self.lines.append(self.runtime_alignment(cursor, alignment))
+                cursor.assume(alignment)
+        for cursor, alignment in sides:
+            padding = cursor.padding(alignment)
+            if padding:
+                cursor.queue(f"{padding}x", padding)
+
+    def align_elements(
+        self,
+        count: str,
+        source: Optional[int],
+        target: Optional[int],
+        guarded: bool,
+    ) -> None:
+        """Align both sides for array elements; empty sequences are not padded."""
+
+        self.flush()
+        lines = []
+        for cursor, alignment in ((self.source, source), (self.target, target)):
+            if alignment is None:
+                continue
+            padding = cursor.padding(alignment)
+            if padding is None:
+                lines.append(self.runtime_alignment(cursor, alignment))
+            elif padding and cursor.is_source:
+                lines.append(f"offset += {padding}")
+            elif padding:
+                lines.append(f"out += _zeros[{padding}]")
+        if guarded and lines:
+            self.lines.append(f"if {count}:")
+            self.lines.extend("    " + line for line in lines)
+        else:
+            self.lines.extend(lines)
+
+    def settle(self, cursor: _Cursor, alignment: Optional[int], guarded: bool) -> None:
+        """Update *cursor* after array elements of *alignment* on its side."""
+
+        if alignment is not None:
+            cursor.assume(min(alignment, 4) if guarded else alignment)
+
+    @staticmethod
+    def runtime_alignment(cursor: _Cursor, alignment: int) -> str:
+        # The output starts with the four bytes of the encapsulation header
+        mask = alignment - 1
+        if cursor.is_source:
+            return f"offset += -offset & {mask}"
+        return f"out += _zeros[(4 - len(out)) & {mask}]"
+
+    def flush(self) -> None:
+        source_fmt, source_size = self.source.take()
+        target_fmt, target_size = self.target.take()
+        generator = self.generator
+        lines = self.lines
+        values = [f"{self._run_var}[{i}]" for i in range(self._run_count)]
+        # Bytes dropped from the start of the run, such as a ROS 1 header seq
+        skip = _LEADING_SKIP.match(source_fmt)
+        start = int(skip.group(1) or 1) if skip and source_fmt != target_fmt else 0
+        if (
+            target_fmt
+            and source_fmt[skip.end() if start else 0 :] == target_fmt
+            and self.args == values
+            and generator.source_endian == generator.target_endian
+        ):
+            at = f"offset + {start}" if start else "offset"
+            lines.append(f"out += buf[{at} : offset + {source_size}]")
+        else:
+            if self._run_count:
+                unpack = generator.struct_method(
+                    generator.source_endian + source_fmt, "unpack_from"
+                )
+                lines.append(f"{self._run_var} = {unpack}(buf, offset)")
+            if target_fmt:
+                pack = generator.struct_method(
+                    generator.target_endian + target_fmt, "pack"
+                )
+                args = (
+                    f"*{self._run_var}" if self.args == values else ", ".join(self.args)
+                )
+                lines.append(f"out += {pack}({args})")
+        if source_size:
+            lines.append(f"offset += {source_size}")
+        self.args = []
+        self._run_var = None
+        self._run_count = 0
+
+
+class _TranscoderCompiler(CodeGenerator):
+    def __init__(
+        self,
+        ros1_definitions: List[MessageDefinition],
+        ros2_definitions: List[MessageDefinition],
+        to_ros2: bool,
+        little_endian: bool,
+    ) -> None:
+        source, target = (
+            (ros1_definitions, ros2_definitions)
+            if to_ros2
+            else (ros2_definitions, ros1_definitions)
+        )
+        source_endian = "<" if little_endian else ">"
+        super().__init__(
+            target,
+            {
+                "_u32": struct.Struct(source_endian + "I").unpack_from,
+                "_u32_out": _U32.pack,
+                "_pack": struct.pack,
+                "_unpack_from": struct.unpack_from,
+                "_read_strings": _read_strings,
+                "_write_strings": _write_strings,
+                "_length_error": length_error,
+                "_bound_error": _bound_error,
+                "_zeros": _ZEROS,
+            },
+        )
+        if not source:
+            raise ValueError("Cannot compile a serializer for empty msgDefs")
+        self.source_root = source[0]
+        self._source_types = {d.name: d for d in source if d.name is not None}
+        self.to_ros2 = to_ros2
+        self.source_cdr = not to_ros2
+        self.target_cdr = to_ros2
+        self.source_endian = source_endian
+        self.target_endian = "<"
+        self.mismatches: List[str] = []
+        self._constants: Dict[str, str] = {}
+
+    def compile(self) -> CompiledTranscoder:
+        entry = self._function(self.source_root, self.root, aligned=True)
+        source = self.execute("<rosmsg_serialization transcoder>")
+        return CompiledTranscoder(self.namespace[entry], tuple(self.mismatches), source)
+
+    def source_lookup(self, type_name: str) -> MessageDefinition:
+        msg_def = self._source_types.get(type_name)
+        if msg_def is None:
+            raise ValueError(f'Missing definition for submessage type "{type_name}"')
+        return msg_def
+
+    def constant(self, value: Any) -> str:
+        key = repr((type(value), value))
+        name = self._constants.get(key)
+        if name is None:
+            name = f"_d{len(self._constants)}"
+            self.namespace[name] = value
+            self._constants[key] = name
+        return name
+
+    # -- field types ----------------------------------------------------------------
+
+    def side(self, source: bool) -> str:
+        return "ROS 1" if source == self.to_ros2 else "ROS 2"
+
+    def element_format(self, field: MessageDefinitionField, source: bool) -> str:
+        """``struct`` format of one element; times keep their bits either way."""
+
+        if field.type in TIME_TYPES:
+            return "iI"
+        cdr = self.source_cdr if source else self.target_cdr
+        if not cdr:
+            fmt = PRIMITIVE_FORMATS.get(field.type)
+            if fmt is None:
+                raise ValueError(f"Unsupported type '{field.type}'")
+            return fmt
+        return cdr_format(field.type)
+
+    def _check_pair(
+        self,
+        source: MessageDefinitionField,
+        target: MessageDefinitionField,
+        path: str,
+    ) -> None:
+        same_shape = (
+            source.isArray == target.isArray
+            and source.arrayLength == target.arrayLength
+            and source.isComplex == target.isComplex
+        )
+        if same_shape and not source.isComplex and source.type != target.type:
+            same_shape = (
+                source.type in _INTEGER_TYPES
+                and target.type in _INTEGER_TYPES
+                and struct.calcsize(self.element_format(source, True))
+                == struct.calcsize(self.element_format(target, False))
+            )
+        if not same_shape:
+            ros1, ros2 = (source, target) if self.to_ros2 else (target, source)
+            raise ValueError(
+                f"Cannot transcode '{path}': {_describe(ros1)} in ROS 1 but "
+                f"{_describe(ros2)} in ROS 2"
+            )
+
+    def default(self, field: MessageDefinitionField) -> Any:
+        """Value written for a target field that the source lacks."""
+
+        value = field.defaultValue
+        if value is not None:
+            return bytes(value) if field.isArray and field.type in BYTE_TYPES else value
+        if field.isArray and field.arrayLength is None:
+            return b"" if field.type in BYTE_TYPES else []
+        if field.type in TIME_TYPES:
+            element: Any = (0, 0)
+        elif field.type == "string":
+            element = ""
+        elif field.type == "bool":
+            element = False
+        elif field.type in ("float32", "float64"):
+            element = 0.0
+        else:
+            element = 0
+        if not field.isArray:
+            return element
+        length = field.arrayLength or 0
+        return bytes(length) if field.type in BYTE_TYPES else [element] * length
+
+    def _flat_format(
+        self, source: MessageDefinition, target: MessageDefinition
+    ) -> Optional[str]:
+        """Format of a fixed-size message pair encoded with the same bytes on both
+        sides and without padding, else ``None``."""
+
+        source_fields = _data_fields(source)
+        target_fields = _data_fields(target)
+        if not source_fields or len(source_fields) != len(target_fields):
+            return None
+        parts = []
+        for s, t in zip(source_fields, target_fields):
+            if s.name != t.name or s.type == "string" or t.type == "string":
+                return None
+            if s.isArray and s.arrayLength is None:
+                return None
+            if s.isComplex and t.isComplex:
+                if s.isArray:
+                    return None
+                nested = self._flat_format(
+                    self.source_lookup(s.type), self.lookup(t.type)
+                )
+                if nested is None:
+                    return None
+                parts.append(nested)
+                continue
+            if s.isComplex or t.isComplex or s.arrayLength != t.arrayLength:
+                return None
+            fmt = self.element_format(s, True)
+            if fmt != self.element_format(t, False):
+                return None
+            parts.append(fmt * (s.arrayLength or 1))
+        fmt = compact_format("".join(parts))
+        alignments = {
+            1 if code == "s" else struct.calcsize(code)
+            for code in fmt.lstrip("0123456789")
+            if not code.isdigit()
+        }
+        return fmt if len(alignments) == 1 else None
+
+    # -- generated functions --------------------------------------------------------
+
+    def _function(
+        self,
+        source: Optional[MessageDefinition],
+        target: Optional[MessageDefinition],
+        aligned: bool = False,
+    ) -> str:
+        """Function converting, skipping or defaulting one message.
+
+        Functions are named after the target type; a target type is assumed to
+        pair with one source type only.
+        """
+
+        if target is None:
+            assert source is not None
+            name, new = self.function_name("skip", source)
+        else:
+            kind = "transcode" if source is not None else "default"
+            name, new = self.function_name(kind, target)
+        if new:
+            fb = _TranscodeBuilder(self, aligned)
+            fb.lines.append("_end = len(buf)")
+            self._emit_message(fb, source, target, "")
+            self.sources.append(fb.function(f"{name}(buf, offset, out)", "offset"))
+        return name
+
+    def _emit_message(
+        self,
+        fb: _TranscodeBuilder,
+        source: Optional[MessageDefinition],
+        target: Optional[MessageDefinition],
+        prefix: str,
+    ) -> None:
+        source_fields = _data_fields(source) if source is not None else []
+        target_fields = _data_fields(target) if target is not None else []
+        # ROS 2 gives empty messages a uint8 placeholder member
+        if source is not None and self.source_cdr and not source_fields:
+            fb.read("x", 0, 1)
+        if target is not None and self.target_cdr and not target_fields:
+            fb.write("x", 1, [])
+
+        source_names = {f.name for f in source_fields}
+        target_names = {f.name for f in target_fields}
+        report = source is not None and target is not None
+        i = j = 0
+        while i < len(source_fields) or j < len(target_fields):
+            if j < len(target_fields) and target_fields[j].name not in source_names:
+                field = target_fields[j]
+                if report:
+                    self.mismatches.append(
+                        f"{prefix}{field.name}: only in {self.side(False)}"
+                    )
+                self._emit_field(fb, None, field, prefix + field.name)
+                j += 1
+            elif i < len(source_fields) and source_fields[i].name not in target_names:
+                field = source_fields[i]
+                if report:
+                    self.mismatches.append(
+                        f"{prefix}{field.name}: only in {self.side(True)}"
+                    )
+                self._emit_field(fb, field, None, prefix + field.name)
+                i += 1
+            else:
+                s, t = source_fields[i], target_fields[j]
+                if s.name != t.name:
+                    raise ValueError(
+                        f"Cannot transcode '{prefix}{t.name}': fields are in a "
+                        "different order"
+                    )
+                self._check_pair(s, t, prefix + t.name)
+                self._emit_field(fb, s, t, prefix + t.name)
+                i += 1
+                j += 1
+
+    def _emit_field(
+        self,
+        fb: _TranscodeBuilder,
+        source: Optional[MessageDefinitionField],
+        target: Optional[MessageDefinitionField],
+        path: str,
+    ) -> None:
+        field = target or source
+        assert field is not None
+        if field.arrayLength == 0:
+            # Zero-length arrays take no space and no padding on either side
+            return
+        if field.isComplex and not field.isArray:
+            self._emit_message(
+                fb,
+                source and self.source_lookup(source.type),
+                target and self.lookup(target.type),
+                path + ".",
+            )
+        elif field.type == "string" and not field.isArray:
+            self._emit_string(fb, source, target)
+        elif not field.isArray:
+            self._emit_fixed(fb, source, target, None)
+        elif field.arrayLength is not None and not (
+            field.isComplex or field.type == "string"
+        ):
+            self._emit_fixed(fb, source, target, field.arrayLength)
+        else:
+            self._emit_array(fb, source, target)
+
+    def _emit_fixed(
+        self,
+        fb: _TranscodeBuilder,
+        source: Optional[MessageDefinitionField],
+        target: Optional[MessageDefinitionField],
+        length: Optional[int],
+    ) -> None:
+        """Emit a fixed-size primitive or an array of *length* of them."""
+
+        element = (
+            self.element_format(source, True)
+            if source is not None
+            else self.element_format(target, False)  # type: ignore[arg-type]
+        )
+        field = source or target
+        assert field is not None
+        alignment = cdr_alignment(field.type)
+        size = struct.calcsize("<" + element) * (length or 1)
+        if length is None:
+            fmt, count = element, len(element)
+        elif size == length:
+            fmt, count = f"{length}s", 1
+        else:
+            fmt, count = compact_format(element * length), len(element) * length
+        fb.align(source and alignment, target and alignment)
+        if source is not None:
+            values = fb.read(
+                fmt if target else f"{size}x", count if target else 0, size
+            )
+        if target is None:
+            return
+        if source is None:
+            value = self.default(target)
+            if length is not None and target.type in TIME_TYPES:
+                value = [part for time in value for part in time]
+            name = self.constant(value)
+            values = [f"*{name}"] if count > 1 else [name]
+        fb.write(fmt, size, values)
+
+    def _emit_string(
+        self,
+        fb: _TranscodeBuilder,
+        source: Optional[MessageDefinitionField],
+        target: Optional[MessageDefinitionField],
+    ) -> None:
+        fb.align(source and 4, target and 4)
+        fb.flush()
+        lines = fb.lines
+        if source is None:
+            assert target is not None
+            data = self.default(target).encode()
+            if self.target_cdr:
+                encoded = _U32.pack(len(data) + 1) + data + b"\0"
+            else:
+                encoded = _U32.pack(len(data)) + data
+            lines.append(f"out += {self.constant(encoded)}")
+            fb.target.assume(1)
+            return
+
+        lines.append("(_n,) = _u32(buf, offset)")
+        lines.append("offset += 4")
+        lines.append("if _n > _end - offset:")
+        lines.append("    raise _length_error('String', _n, _end - offset)")
+        if target is not None:
+            # CDR lengths count the NUL terminator
+            length = "_k" if self.source_cdr else "_n"
+            if self.source_cdr:
+                lines.append("_k = _n - 1 if _n else 0")
+            if self.target_cdr:
+                if target.upperBound is not None:
+                    lines.append(f"if {length} > {target.upperBound}:")
+                    lines.append(
+                        f"    raise _bound_error({target.name!r}, {length}, "
+                        f"{target.upperBound})"
+                    )
+                lines.append(f"out += _u32_out({length} + 1)")
+                lines.append(f"out += buf[offset : offset + {length}]")
+                lines.append("out.append(0)")
+            else:
+                lines.append(f"out += _u32_out({length})")
+                lines.append(f"out += buf[offset : offset + {length}]")
+            fb.target.assume(1)
+        lines.append("offset += _n")
+        fb.source.assume(1)
+
+    def _emit_array(
+        self,
+        fb: _TranscodeBuilder,
+        source: Optional[MessageDefinitionField],
+        target: Optional[MessageDefinitionField],
+    ) -> None:
+        field = source or target
+        assert field is not None
+        lines = fb.lines
+        length = field.arrayLength
+        guarded = length is None
+        default = self.default(target) if source is None and target else None
+
+        if length is None:
+            fb.align(source and 4, target and 4)
+            fb.flush()
+            if source is not None:
+                count = fb.variable("_c")
+                lines.append(f"({count},) = _u32(buf, offset)")
+                lines.append("offset += 4")
+                fb.source.advance(4)
+            else:
+                count = str(len(default))
+                guarded = False
+            if target is not None:
+                bound = target.arrayUpperBound
+                if self.target_cdr and bound is not None and source is not None:
+                    lines.append(f"if {count} > {bound}:")
+                    lines.append(
+                        f"    raise _bound_error({target.name!r}, {count}, {bound})"
+                    )
+                lines.append(f"out += _u32_out({count})")
+                fb.target.advance(4)
+        else:
+            fb.flush()
+            count = str(length)
+
+        if field.type == "string":
+            if source is None:
+                lines.append(
+                    f"_write_strings(out, {self.constant(default)}, {self.target_cdr})"
+                )
+            else:
+                bound = target.upperBound if target is not None else None
+                out = "out" if target is not None else "None"
+                lines.append(
+                    f"offset = _read_strings(buf, offset, {out}, {count}, "
+                    f"{self.source_cdr}, {self.target_cdr}, _u32, {bound!r}, "
+                    f"{field.name!r})"
+                )
+            fb.source.assume(1)
+            fb.target.assume(1)
+            return
+
+        if not field.isComplex:
+            element = self.element_format(field, source is not None)
+            alignment = cdr_alignment(field.type)
+            size = struct.calcsize("<" + element)
+            if source is None:
+                self._emit_default_elements(fb, element, alignment, default)
+                return
+            self._emit_copy(
+                fb, source, target, count, element, size, alignment, guarded
+            )
+            return
+
+        flat = None
+        if source is not None and target is not None:
+            flat = self._flat_format(
+                self.source_lookup(source.type), self.lookup(target.type)
+            )
+        if flat is not None and self.source_endian == self.target_endian:
+            code = flat.lstrip("0123456789")[0]
+            alignment = 1 if code == "s" else struct.calcsize(code)
+            size = struct.calcsize("<" + flat)
+            self._emit_copy(fb, source, target, count, flat, size, alignment, guarded)
+            return
+
+        fb.flush()
+        if count == "0":
+            return
+        function = self._function(
+            source and self.source_lookup(source.type),
+            target and self.lookup(target.type),
+        )
+        lines.append(f"for _ in range({count}):")
+        lines.append(f"    offset = {function}(buf, offset, out)")
+        fb.source.assume(1)
+        fb.target.assume(1)
+
+    def _emit_copy(
+        self,
+        fb: _TranscodeBuilder,
+        source: Optional[MessageDefinitionField],
+        target: Optional[MessageDefinitionField],
+        count: str,
+        element: str,
+        size: int,
+        alignment: int,
+        guarded: bool,
+    ) -> None:
+        """Copy or skip the elements of an array with a fixed element size."""
+
+        lines = fb.lines
+        target_alignment = alignment if target is not None else None
+        fb.align_elements(count, alignment, target_alignment, guarded)
+        total = count if size == 1 else f"{count} * {size}"
+        lines.append(f"if {total} > _end - offset:")
+        lines.append(f"    raise _length_error('Array', {total}, _end - offset)")
+        if target is not None:
+            if self.source_endian == self.target_endian:
+                lines.append(f"out += buf[offset : offset + {total}]")
+            else:
+                fmt = f"{element!r} * {count}"
+                lines.append(
+                    f"out += _pack({self.target_endian!r} + {fmt}, "
+                    f"*_unpack_from({self.source_endian!r} + {fmt}, buf, offset))"
+                )
+        lines.append(f"offset += {total}")
+        fb.settle(fb.source, alignment, guarded)
+        fb.settle(fb.target, target_alignment, guarded)
+
+    def _emit_default_elements(
+        self, fb: _TranscodeBuilder, element: str, alignment: int, values: Any
+    ) -> None:
+        if not len(values):
+            return
+        fb.align_elements("", None, alignment, False)
+        if isinstance(values, bytes):
+            data = values
+        else:
+            data = struct.pack(self.target_endian + element * len(values), *values)
+        fb.lines.append(f"out += {self.constant(data)}")
+        fb.target.assume(alignment)
+
+
+def _data_fields(msg_def: MessageDefinition) -> List[MessageDefinitionField]:
+    return [f for f in msg_def.definitions if not f.isConstant]
+
+
+def _describe(field: MessageDefinitionField) -> str:
+    if not field.isArray:
+        return field.type
+    return f"{field.type}[{field.arrayLength or ''}]"
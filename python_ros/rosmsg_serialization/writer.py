@@ -0,0 +1,410 @@
+"""Compile specialized ROS 1 message encoders from message definitions.
+
+Serialization runs in two phases. A generated size function first computes the
+exact serialized size of a message. A generated write function then fills a
+preallocated buffer in place with ``struct.Struct.pack_into``, merging runs of
+adjacent fixed-size fields into a single call. Bytes are never concatenated.
+"""
+
+from __future__ import annotations
+
+import struct
+from itertools import accumulate
+from typing import Any, Callable, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from python_ros.message_definition import MessageDefinition, MessageDefinitionField
+
+from .codegen import (
+    CodeGenerator,
+    CompiledCache,
+    RunFunctionBuilder,
+    attribute_access,
+    field_access,
+    sanitize_name,
+)
+from .layout import LayoutAnalyzer
+from .primitives import BYTE_TYPES, TIME_TYPES, UINT32
+
+SizeFunction = Callable[[Any], int]
+WriteFunction = Callable[[Any, int, Any], int]
+
+
+class CompiledWriter(NamedTuple):
+    """Compiled size and write functions with the source they came from."""
+
+    size: SizeFunction
+    write: WriteFunction
+    source: str
+
+
+class SerializedBatch(NamedTuple):
+    """Messages serialized back to back into one buffer.
+
+    ``offsets`` holds one entry more than there are messages: message ``i``
+    occupies ``buffer[offsets[i]:offsets[i + 1]]``.
+    """
+
+    buffer: bytearray
+    offsets: List[int]
+
+    def message(self, index: int) -> memoryview:
+        return memoryview(self.buffer)[self.offsets[index] : self.offsets[index + 1]]
+
+
+class MessageWriter:
+    """Serialize messages shaped like the output of :class:`MessageReader`.
+
+    Messages are mappings from field name to value. ``time`` and ``duration``
+    values need ``sec`` and ``nsec`` attributes, ``uint8``/``char`` arrays may
+    be any bytes-like object and other arrays any sized iterable. Variable-length
+    arrays of fixed-size messages may also be NumPy structured arrays with the
+    dtype of :mod:`.layout`; their bytes are copied as a whole.
+
+    With *message_classes* set, messages and nested messages are instead read
+    through attributes, as on the classes of :mod:`.classes`.
+    """
+
+    def __init__(
+        self, definitions: List[MessageDefinition], message_classes: bool = False
+    ) -> None:
+        self._compiled = compile_writer(definitions, message_classes)
+
+    def calculate_byte_size(self, message: Any) -> int:
+        try:
+            return self._compiled.size(message)
+        except (KeyError, TypeError, AttributeError) as exc:
+            raise _serialize_error(exc) from exc
+
+    def write_message(self, message: Any, output: Optional[Any] = None) -> Any:
+        """Serialize *message* into *output*, or into a new ``bytearray``."""
+
+        size = self.calculate_byte_size(message)
+        if output is None:
+            output = bytearray(size)
+        elif len(output) < size:
+            raise ValueError(
+                f"Output buffer too small: need {size} bytes, got {len(output)}"
+            )
+        self._write(output, 0, message, size)
+        return output
+
+    def write_messages(self, messages: Iterable[Any]) -> SerializedBatch:
+        """Serialize *messages* into one contiguous buffer with an offset table."""
+
+        messages = list(messages)
+        size = self._compiled.size
+        try:
+            offsets = [0, *accumulate(size(message) for message in messages)]
+        except (KeyError, TypeError, AttributeError) as exc:
+            raise _serialize_error(exc) from exc
+        buffer = bytearray(offsets[-1])
+        for message, start, end in zip(messages, offsets, offsets[1:]):
+            self._write(buffer, start, message, end)
+        return SerializedBatch(buffer, offsets)
+
+    def source(self) -> str:
+        return self._compiled.source
+
+    def _write(self, output: Any, start: int, message: Any, end: int) -> None:
+        try:
+            written = self._compiled.write(output, start, message)
+        except (KeyError, TypeError, AttributeError, struct.error) as exc:
+            raise _serialize_error(exc) from exc
+        if written != end:
+            raise ValueError(
+                f"Message size changed during serialization: expected {end - start} "
+                f"bytes, wrote {written - start}"
+            )
+
+
+_compiled_writers: CompiledCache[CompiledWriter] = CompiledCache()
+
+
+def compile_writer(
+    definitions: List[MessageDefinition], message_classes: bool = False
+) -> CompiledWriter:
+    """Return the encoder for *definitions*, compiling it once per structure."""
+
+    return _compiled_writers.get(
+        definitions,
+        lambda: _WriterCompiler(definitions, message_classes).compile(),
+        message_classes,
+    )
+
+
+def clear_writer_cache() -> None:
+    _compiled_writers.clear()
+
+
+def _serialize_error(exc: Exception) -> ValueError:
+    if isinstance(exc, KeyError):
+        return ValueError(f"Cannot serialize message: missing field {exc}")
+    return ValueError(f"Cannot serialize message: {exc}")
+
+
+def _utf8_len(text: str) -> int:
+    return len(text) if text.isascii() else len(text.encode("utf-8"))
+
+
+def _strings_size(strings: Iterable[str]) -> int:
+    return sum(4 + _utf8_len(text) for text in strings)
+
+
+def _write_strings(buf: Any, offset: int, strings: Iterable[str]) -> int:
+    pack_u32 = UINT32.pack_into
+    for text in strings:
+        data = text.encode("utf-8")
+        size = len(data)
+        pack_u32(buf, offset, size)
+        offset += 4
+        buf[offset : offset + size] = data
+        offset += size
+    return offset
+
+
+def _time_values(times: Iterable[Any]) -> List[int]:
+    return [value for time in times for value in (time.sec, time.nsec)]
+
+
+def _fixed(values: Sequence[Any], length: int) -> Sequence[Any]:
+    if len(values) != length:
+        raise ValueError(
+            f"Fixed-length array needs {length} elements, got {len(values)}"
+        )
+    return values
+
+
+def _fixed_bytes(values: Any, length: int) -> bytes:
+    return bytes(_fixed(values, length))
+
+
+def _byte_buffer(values: Any) -> Any:
+    """Return *values* in a form a ``bytearray`` slice can be assigned from."""
+
+    if isinstance(values, (bytes, bytearray)):
+        return values
+    try:
+        return memoryview(values).cast("B")
+    except TypeError:
+        return bytes(values)
+
+
+def _record_bytes(values: Any, dtype: Any) -> Optional[bytes]:
+    """Bytes of *values* if it is a NumPy structured array of *dtype*."""
+
+    if getattr(values, "dtype", None) is None or values.dtype != dtype:
+        return None
+    return values.tobytes()
+
+
+class _WriterFunctionBuilder(RunFunctionBuilder):
+    def __init__(self, generator: CodeGenerator) -> None:
+        super().__init__(generator)
+        self._run_values: List[str] = []
+
+    def add_fixed(self, fmt: str, values: List[str]) -> None:
+        self.run_formats.append(fmt)
+        self._run_values.extend(values)
+
+    def emit_run(self, fmt: str) -> None:
+        pack = self.generator.struct_method(fmt, "pack_into")
+        self.lines.append(f"{pack}(buf, offset, {', '.join(self._run_values)})")
+        self._run_values = []
+
+
+class _WriterCompiler(CodeGenerator):
+    def __init__(
+        self, definitions: List[MessageDefinition], message_classes: bool = False
+    ) -> None:
+        super().__init__(
+            definitions,
+            {
+                "_pack_into": struct.pack_into,
+                "_utf8_len": _utf8_len,
+                "_strings_size": _strings_size,
+                "_write_strings": _write_strings,
+                "_time_values": _time_values,
+                "_fixed": _fixed,
+                "_fixed_bytes": _fixed_bytes,
+                "_byte_buffer": _byte_buffer,
+                "_record_bytes": _record_bytes,
+            },
+        )
+        self._analyzer = LayoutAnalyzer(definitions)
+        self.access = attribute_access if message_classes else field_access
+
+    def compile(self) -> CompiledWriter:
+        size = self._size_function(self.root)
+        write = self._write_function(self.root)
+        source = self.execute("<rosmsg_serialization writer>")
+        return CompiledWriter(self.namespace[size], self.namespace[write], source)
+
+    # -- values packed for fixed-size fields --------------------------------------
+
+    def fixed_values(self, field: MessageDefinitionField, expr: str) -> List[str]:
+        if not field.isArray:
+            if field.isComplex:
+                return self.fixed_message_values(self.lookup(field.type), expr)
+            if field.type in TIME_TYPES:
+                return [f"{expr}.sec", f"{expr}.nsec"]
+            return [expr]
+        length = field.arrayLength
+        checked = f"_fixed({expr}, {length})"
+        if field.type in BYTE_TYPES:
+            return [f"_fixed_bytes({expr}, {length})"]
+        if field.isComplex:
+            values = self.fixed_message_values(self.lookup(field.type), "_e")
+            if not values:
+                # Elements of a message without data fields pack nothing
+                return []
+            return [f"*[_v for _e in {checked} for _v in ({', '.join(values)},)]"]
+        if field.type in TIME_TYPES:
+            return [f"*_time_values({checked})"]
+        return [f"*{checked}"]
+
+    def fixed_message_values(self, msg_def: MessageDefinition, expr: str) -> List[str]:
+        values: List[str] = []
+        for field in msg_def.definitions:
+            if not field.isConstant:
+                values.extend(self.fixed_values(field, self.access(expr, field)))
+        return values
+
+    # -- size functions -----------------------------------------------------------
+
+    def _size_function(self, msg_def: MessageDefinition) -> str:
+        name, new = self.function_name("size", msg_def)
+        if new:
+            fixed, terms = self._size_terms(msg_def, "m")
+            expr = " + ".join([str(fixed), *terms])
+            self.sources.append(f"def {name}(m):\n    return {expr}")
+        return name
+
+    def _size_terms(
+        self, msg_def: MessageDefinition, base: str
+    ) -> Tuple[int, List[str]]:
+        """Split the size of a message into a constant and variable terms."""
+
+        fixed = 0
+        terms: List[str] = []
+        for field in msg_def.definitions:
+            if field.isConstant:
+                continue
+            layout = self.field_layout(field)
+            if layout is not None:
+                fixed += self.layout_size(layout)
+                continue
+            expr = self.access(base, field)
+            if not field.isArray:
+                if field.isComplex:
+                    sub_fixed, sub_terms = self._size_terms(
+                        self.lookup(field.type), expr
+                    )
+                    fixed += sub_fixed
+                    terms.extend(sub_terms)
+                else:
+                    fixed += 4
+                    terms.append(f"_utf8_len({expr})")
+                continue
+            if field.arrayLength is None:
+                fixed += 4
+            element = self.type_layout(field)
+            if element is None and not field.isComplex:
+                terms.append(f"_strings_size({expr})")
+            elif element is None:
+                size = self._size_function(self.lookup(field.type))
+                terms.append(f"sum(map({size}, {expr}))")
+            elif self.layout_size(element) > 0:
+                size = self.layout_size(element)
+                terms.append(f"len({expr})" if size == 1 else f"len({expr}) * {size}")
+        return fixed, terms
+
+    # -- write functions ----------------------------------------------------------
+
+    def _write_function(self, msg_def: MessageDefinition) -> str:
+        name, new = self.function_name("write", msg_def)
+        if new:
+            fb = _WriterFunctionBuilder(self)
+            self._emit_message(fb, msg_def, "m")
+            self.sources.append(fb.function(f"{name}(buf, offset, m)", "offset"))
+        return name
+
+    def _emit_message(
+        self, fb: _WriterFunctionBuilder, msg_def: MessageDefinition, base: str
+    ) -> None:
+        for field in msg_def.definitions:
+            if not field.isConstant:
+                self._emit_field(fb, field, self.access(base, field))
+
+    def _emit_field(
+        self, fb: _WriterFunctionBuilder, field: MessageDefinitionField, expr: str
+    ) -> None:
+        lines = fb.lines
+        if field.isComplex and not field.isArray:
+            var = fb.variable()
+            lines.append(f"{var} = {expr}")
+            self._emit_message(fb, self.lookup(field.type), var)
+            return
+        layout = self.field_layout(field)
+        if layout is not None:
+            fb.add_fixed(layout[0], self.fixed_values(field, expr))
+            return
+
+        var = fb.variable()
+        if not field.isArray:
+            # Only strings are variable-size among the builtin scalars
+            lines.append(f'{var} = {expr}.encode("utf-8")')
+            fb.add_fixed("I", [f"len({var})"])
+            fb.flush()
+            lines.append(f"buf[offset : offset + len({var})] = {var}")
+            lines.append(f"offset += len({var})")
+            return
+
+        if field.arrayLength is None:
+            if field.type in BYTE_TYPES:
+                expr = f"_byte_buffer({expr})"
+            lines.append(f"{var} = {expr}")
+            fb.add_fixed("I", [f"len({var})"])
+        else:
+            lines.append(f"{var} = _fixed({expr}, {field.arrayLength})")
+        fb.flush()
+
+        element = self.type_layout(field)
+        if element is None and not field.isComplex:
+            lines.append(f"offset = _write_strings(buf, offset, {var})")
+        elif element is None or self.layout_size(element) == 0:
+            writer = self._write_function(self.lookup(field.type))
+            lines.append(f"for _e in {var}:")
+            lines.append(f"    offset = {writer}(buf, offset, _e)")
+        elif field.type in BYTE_TYPES:
+            lines.append(f"buf[offset : offset + len({var})] = {var}")
+            lines.append(f"offset += len({var})")
+        elif field.isComplex:
+            fmt = "<" + element[0]
+            pack = self.struct_method(fmt, "pack_into")
+            values = self.fixed_message_values(self.lookup(field.type), "_e")
+            loop = [
+                f"for _e in {var}:",
+                f"    {pack}(buf, offset, {', '.join(values)})",
+                f"    offset += {self.layout_size(element)}",
+            ]
+            dtype = self._analyzer.layout(field.type).dtype
+            if dtype is None:
+                lines.extend(loop)
+                return
+            name = f"_dtype_{sanitize_name(field.type)}"
+            self.namespace[name] = dtype
+            lines.append(f"_r = _record_bytes({var}, {name})")
+            lines.append("if _r is not None:")
+            lines.append("    buf[offset : offset + len(_r)] = _r")
+            lines.append("    offset += len(_r)")
+            lines.append("else:")
+            lines.extend("    " + line for line in loop)
+        else:
+            fmt, count = element
+            size = self.layout_size(element)
+            items = f"_time_values({var})" if field.type in TIME_TYPES else var
+            lines.append(
+                f'_pack_into("<%d{fmt[0]}" % (len({var}) * {count}), buf, offset, '
+                f"*{items})"
+            )
+            lines.append(f"offset += len({var}) * {size}")
@@ -0,0 +1,160 @@
+import struct
+import sys
+from array import array
+
+import pytest
+
+from python_ros.rosmsg import parse
+from python_ros.rosmsg_serialization import MessageReader, MessageWriter
+from python_ros.rosmsg_serialization.benchmark import (
+    BENCHMARK_TYPES,
+    MSGDEFS_DIR,
+    load_definitions,
+    synthesize_message,
+)
+from python_ros.rostime import Time
+
+ARRAYS = (
+    "float32[] ranges\nuint8[] data\nbool[2] flags\nint16[3] fixed\ntime[] stamps\n"
+    "Sub[] subs\n===\nMSG: p/Sub\nint8 k\nfloat64[2] xy"
+)
+
+
+def arrays_buffer() -> bytes:
+    return (
+        struct.pack("<I3f", 3, 1.5, 2.5, 3.5)
+        + struct.pack("<I2B", 2, 7, 8)
+        + struct.pack("<2?3h", True, False, -1, 0, 1)
+        + struct.pack("<III", 1, 4, 5)
+        + struct.pack("<Ib2d", 1, 3, 0.5, 0.25)
+    )
+
+
+def test_numpy_views_share_the_source_buffer():
+    np = pytest.importorskip("numpy")
+    source = bytearray(b"\0" + arrays_buffer())
+    reader = MessageReader(parse(ARRAYS), array_views=True)
+    message = reader.read_message(memoryview(source)[1:])
+
+    ranges = message["ranges"]
+    assert ranges.dtype == np.dtype("<f4")
+    assert ranges.tolist() == [1.5, 2.5, 3.5]
+    assert message["data"].dtype == np.uint8
+    assert message["flags"].tolist() == [True, False]
+    assert message["fixed"].dtype == np.dtype("<i2")
+    assert message["fixed"].tolist() == [-1, 0, 1]
+    assert message["stamps"] == [Time(4, 5)]
+    assert message["subs"][0]["k"] == 3
+    assert message["subs"][0]["xy"].tolist() == [0.5, 0.25]
+
+    source[1 + 4 : 1 + 8] = struct.pack("<f", 9.0)
+    assert ranges[0] == 9.0
+
+
+def test_numpy_copies_own_their_data():
+    pytest.importorskip("numpy")
+    source = bytearray(arrays_buffer())
+    reader = MessageReader(parse(ARRAYS), array_views=True, copy_arrays=True)
+    message = reader.read_message(source)
+    assert message["ranges"].flags.owndata
+    source[4:8] = struct.pack("<f", 9.0)
+    assert message["ranges"][0] == 1.5
+    assert message["subs"][0]["xy"].tolist() == [0.5, 0.25]
+
+
+@pytest.mark.skipif(sys.byteorder != "little", reason="views need a little-endian host")
+def test_memoryview_fallback():
+    source = bytearray(arrays_buffer())
+    reader = MessageReader(parse(ARRAYS), array_views=True, use_numpy=False)
+    message = reader.read_message(source)
+    assert isinstance(message["ranges"], memoryview)
+    assert message["ranges"].format == "f"
+    assert message["ranges"].tolist() == [1.5, 2.5, 3.5]
+    assert message["data"].tobytes() == b"\x07\x08"
+    assert message["flags"].tolist() == [True, False]
+    assert message["fixed"].tolist() == [-1, 0, 1]
+    assert message["subs"][0]["xy"].tolist() == [0.5, 0.25]
+    source[4:8] = struct.pack("<f", 9.0)
+    assert message["ranges"][0] == 9.0
+
+
+def test_array_fallback_copies():
+    source = bytearray(arrays_buffer())
+    reader = MessageReader(
+        parse(ARRAYS), array_views=True, copy_arrays=True, use_numpy=False
+    )
+    message = reader.read_message(source)
+    assert message["ranges"] == array("f", [1.5, 2.5, 3.5])
+    assert message["flags"] == array("B", [1, 0])
+    assert message["fixed"] == array("h", [-1, 0, 1])
+    source[4:8] = struct.pack("<f", 9.0)
+    assert message["ranges"][0] == 1.5
+
+
+def test_rejects_truncated_arrays():
+    reader = MessageReader(parse("float64[] data"), array_views=True, use_numpy=False)
+    with pytest.raises(ValueError, match="Array length error"):
+        reader.read_message(struct.pack("<Id", 2, 1.0))
+
+
+@pytest.mark.skipif(not MSGDEFS_DIR.is_dir(), reason="msgdefs corpus not available")
+@pytest.mark.parametrize("name", BENCHMARK_TYPES)
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_views_match_lists(name, use_numpy):
+    if use_numpy:
+        pytest.importorskip("numpy")
+    definitions = load_definitions(name)
+    data = synthesize_message(definitions, 5, seed=4)
+    expected = MessageReader(definitions).read_message(data)
+    reader = MessageReader(definitions, array_views=True, use_numpy=use_numpy)
+    message = reader.read_message(data)
+    assert _as_lists(message) == expected
+    # views are accepted by the writer
+    assert MessageWriter(definitions).write_message(message) == data
+
+
+def _as_lists(value):
+    if isinstance(value, dict):
+        return {k: _as_lists(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_as_lists(v) for v in value]
+    if hasattr(value, "tolist"):
+        items = value.tolist()
+        # uint8 arrays decode to bytes without views
+        is_bytes = getattr(value, "format", getattr(value, "dtype", None))
+        if str(is_bytes) in ("B", "uint8"):
+            return bytes(items)
+        return items
+    return value
+
+
+POLYGON = (
+    "Point32[] points\nPoint32[2] pair\n"
+    "===\nMSG: geometry_msgs/Point32\nfloat32 x\nfloat32 y\nfloat32 z"
+)
+
+
+def test_structured_arrays():
+    np = pytest.importorskip("numpy")
+    data = struct.pack("<I6f", 2, 1, 2, 3, 4, 5, 6) + struct.pack("<6f", *range(6))
+    reader = MessageReader(parse(POLYGON), array_views=True, structured_arrays=True)
+    message = reader.read_message(data)
+    points = message["points"]
+    assert points.dtype.names == ("x", "y", "z")
+    assert points["y"].tolist() == [2, 5]
+    assert message["pair"]["z"].tolist() == [2, 5]
+    assert not points.flags.owndata
+    assert MessageWriter(parse(POLYGON)).write_message(message) == data
+    assert MessageReader(parse(POLYGON)).read_message(data)["points"][1] == {
+        "x": np.float32(4),
+        "y": 5,
+        "z": 6,
+    }
+
+
+def test_structured_arrays_need_numpy_views():
+    pytest.importorskip("numpy")
+    with pytest.raises(ValueError, match="NumPy array views"):
+        MessageReader(
+            parse(POLYGON), array_views=True, use_numpy=False, structured_arrays=True
+        )
@@ -0,0 +1,52 @@
+import pytest
+
+from python_ros.rosmsg import ParseCache, parse
+
+POINTS = "Point[] points\n===============\nMSG: geometry_msgs/Point\nfloat64 x"
+
+
+def test_returns_same_result_as_parse():
+    cache = ParseCache()
+    assert cache.parse(POINTS) == parse(POINTS)
+    assert cache.parse(POINTS) == parse(POINTS)
+    assert cache.parse("string name", ros2=True) == parse("string name", ros2=True)
+    info = cache.cache_info()
+    assert (info.hits, info.misses, info.currsize) == (1, 2, 2)
+
+
+def test_flags_are_part_of_the_key():
+    cache = ParseCache()
+    fixed = cache.parse(POINTS)
+    raw = cache.parse(POINTS, skip_type_fixup=True)
+    assert fixed[0].definitions[0].type == "geometry_msgs/Point"
+    assert raw[0].definitions[0].type == "Point"
+    assert cache.cache_info().misses == 2
+
+
+def test_results_cannot_corrupt_cache():
+    cache = ParseCache()
+    first = cache.parse("int8[] arr [1, 2]", ros2=True)
+    first[0].definitions[0].name = "changed"
+    first[0].definitions[0].defaultValue.append(3)
+    second = cache.parse("int8[] arr [1, 2]", ros2=True)
+    assert second[0].definitions[0].name == "arr"
+    assert second[0].definitions[0].defaultValue == [1, 2]
+
+
+def test_evicts_least_recently_used():
+    cache = ParseCache(maxsize=2)
+    cache.parse("int8 a")
+    cache.parse("int8 b")
+    cache.parse("int8 a")
+    cache.parse("int8 c")
+    assert cache.cache_info().evictions == 1
+    cache.parse("int8 a")
+    assert cache.cache_info().hits == 2
+    cache.parse("int8 b")
+    assert cache.cache_info().misses == 4
+    assert len(cache) == 2
+
+
+def test_rejects_invalid_size():
+    with pytest.raises(ValueError):
+        ParseCache(maxsize=0)
@@ -0,0 +1,338 @@
+import random
+import sqlite3
+import struct
+from pathlib import Path
+
+import pytest
+
+from python_ros.rosmsg import parse
+from python_ros.rosmsg_serialization import (
+    CdrMessageReader,
+    CdrMessageWriter,
+    message_class,
+)
+from python_ros.rosmsg_serialization.benchmark import MSGDEFS_DIR
+from python_ros.rostime import Time
+
+ROS2_MSGDEFS_DIR = MSGDEFS_DIR.parent / "ros2humble"
+TALKER_BAG = (
+    Path(__file__).resolve().parents[2]
+    / "packages/rosbag2/tests/bags/talker/talker.db3"
+)
+
+LE = b"\x00\x01\x00\x00"
+BE = b"\x00\x00\x00\x00"
+
+
+def cdr_string(text: str, endian: str = "<") -> bytes:
+    data = text.encode() + b"\0"
+    return struct.pack(endian + "I", len(data)) + data
+
+
+CDR_TESTS = [
+    ("int8 sample", {"sample": -128}, b"\x80"),
+    ("uint64 sample", {"sample": 2**64 - 1}, b"\xff" * 8),
+    ("bool flag", {"flag": True}, b"\x01"),
+    ("string name", {"name": "κόσμε"}, cdr_string("κόσμε")),
+    ("string name", {"name": ""}, cdr_string("")),
+    (
+        "uint8 blank\nint32[] arr",
+        {"blank": 0, "arr": [3, 7]},
+        b"\0" * 4 + struct.pack("<I2i", 2, 3, 7),
+    ),
+    (
+        "uint8 blank\nfloat32[2] arr",
+        {"blank": 0, "arr": [5.5, 6.5]},
+        b"\0" * 4 + struct.pack("<2f", 5.5, 6.5),
+    ),
+    (
+        "uint8 blank\nfloat64 x",
+        {"blank": 1, "x": 0.5},
+        b"\x01" + b"\0" * 7 + struct.pack("<d", 0.5),
+    ),
+    (
+        "uint8[] data\nchar[2] pair",
+        {"data": b"ab", "pair": b"cd"},
+        struct.pack("<I", 2) + b"abcd",
+    ),
+    (
+        "builtin_interfaces/Time stamp\nbuiltin_interfaces/Duration[] spans",
+        {"stamp": {"sec": -1, "nanosec": 2}, "spans": [{"sec": 3, "nanosec": 4}]},
+        struct.pack("<iIIiI", -1, 2, 1, 3, 4),
+    ),
+    (
+        "string[] names\nint16 value",
+        {"names": ["a", "bc"], "value": 9},
+        struct.pack("<I", 2)
+        + cdr_string("a")
+        + b"\0\0"
+        + cdr_string("bc")
+        + b"\0"
+        + struct.pack("<h", 9),
+    ),
+    (
+        # Empty sequences are not padded for their elements
+        "float64[] empty\nuint8 b\nint64[] one",
+        {"empty": [], "b": 2, "one": [-3]},
+        struct.pack("<IB3xI4xq", 0, 2, 1, -3),
+    ),
+    (
+        # Neither are zero-length arrays
+        "uint8 a\nint64[0] b\nPoint[0] c\nuint8[0] d\nint16 e\n"
+        "================\nMSG: geometry_msgs/Point\nfloat64 x",
+        {"a": 1, "b": [], "c": [], "d": b"", "e": 2},
+        struct.pack("<Bxh", 1, 2),
+    ),
+    (
+        "float64[0] a\nuint8[] b",
+        {"a": [], "b": b"x"},
+        struct.pack("<I", 1) + b"x",
+    ),
+    (
+        "int8 A=1\nEmpty e\nuint8 value\n================\nMSG: p/Empty\nint8 B=2",
+        {"e": {}, "value": 5},
+        b"\x00\x05",
+    ),
+    (
+        "uint8 a\nPoint[] points\nPart[] parts\n================\n"
+        "MSG: geometry_msgs/Point\nfloat64 x\nfloat64 y\n================\n"
+        "MSG: p/Part\nuint8 id\nfloat64 v",
+        {"a": 1, "points": [{"x": 1.0, "y": 2.0}], "parts": [{"id": 3, "v": 4.0}]},
+        b"\x01\0\0\0"
+        + struct.pack("<I2d", 1, 1.0, 2.0)
+        + struct.pack("<IB3xd", 1, 3, 4.0),
+    ),
+]
+
+
+@pytest.mark.parametrize("msg_def, message, expected", CDR_TESTS)
+def test_reads_and_writes_message(msg_def, message, expected):
+    definitions = parse(msg_def, ros2=True)
+    writer = CdrMessageWriter(definitions)
+    assert writer.calculate_byte_size(message) == len(expected) + 4
+    assert writer.write_message(message) == LE + expected
+    assert CdrMessageReader(definitions).read_message(LE + expected) == message
+
+
+def test_big_endian():
+    definitions = parse("uint8 a\nstring s\nuint16[] values\nfloat64 x", ros2=True)
+    message = {"a": 1, "s": "ab", "values": [258], "x": 1.5}
+    expected = (
+        BE
+        + b"\x01\0\0\0"
+        + cdr_string("ab", ">")
+        + b"\0"
+        + struct.pack(">IH6xd", 1, 258, 1.5)
+    )
+    assert (
+        CdrMessageWriter(definitions, little_endian=False).write_message(message)
+        == expected
+    )
+    reader = CdrMessageReader(definitions)
+    assert reader.read_message(expected) == message
+    assert ">" in reader.source(little_endian=False)
+
+
+def test_writes_defaults():
+    definitions = parse(
+        'int32 a 7\nstring s "x"\nfloat64[] v [1.5]\nbool b\n'
+        "builtin_interfaces/Time t\nuint8[2] pair",
+        ros2=True,
+    )
+    data = CdrMessageWriter(definitions).write_message({"b": True})
+    assert CdrMessageReader(definitions).read_message(data) == {
+        "a": 7,
+        "s": "x",
+        "v": [1.5],
+        "b": True,
+        "t": {"sec": 0, "nanosec": 0},
+        "pair": b"\0\0",
+    }
+
+
+def test_accepts_ros1_times():
+    definitions = parse("time stamp", ros2=True)
+    data = CdrMessageWriter(definitions).write_message({"stamp": Time(1, 2)})
+    assert data == LE + struct.pack("<iI", 1, 2)
+
+
+@pytest.mark.parametrize(
+    "msg_def, message, error",
+    [
+        ("string<=3 name", {"name": "abcd"}, "upper bound of 3"),
+        ("string<=3[] names", {"names": ["abc", "abcd"]}, "upper bound of 3"),
+        ("int32[<=2] values", {"values": [1, 2, 3]}, "upper bound of 2"),
+        ("int32[2] values", {"values": [1]}, "expected 2"),
+        ("uint8 value", {"value": 256}, "Cannot serialize message"),
+    ],
+)
+def test_write_checks_bounds(msg_def, message, error):
+    writer = CdrMessageWriter(parse(msg_def, ros2=True))
+    with pytest.raises(ValueError, match=error):
+        writer.write_message(message)
+
+
+def test_rejects_invalid_buffers():
+    reader = CdrMessageReader(parse("string name\nint32 value", ros2=True))
+    data = LE + cdr_string("abc") + struct.pack("<i", 1)
+    with pytest.raises(ValueError, match="too short to read message"):
+        reader.read_message(data[:-1])
+    with pytest.raises(ValueError, match="String length error"):
+        reader.read_message(LE + struct.pack("<I", 100))
+    with pytest.raises(ValueError, match="encapsulation kind 0x02"):
+        reader.read_message(b"\x00\x02\x00\x00" + data[4:])
+    with pytest.raises(ValueError, match="encapsulation header"):
+        reader.read_message(b"\x00")
+
+
+@pytest.mark.parametrize("little_endian", [True, False])
+def test_reads_and_writes_message_classes(little_endian):
+    definitions = parse(
+        "builtin_interfaces/Time stamp\nPoint[] points\nPoint[2] pair\nEmpty e\n"
+        "string name\n================\nMSG: geometry_msgs/Point\nfloat64 x\n"
+        "float64 y\n================\nMSG: p/Empty",
+        ros2=True,
+    )
+    point = {"x": 1.0, "y": 2.0}
+    message = {
+        "stamp": {"sec": 1, "nanosec": 2},
+        "points": [point],
+        "pair": [point, {"x": 3.0, "y": 4.0}],
+        "e": {},
+        "name": "map",
+    }
+    data = CdrMessageWriter(definitions, little_endian).write_message(message)
+    decoded = CdrMessageReader(definitions, message_classes=True).read_message(data)
+    assert type(decoded) is message_class(definitions)
+    assert decoded.to_dict() == message
+    writer = CdrMessageWriter(definitions, little_endian, message_classes=True)
+    assert writer.write_message(decoded) == data
+    with pytest.raises(ValueError, match="Cannot serialize message"):
+        writer.write_message(message)
+
+
+def test_rejects_wstring():
+    error = "wstring is implementation-defined and therefore not supported"
+    with pytest.raises(ValueError, match=error):
+        CdrMessageReader(parse("wstring name", ros2=True))
+    with pytest.raises(ValueError, match=error):
+        CdrMessageWriter(parse("wstring[] names", ros2=True))
+
+
+def sample_value(types, field, rng):
+    if field.isArray:
+        length = field.arrayLength
+        if length is None:
+            length = rng.randrange(4)
+        if field.type in ("uint8", "char"):
+            return bytes(rng.randrange(256) for _ in range(length))
+        return [sample_scalar(types, field, rng) for _ in range(length)]
+    return sample_scalar(types, field, rng)
+
+
+def sample_scalar(types, field, rng):
+    if field.isComplex:
+        return sample_message(types, types[field.type], rng)
+    if field.type in ("time", "duration"):
+        return {"sec": rng.randrange(-100, 100), "nanosec": rng.randrange(10**9)}
+    if field.type == "string":
+        return "".join(rng.choice("abcé") for _ in range(rng.randrange(6)))
+    if field.type == "bool":
+        return rng.random() < 0.5
+    if field.type.startswith("float"):
+        return float(rng.randrange(-100, 100)) / 4
+    bits = int(field.type.lstrip("uint"))
+    if field.type.startswith("u"):
+        return rng.randrange(2**bits)
+    return rng.randrange(-(2 ** (bits - 1)), 2 ** (bits - 1))
+
+
+def sample_message(types, msg_def, rng):
+    return {
+        f.name: sample_value(types, f, rng)
+        for f in msg_def.definitions
+        if not f.isConstant
+    }
+
+
+@pytest.mark.skipif(
+    not ROS2_MSGDEFS_DIR.is_dir(), reason="msgdefs corpus not available"
+)
+@pytest.mark.parametrize(
+    "name",
+    [
+        "sensor_msgs/msg/Imu",
+        "sensor_msgs/msg/PointCloud2",
+        "sensor_msgs/msg/JointState",
+        "tf2_msgs/msg/TFMessage",
+        "visualization_msgs/msg/MarkerArray",
+        "rcl_interfaces/msg/ParameterEvent",
+        "shape_msgs/msg/Mesh",
+    ],
+)
+@pytest.mark.parametrize("little_endian", [True, False])
+def test_corpus_round_trip(name, little_endian):
+    definitions = parse((ROS2_MSGDEFS_DIR / f"{name}.msg").read_text(), ros2=True)
+    types = {d.name: d for d in definitions}
+    writer = CdrMessageWriter(definitions, little_endian)
+    reader = CdrMessageReader(definitions)
+    for seed in range(3):
+        message = sample_message(types, definitions[0], random.Random(seed))
+        assert reader.read_message(writer.write_message(message)) == message
+
+
+def round_trip(definitions, seeds=range(3)):
+    types = {d.name: d for d in definitions}
+    writer = CdrMessageWriter(definitions)
+    reader = CdrMessageReader(definitions)
+    for seed in seeds:
+        message = sample_message(types, definitions[0], random.Random(seed))
+        assert reader.read_message(writer.write_message(message)) == message
+
+
+@pytest.mark.skipif(
+    not ROS2_MSGDEFS_DIR.is_dir(), reason="msgdefs corpus not available"
+)
+def test_fixed_arrays_in_array_elements():
+    covariance = ROS2_MSGDEFS_DIR / "geometry_msgs/msg/PoseWithCovariance.msg"
+    definitions = parse(
+        "geometry_msgs/PoseWithCovariance[] poses\n"
+        f"===\nMSG: geometry_msgs/PoseWithCovariance\n{covariance.read_text()}",
+        ros2=True,
+    )
+    round_trip(definitions)
+
+
+def test_message_arrays_in_array_elements():
+    definitions = parse(
+        "uint8 flag\nOuter[] outer\nOuter[2] pair\n"
+        "===\nMSG: p/Outer\nInner[2] inner\nint32 z\n"
+        "===\nMSG: p/Inner\nint32 a\nint32 b",
+        ros2=True,
+    )
+    round_trip(definitions)
+
+
+def is_sqlite(path: Path) -> bool:
+    with path.open("rb") as f:
+        return f.read(16) == b"SQLite format 3\0"
+
+
+@pytest.mark.skipif(
+    not TALKER_BAG.is_file() or not is_sqlite(TALKER_BAG),
+    reason="talker.db3 is not checked out (git-lfs)",
+)
+def test_talker_bag():
+    definitions = parse("string data", ros2=True)
+    reader = CdrMessageReader(definitions)
+    writer = CdrMessageWriter(definitions)
+    with sqlite3.connect(f"file:{TALKER_BAG}?mode=ro", uri=True) as db:
+        rows = db.execute(
+            "SELECT data FROM messages JOIN topics ON topics.id = topic_id "
+            "WHERE topics.type = 'std_msgs/msg/String'"
+        ).fetchall()
+    assert rows
+    for (data,) in rows:
+        message = reader.read_message(data)
+        assert message["data"].startswith("Hello World")
+        assert writer.write_message(message) == data
@@ -0,0 +1,135 @@
+import pytest
+
+from python_ros.rosmsg import parse
+from python_ros.rosmsg_serialization import (
+    ColumnarReader,
+    ListColumn,
+    MessageReader,
+    MessageWriter,
+)
+from python_ros.rosmsg_serialization.benchmark import (
+    MSGDEFS_DIR,
+    load_definitions,
+    synthesize_message,
+)
+from python_ros.rostime import Time
+
+np = pytest.importorskip("numpy")
+
+DEFINITION = (
+    "Header header\nfloat64[2] xy\nint16[] values\nstring[] names\n"
+    "Point[] points\nTag[] tags\nbool flag\n"
+    "===\nMSG: std_msgs/Header\nuint32 seq\ntime stamp\nstring frame_id\n"
+    "===\nMSG: p/Point\nfloat32 x\nfloat32 y\n"
+    "===\nMSG: p/Tag\nstring name\nuint8 id"
+)
+
+MESSAGES = [
+    {
+        "header": {"seq": 1, "stamp": Time(2, 3), "frame_id": "map"},
+        "xy": [0.5, 1.5],
+        "values": [4, -5],
+        "names": ["a", "bc"],
+        "points": [{"x": 1, "y": 2}],
+        "tags": [{"name": "t", "id": 7}, {"name": "", "id": 8}],
+        "flag": True,
+    },
+    {
+        "header": {"seq": 9, "stamp": Time(10, 11), "frame_id": ""},
+        "xy": [2.5, 3.5],
+        "values": [],
+        "names": [],
+        "points": [{"x": 3, "y": 4}, {"x": 5, "y": 6}],
+        "tags": [{"name": "uvw", "id": 9}],
+        "flag": False,
+    },
+]
+
+
+def test_reads_columns():
+    writer = MessageWriter(parse(DEFINITION))
+    columns = ColumnarReader(parse(DEFINITION)).read_batch(
+        [writer.write_message(message) for message in MESSAGES]
+    )
+    assert list(columns) == [
+        "header.seq",
+        "header.stamp",
+        "header.frame_id",
+        "xy",
+        "values",
+        "names",
+        "points",
+        "tags",
+        "flag",
+    ]
+    assert columns["header.seq"].tolist() == [1, 9]
+    assert columns["header.stamp"]["nsec"].tolist() == [3, 11]
+    assert columns["header.frame_id"].strings() == ["map", ""]
+    assert columns["xy"].shape == (2, 2)
+    assert columns["xy"][1].tolist() == [2.5, 3.5]
+    assert columns["flag"].tolist() == [True, False]
+
+    values = columns["values"]
+    assert values.offsets.tolist() == [0, 2, 2]
+    assert values.values.dtype == np.dtype("<i2")
+    assert values[0].tolist() == [4, -5]
+    assert columns["names"][0].strings() == ["a", "bc"]
+    assert len(columns["names"][1]) == 0
+
+    points = columns["points"]
+    assert points.offsets.tolist() == [0, 1, 3]
+    assert points.values["y"].tolist() == [2, 4, 6]
+    tags = columns["tags"]
+    assert tags.values["name"].strings() == ["t", "", "uvw"]
+    assert tags[1]["id"].tolist() == [9]
+    assert isinstance(tags[1]["name"], ListColumn)
+
+
+def test_empty_batch():
+    columns = ColumnarReader(parse(DEFINITION)).read_batch([])
+    assert len(columns["header.seq"]) == 0
+    assert len(columns["tags"]) == 0
+
+
+def test_rejects_truncated_messages():
+    writer = MessageWriter(parse(DEFINITION))
+    data = [writer.write_message(message) for message in MESSAGES]
+    reader = ColumnarReader(parse(DEFINITION))
+    with pytest.raises(ValueError, match="row 0"):
+        reader.read_batch([data[0][:-1], data[1]])
+    # Lengths must not reach into the next message
+    with pytest.raises(ValueError, match="row 0"):
+        reader.read_batch([data[0][:20], data[1]])
+
+
+@pytest.mark.skipif(not MSGDEFS_DIR.is_dir(), reason="msgdefs corpus not available")
+def test_matches_row_decoding():
+    definitions = load_definitions("tf2_msgs/TFMessage")
+    buffers = [synthesize_message(definitions, n, seed=n) for n in range(5)]
+    messages = [MessageReader(definitions).read_message(b) for b in buffers]
+    transforms = ColumnarReader(definitions).read_batch(buffers)["transforms"]
+    expected = [t for m in messages for t in m["transforms"]]
+    assert transforms.offsets.tolist() == [0, 0, 1, 3, 6, 10]
+    assert transforms.values["child_frame_id"].strings() == [
+        t["child_frame_id"] for t in expected
+    ]
+    assert transforms.values["header.stamp"]["sec"].tolist() == [
+        t["header"]["stamp"].sec for t in expected
+    ]
+    assert transforms.values["transform.rotation.w"].tolist() == [
+        t["transform"]["rotation"]["w"] for t in expected
+    ]
+
+
+@pytest.mark.skipif(not MSGDEFS_DIR.is_dir(), reason="msgdefs corpus not available")
+def test_fixed_size_fields_of_imu():
+    definitions = load_definitions("sensor_msgs/Imu")
+    buffers = [synthesize_message(definitions, seed=n) for n in range(3)]
+    messages = [MessageReader(definitions).read_message(b) for b in buffers]
+    columns = ColumnarReader(definitions).read_batch(buffers)
+    covariance = columns["orientation_covariance"]
+    assert covariance.shape == (3, 9)
+    assert covariance.tolist() == [m["orientation_covariance"] for m in messages]
+    assert columns["linear_acceleration.z"].tolist() == [
+        m["linear_acceleration"]["z"] for m in messages
+    ]
@@ -0,0 +1,86 @@
+import marshal
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from python_ros.rosmsg import DiskParseCache, ParseCache
+from python_ros.rosmsg import disk_cache as disk_cache_module
+from python_ros.rosmsg import parse
+
+DEFINITION = (
+    "Header header\n"
+    "int8[] values [1, 2]\n"
+    "string NAME = 'abc'\n"
+    "===\n"
+    "MSG: std_msgs/Header\n"
+    "uint32 seq\n"
+    "time stamp\n"
+    "string frame_id\n"
+)
+
+
+def _entries(directory):
+    return [p for p in os.listdir(directory) if p.endswith(".msgdef")]
+
+
+def test_round_trips_through_disk(tmp_path):
+    cache = DiskParseCache(tmp_path)
+    assert cache.get(DEFINITION, True, False) is None
+    first = cache.parse(DEFINITION, ros2=True)
+    assert len(_entries(tmp_path)) == 1
+    reloaded = DiskParseCache(tmp_path).get(DEFINITION, True, False)
+    assert reloaded == first == parse(DEFINITION, ros2=True)
+    assert cache.get(DEFINITION, False, False) is None
+
+
+@pytest.mark.parametrize("version_offsets", [(1, 0), (0, 1)])
+def test_ignores_entries_with_other_versions(tmp_path, version_offsets):
+    cache = DiskParseCache(tmp_path)
+    cache.parse("int8 a")
+    (entry,) = _entries(tmp_path)
+    path = tmp_path / entry
+    # A decodable entry for another type, at the real path, with a bad header
+    _, _, payload = marshal.loads(
+        disk_cache_module.encode_definitions(parse("int16 b"))[4:]
+    )
+    format_offset, parser_offset = version_offsets
+    header = (
+        disk_cache_module._FORMAT_VERSION + format_offset,
+        disk_cache_module.PARSER_VERSION + parser_offset,
+    )
+    path.write_bytes(disk_cache_module._MAGIC + marshal.dumps((*header, payload)))
+    assert cache.get("int8 a", False, False) is None
+    assert cache.parse("int8 a") == parse("int8 a")
+    assert _entries(tmp_path) == [entry]
+    assert disk_cache_module.decode_definitions(path.read_bytes()) == parse("int8 a")
+
+
+def test_treats_corrupt_entries_as_misses(tmp_path):
+    cache = DiskParseCache(tmp_path)
+    cache.parse("int8 a")
+    (entry,) = _entries(tmp_path)
+    data = (tmp_path / entry).read_bytes()
+    (tmp_path / entry).write_bytes(data[: len(data) // 2])
+    assert cache.get("int8 a", False, False) is None
+    assert cache.parse("int8 a") == parse("int8 a")
+    cache.clear()
+    assert _entries(tmp_path) == []
+
+
+def test_concurrent_writers(tmp_path):
+    def work(i):
+        return DiskParseCache(tmp_path).parse(DEFINITION)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(work, range(32)))
+    assert all(r == results[0] for r in results)
+    assert len(_entries(tmp_path)) == 1
+    assert not [p for p in os.listdir(tmp_path) if p.endswith(".tmp")]
+
+
+def test_backs_memory_cache(tmp_path):
+    ParseCache(backend=DiskParseCache(tmp_path)).parse(DEFINITION)
+    memory = ParseCache(backend=DiskParseCache(tmp_path))
+    assert memory.parse(DEFINITION) == parse(DEFINITION)
+    assert memory.cache_info().misses == 1
@@ -0,0 +1,90 @@
+import pytest
+
+from python_ros.message_definition import (
+    MessageDefinition,
+    MessageDefinitionField,
+    MessageDefinitionRegistry,
+)
+from python_ros.rosmsg import FullDefinitionBuilder, md5, parse
+
+POSE_STAMPED = (
+    "Header header\n"
+    "Pose pose\n"
+    "===\n"
+    "MSG: std_msgs/Header\n"
+    "uint32 seq\n"
+    "time stamp\n"
+    "string frame_id\n"
+    "===\n"
+    "MSG: geometry_msgs/Pose\n"
+    "Point position\n"
+    "Quaternion orientation\n"
+    "===\n"
+    "MSG: geometry_msgs/Point\n"
+    "float64 x\n"
+    "float64 y\n"
+    "float64 z\n"
+    "===\n"
+    "MSG: geometry_msgs/Quaternion\n"
+    "float64 x\n"
+    "float64 y\n"
+    "float64 z\n"
+    "float64 w\n"
+)
+
+
+def _registry():
+    registry = MessageDefinitionRegistry()
+    types = parse(POSE_STAMPED, registry=registry)
+    registry.intern(
+        MessageDefinition("geometry_msgs/PoseStamped", types[0].definitions)
+    )
+    return registry, types
+
+
+def test_builds_dependency_closed_text():
+    registry, types = _registry()
+    full = FullDefinitionBuilder(registry).build("geometry_msgs/PoseStamped")
+    assert full.dependencies == (
+        "std_msgs/Header",
+        "geometry_msgs/Pose",
+        "geometry_msgs/Point",
+        "geometry_msgs/Quaternion",
+    )
+    assert full.md5 == md5(types)
+    reparsed = parse(full.text)
+    assert [t.name for t in reparsed[1:]] == list(full.dependencies)
+    assert reparsed[1:] == types[1:]
+    assert md5(reparsed) == full.md5
+
+
+def test_caches_per_root_type():
+    registry, _types = _registry()
+    builder = FullDefinitionBuilder(registry)
+    pose = builder.build("geometry_msgs/Pose")
+    assert pose.dependencies == ("geometry_msgs/Point", "geometry_msgs/Quaternion")
+    assert builder.build("geometry_msgs/Pose") is pose
+    assert builder.build("geometry_msgs/Point").dependencies == ()
+    with pytest.raises(ValueError, match="Unknown message type"):
+        builder.build("geometry_msgs/Twist")
+
+
+def test_rebuilds_when_a_dependency_changes():
+    registry, _types = _registry()
+    builder = FullDefinitionBuilder(registry)
+    stamped = builder.build("geometry_msgs/PoseStamped")
+    point = registry.get("geometry_msgs/Point")
+    point.definitions.append(MessageDefinitionField(type="float64", name="t"))
+    point.invalidate_fingerprint()
+    rebuilt = builder.build("geometry_msgs/PoseStamped")
+    assert "float64 t" in rebuilt.text and "float64 t" not in stamped.text
+    assert rebuilt.md5 != stamped.md5
+    assert builder.build("geometry_msgs/PoseStamped") is rebuilt
+    # A conflicting registration is reported instead of serving the old text
+    registry.intern(
+        MessageDefinition(
+            "std_msgs/Header", [MessageDefinitionField(type="uint64", name="seq")]
+        )
+    )
+    with pytest.raises(ValueError, match="different definitions"):
+        builder.build("geometry_msgs/PoseStamped")
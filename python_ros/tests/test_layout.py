@@ -0,0 +1,85 @@
+import pytest
+
+from python_ros.rosmsg import parse
+from python_ros.rosmsg_serialization import MessageReader
+from python_ros.rosmsg_serialization.benchmark import (
+    MSGDEFS_DIR,
+    load_definitions,
+    synthesize_message,
+)
+from python_ros.rosmsg_serialization.layout import (
+    FieldLayout,
+    LayoutAnalyzer,
+    analyze_layouts,
+)
+
+STAMPED = (
+    "Header header\nfloat64[4] values\nPoint32 point\n"
+    "===\nMSG: std_msgs/Header\nuint32 seq\ntime stamp\nstring frame_id\n"
+    "===\nMSG: geometry_msgs/Point32\nfloat32 x\nfloat32 y\nfloat32 z"
+)
+
+
+def test_reports_offsets_and_sizes():
+    header, point = analyze_layouts(parse(STAMPED))[1:]
+    assert not header.isFixedSize
+    assert header.fields == (
+        FieldLayout("seq", "uint32", 0, None, 4),
+        FieldLayout("stamp", "time", 4, None, 8),
+        FieldLayout("frame_id", "string", 12, None, None),
+    )
+    assert point.isFixedSize
+    assert point.byteSize == 12
+    assert point.format == "<3f"
+    assert [f.offset for f in point.fields] == [0, 4, 8]
+
+
+def test_offsets_after_variable_size_fields():
+    root = LayoutAnalyzer(parse(STAMPED)).layout()
+    assert root.byteSize is None
+    assert root.fields[1:] == (
+        FieldLayout("values", "float64", 0, "header", 32),
+        FieldLayout("point", "geometry_msgs/Point32", 32, "header", 12),
+    )
+
+
+def test_dtype_matches_serialized_bytes():
+    np = pytest.importorskip("numpy")
+    definitions = parse(
+        "time stamp\nint8[2] pair\nbool flag\nPoint32 point\n"
+        "===\nMSG: geometry_msgs/Point32\nfloat32 x\nfloat32 y\nfloat32 z"
+    )
+    layout = LayoutAnalyzer(definitions).layout()
+    assert layout.dtype.itemsize == layout.byteSize == 23
+    data = synthesize_message(definitions, seed=3)
+    record = np.frombuffer(data, layout.dtype)[0]
+    message = MessageReader(definitions).read_message(data)
+    assert record["stamp"]["sec"] == message["stamp"].sec
+    assert record["stamp"]["nsec"] == message["stamp"].nsec
+    assert record["pair"].tolist() == message["pair"]
+    assert record["flag"] == message["flag"]
+    assert record["point"]["z"] == np.float32(message["point"]["z"])
+
+
+def test_variable_size_types_have_no_dtype():
+    layout = LayoutAnalyzer(parse("string name")).layout()
+    assert layout.dtype is None and layout.format is None
+
+
+@pytest.mark.skipif(not MSGDEFS_DIR.is_dir(), reason="msgdefs corpus not available")
+@pytest.mark.parametrize(
+    "name, type_name, size",
+    [
+        ("geometry_msgs/Point32", None, 12),
+        ("geometry_msgs/TransformStamped", "geometry_msgs/Transform", 56),
+        ("geometry_msgs/TwistStamped", "geometry_msgs/Twist", 48),
+        ("sensor_msgs/Imu", None, None),
+    ],
+)
+def test_corpus_layouts(name, type_name, size):
+    layout = LayoutAnalyzer(load_definitions(name)).layout(type_name)
+    assert layout.byteSize == size
+    if name == "sensor_msgs/Imu":
+        # Everything behind the header string sits at a fixed offset
+        assert all(f.after == "header" for f in layout.fields[1:])
+        assert layout.fields[-1].offset == 224
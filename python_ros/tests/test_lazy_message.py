@@ -0,0 +1,147 @@
+import struct
+
+import pytest
+
+from python_ros.rosmsg import parse
+from python_ros.rosmsg_serialization import (
+    LazyArray,
+    LazyMessage,
+    LazyMessageReader,
+    MessageReader,
+)
+from python_ros.rosmsg_serialization.benchmark import (
+    BENCHMARK_TYPES,
+    MSGDEFS_DIR,
+    load_definitions,
+    synthesize_message,
+)
+from python_ros.rostime import Time
+
+HEADER = "uint32 seq\ntime stamp\nstring frame_id"
+
+STAMPED = (
+    "Header header\nPoint[] points\nPoint[2] pair\nTag[] tags\nint8 last\n"
+    f"===\nMSG: std_msgs/Header\n{HEADER}\n"
+    "===\nMSG: geometry_msgs/Point\nfloat32 x\nfloat32 y\n"
+    "===\nMSG: p/Tag\nstring name"
+)
+
+
+def string_buffer(text: str) -> bytes:
+    data = text.encode()
+    return struct.pack("<I", len(data)) + data
+
+
+def stamped_buffer() -> bytes:
+    return (
+        struct.pack("<3I", 7, 1, 2)
+        + string_buffer("map")
+        + struct.pack("<I2f", 1, 1.5, 2.5)
+        + struct.pack("<4f", 3, 4, 5, 6)
+        + struct.pack("<I", 2)
+        + string_buffer("a")
+        + string_buffer("bcd")
+        + b"\xff"
+    )
+
+
+def as_dict(value):
+    if isinstance(value, LazyMessage):
+        return {name: as_dict(getattr(value, name)) for name in value._fields}
+    if isinstance(value, LazyArray):
+        return [as_dict(item) for item in value]
+    return value
+
+
+def test_decodes_fields_on_access():
+    reader = LazyMessageReader(parse(HEADER))
+    message = reader.read_message(struct.pack("<3I", 3, 4, 5) + string_buffer("map"))
+    assert message._fields == ("seq", "stamp", "frame_id")
+    assert message.frame_id == "map"
+    assert message.stamp == Time(4, 5)
+    assert message.seq == 3
+    assert message.stamp is message.stamp
+    assert message._size() == 19
+
+
+def test_nested_messages_and_arrays_are_lazy():
+    data = stamped_buffer()
+    reader = LazyMessageReader(parse(STAMPED))
+    message = reader.read_message(data)
+    assert message.last == -1
+    assert isinstance(message.header, LazyMessage)
+    assert message.header.frame_id == "map"
+    points = message.points
+    assert isinstance(points, LazyArray)
+    assert len(points) == 1
+    assert points[0].y == 2.5
+    assert [p.x for p in message.pair] == [3, 5]
+    assert message.pair[-1].y == 6
+    assert [tag.name for tag in message.tags[::-1]] == ["bcd", "a"]
+    with pytest.raises(IndexError):
+        message.tags[2]
+    assert reader.size(data) == len(data)
+    assert message._asdict() == MessageReader(parse(STAMPED)).read_message(data)
+    assert message.header._asdict() == {
+        "seq": 7,
+        "stamp": Time(1, 2),
+        "frame_id": "map",
+    }
+
+
+def test_fixed_prefix_uses_static_offsets():
+    reader = LazyMessageReader(parse(STAMPED))
+    source = reader.source()
+    assert "offset = self._offset + 4\n" in source
+    # Only the types with variable-size fields need an offset index
+    assert "def _index_geometry_msgs_Point" not in source
+    assert "def _index_std_msgs_Header" in source
+
+
+def test_keyword_field_names():
+    reader = LazyMessageReader(parse("int32 from\nstring class"))
+    message = reader.read_message(struct.pack("<iI", 5, 2) + b"ab")
+    assert getattr(message, "from") == 5
+    assert getattr(message, "class") == "ab"
+
+
+def test_definitions_sharing_an_md5_get_distinct_types():
+    point = "===\nMSG: geometry_msgs/Point\nfloat32 x\nfloat32 y"
+    single = LazyMessageReader(parse(f"geometry_msgs/Point p\n{point}"))
+    array = LazyMessageReader(parse(f"geometry_msgs/Point[] p\n{point}"))
+    assert single.read_message(struct.pack("<2f", 1, 2)).p.y == 2
+    message = array.read_message(struct.pack("<I2f", 1, 1, 2))
+    assert as_dict(message.p) == [{"x": 1, "y": 2}]
+
+
+def test_rejects_truncated_buffers():
+    reader = LazyMessageReader(parse(STAMPED))
+    message = reader.read_message(stamped_buffer()[:17])
+    assert message.header.seq == 7
+    with pytest.raises(ValueError, match="String length error"):
+        message.header.frame_id
+    with pytest.raises(ValueError, match="Buffer too short"):
+        message.last
+    with pytest.raises(ValueError, match="Buffer too short"):
+        reader.size(stamped_buffer()[:-1])
+
+
+@pytest.mark.skipif(not MSGDEFS_DIR.is_dir(), reason="msgdefs corpus not available")
+@pytest.mark.parametrize("name", BENCHMARK_TYPES)
+def test_matches_full_decode(name):
+    definitions = load_definitions(name)
+    reader = LazyMessageReader(definitions)
+    for seed, array_length in [(0, 0), (1, 3)]:
+        data = synthesize_message(definitions, array_length, seed)
+        expected = MessageReader(definitions).read_message(data)
+        assert as_dict(reader.read_message(data)) == expected
+        assert reader.read_message(data)._asdict() == expected
+        assert reader.size(data) == len(data)
+
+
+def test_array_views():
+    pytest.importorskip("numpy")
+    reader = LazyMessageReader(parse("float32[] ranges\nint8 tail"), array_views=True)
+    message = reader.read_message(struct.pack("<I2fb", 2, 0.5, 1.5, 9))
+    assert message.ranges.tolist() == [0.5, 1.5]
+    assert message.tail == 9
@@ -0,0 +1,73 @@
+import pytest
+
+from python_ros.rosmsg.lexer import (
+    FieldTokens,
+    is_constant_name,
+    is_field_name,
+    scan_ros1_line,
+    scan_ros2_line,
+    scan_ros2_msg_line,
+    split_array_suffix,
+)
+from python_ros.rosmsg.parse import parse
+
+
+def test_scans_ros2_field_lines():
+    assert scan_ros2_line("string<=1[<=3] arr2   # comment") == FieldTokens(
+        type="string",
+        name="arr2",
+        string_bound="1",
+        is_array=True,
+        array_bound="3",
+    )
+    assert scan_ros2_line("int8[2] arr [1,2] # c") == FieldTokens(
+        type="int8", name="arr", is_array=True, array_length="2", default_value="[1,2]"
+    )
+    assert scan_ros2_line('string FOO="a#b" # c') == FieldTokens(
+        type="string", name="FOO", constant_value='"a#b"'
+    )
+    assert scan_ros2_line("string FOO = a\\#b # c").constant_value == "a\\#b "
+
+
+def test_rejects_malformed_ros2_lines():
+    for line in ["int8", "int8[x] a", "string<= a", "int8 a 'b' c", "int8 =1"]:
+        with pytest.raises(ValueError, match="Could not parse line"):
+            scan_ros2_line(line)
+
+
+def test_scans_msg_lines():
+    assert scan_ros2_msg_line("MSG: geometry_msgs/Point") == "geometry_msgs/Point"
+    assert scan_ros2_msg_line("MSG: a/B  # comment") == "a/B"
+    assert scan_ros2_msg_line("MSG: a/B #") is None
+    assert scan_ros2_msg_line("int8 a") is None
+
+
+def test_scans_ros1_lines():
+    assert scan_ros1_line("int32 bar=-11 # Comment") == ("int32", "bar", "-11")
+    assert scan_ros1_line("string[] names") == ("string[]", "names", None)
+    assert scan_ros1_line("# only a comment") is None
+    assert split_array_suffix("string[3]") == ("string", True, 3)
+    assert split_array_suffix("string[]") == ("string", True, None)
+    assert split_array_suffix("string[x]") == ("string[x]", False, None)
+
+
+def test_name_rules():
+    assert is_constant_name("FOO_BAR2")
+    assert not is_constant_name("FOO__BAR")
+    assert not is_constant_name("FOO_")
+    assert is_field_name("foo_bar2")
+    assert not is_field_name("fooBar")
+
+
+def test_linear_time_on_hostile_inputs():
+    with pytest.raises(ValueError, match="Invalid constant name"):
+        parse("int32 " + "A" * 5000 + "a = 1", ros2=True)
+    with pytest.raises(ValueError, match="Invalid field name"):
+        parse("int32 " + "a" * 5000 + "A", ros2=True)
+    with pytest.raises(ValueError):
+        parse("string FOO = '" + "\\12" * 5000 + "\\'", ros2=True)
+
+    values = parse("int32[] arr [" + ",".join(["1"] * 100000) + "]", ros2=True)
+    assert len(values[0].definitions[0].defaultValue) == 100000
+    text = parse("string s '" + "a\\'" * 100000 + "'", ros2=True)
+    assert text[0].definitions[0].defaultValue == "a'" * 100000
@@ -1,4 +1,13 @@
-from python_ros.rosmsg import md5, parse
+import pytest
+
+from python_ros.message_definition import (
+    MessageDefinition,
+    MessageDefinitionField,
+    MessageDefinitionRegistry,
+)
+from python_ros.rosmsg import Md5Cache, md5, md5_all, parse
+
+STD_MSGS_HEADER = "uint32 seq\ntime stamp\nstring frame_id"
 
 MD5_TESTS = [
     ("std_msgs/Bool", "bool data", "8b94c1b53db61fb6aed406028ad6332a"),
@@ -76,3 +85,61 @@ MD5_TESTS = [
 def test_md5():
     for _name, msg_def, expected in MD5_TESTS:
         assert md5(parse(msg_def)) == expected
+
+
+def test_md5_all_hashes_every_named_type():
+    _name, msg_def, expected = MD5_TESTS[3]
+    types = parse(msg_def)
+    result = md5_all(types)
+    assert result == {
+        "std_msgs/Header": md5(parse(STD_MSGS_HEADER)),
+        "sensor_msgs/PointField": md5(types[2:]),
+    }
+    registry = MessageDefinitionRegistry()
+    parse(msg_def, registry=registry)
+    assert md5_all(registry) == result
+    assert md5(types) == expected
+
+
+def test_md5_cache_is_shared_across_calls():
+    cache = Md5Cache()
+    for _name, msg_def, expected in MD5_TESTS:
+        assert md5(parse(msg_def), cache=cache) == expected
+    size = len(cache)
+    for _name, msg_def, expected in MD5_TESTS:
+        assert md5(parse(msg_def), cache=cache) == expected
+    assert len(cache) == size
+
+
+def test_md5_cache_is_bounded():
+    cache = Md5Cache(maxsize=2)
+    for _name, msg_def, expected in MD5_TESTS:
+        assert md5(parse(msg_def), cache=cache) == expected
+        assert len(cache) <= 2
+    with pytest.raises(ValueError, match="must be positive"):
+        Md5Cache(maxsize=0)
+
+
+def test_md5_reports_cycles_and_missing_types():
+    a = MessageDefinition("pkg/A", [MessageDefinitionField("pkg/B", "b", True)])
+    b = MessageDefinition("pkg/B", [MessageDefinitionField("pkg/A", "a", True)])
+    with pytest.raises(ValueError, match="pkg/A -> pkg/B -> pkg/A"):
+        md5([a, b])
+    with pytest.raises(
+        ValueError, match='Missing definition for submessage type "pkg/B"'
+    ):
+        md5([a])
+
+
+def test_md5_handles_deep_hierarchies():
+    depth = 5000
+    types = [
+        MessageDefinition(
+            f"pkg/T{i}", [MessageDefinitionField(f"pkg/T{i + 1}", "next", True)]
+        )
+        for i in range(depth)
+    ]
+    types.append(
+        MessageDefinition(f"pkg/T{depth}", [MessageDefinitionField("int8", "x")])
+    )
+    assert len(md5_all(types)) == depth + 1
@@ -0,0 +1,127 @@
+import pytest
+
+from python_ros.rosmsg import md5, parse
+from python_ros.rosmsg_serialization import MessageReader, MessageWriter, message_class
+from python_ros.rosmsg_serialization.benchmark import (
+    BENCHMARK_TYPES,
+    MSGDEFS_DIR,
+    load_definitions,
+    synthesize_message,
+)
+from python_ros.rostime import Time
+
+STAMPED = (
+    "int8 LOW=-1\nstring NAME=hi\nHeader header\nPoint[2] pair\nfloat64[] values\n"
+    "uint8[3] raw\nduration span\nint32 from\n"
+    "===\nMSG: std_msgs/Header\nuint32 seq\ntime stamp\nstring frame_id\n"
+    "===\nMSG: geometry_msgs/Point\nfloat64 x\nfloat64 y"
+)
+
+
+def test_class_attributes_and_zero_values():
+    Stamped = message_class(parse(STAMPED))
+    assert Stamped.LOW == -1 and Stamped.NAME == "hi"
+    assert Stamped.__slots__ == (
+        "header",
+        "pair",
+        "values",
+        "raw",
+        "span",
+        "from",
+    )
+    assert Stamped._slot_types[:3] == (
+        "std_msgs/Header",
+        "geometry_msgs/Point[2]",
+        "float64[]",
+    )
+    message = Stamped()
+    assert not hasattr(message, "__dict__")
+    assert message.to_dict() == {
+        "header": {"seq": 0, "stamp": Time(0, 0), "frame_id": ""},
+        "pair": [{"x": 0.0, "y": 0.0}, {"x": 0.0, "y": 0.0}],
+        "values": [],
+        "raw": b"\0\0\0",
+        "span": Time(0, 0),
+        "from": 0,
+    }
+    # Mutable defaults are not shared between instances
+    other = Stamped()
+    other.values.append(1.0)
+    other.header.stamp.sec = 5
+    assert message.values == [] and message.header.stamp == Time(0, 0)
+
+
+def test_ros2_defaults():
+    Defaults = message_class(
+        parse('int32 a 7\nstring s "x"\nfloat64[] v [1.5]\nuint8[] b [1, 2]', ros2=True)
+    )
+    message = Defaults(a=3)
+    assert (message.a, message.s, message.v, message.b) == (3, "x", [1.5], b"\1\2")
+    message.v.append(2.5)
+    assert Defaults().v == [1.5]
+
+
+def test_from_dict_and_equality():
+    Stamped = message_class(parse(STAMPED))
+    message = Stamped.from_dict(
+        {"header": {"seq": 3, "frame_id": "map"}, "pair": [{"x": 1.0}, {"y": 2.0}]}
+    )
+    assert message.header.seq == 3 and message.header.stamp == Time(0, 0)
+    assert message.pair[1].y == 2.0
+    assert Stamped.from_dict(message.to_dict()) == message
+    assert message != Stamped()
+    assert message != message.to_dict()
+    assert repr(Stamped().header) == (
+        "std_msgs/Header(seq=0, stamp=Time(sec=0, nsec=0), frame_id='')"
+    )
+    with pytest.raises(TypeError):
+        hash(message)
+
+
+def test_classes_are_shared_per_md5():
+    Stamped = message_class(parse(STAMPED))
+    assert message_class(parse(STAMPED)) is Stamped
+    Header = message_class(parse(STAMPED), "std_msgs/Header")
+    assert type(Stamped().header) is Header
+    odometry = load_definitions("nav_msgs/Odometry")
+    assert message_class(odometry, "std_msgs/Header") is Header
+    # Default values are not part of the MD5 but still get their own class
+    assert message_class(parse("int32 a 1", ros2=True)) is not message_class(
+        parse("int32 a 2", ros2=True)
+    )
+
+
+def test_classes_do_not_need_an_md5():
+    # wstring has no ROS 1 MD5, which is only computed when asked for
+    Wide = message_class(parse("wstring w\nint32 x", ros2=True))
+    assert Wide(x=1).to_dict() == {"w": "", "x": 1}
+    definitions = parse(STAMPED)
+    Stamped = message_class(definitions)
+    assert Stamped._md5sum == Stamped()._md5sum == md5(definitions)
+
+
+def test_reader_and_writer_use_classes():
+    definitions = parse(STAMPED)
+    Stamped = message_class(definitions)
+    message = Stamped.from_dict(
+        {"header": {"seq": 1, "stamp": Time(2, 3), "frame_id": "map"}, "from": 4}
+    )
+    data = MessageWriter(definitions, message_classes=True).write_message(message)
+    assert data == MessageWriter(definitions).write_message(message.to_dict())
+    decoded = MessageReader(definitions, message_classes=True).read_message(data)
+    assert type(decoded) is Stamped and decoded == message
+    with pytest.raises(ValueError, match="Cannot serialize message"):
+        MessageWriter(definitions, message_classes=True).write_message(
+            message.to_dict()
+        )
+
+
+@pytest.mark.skipif(not MSGDEFS_DIR.is_dir(), reason="msgdefs corpus not available")
+@pytest.mark.parametrize("name", BENCHMARK_TYPES)
+def test_corpus_round_trip(name):
+    definitions = load_definitions(name)
+    data = synthesize_message(definitions, 3)
+    message = MessageReader(definitions, message_classes=True).read_message(data)
+    assert message.to_dict() == MessageReader(definitions).read_message(data)
+    writer = MessageWriter(definitions, message_classes=True)
+    assert writer.write_message(message) == data
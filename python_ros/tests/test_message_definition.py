@@ -0,0 +1,107 @@
+import dataclasses
+import tracemalloc
+
+import pytest
+
+from python_ros.message_definition import (
+    FrozenMessageDefinitionField,
+    MessageDefinition,
+    MessageDefinitionField,
+)
+from python_ros.rosmsg import fixup_types, md5, parse, stringify
+
+
+def _point(name: str = "geometry_msgs/Point") -> MessageDefinition:
+    return MessageDefinition(
+        name=name,
+        definitions=[
+            MessageDefinitionField(type="float64", name="x"),
+            MessageDefinitionField(type="int8", name="y", defaultValue=[1, 2]),
+        ],
+    )
+
+
+def test_fingerprint_follows_equality():
+    assert _point().fingerprint() == _point().fingerprint()
+    assert _point().fingerprint() != _point("geometry_msgs/Point32").fingerprint()
+    other = _point()
+    other.definitions[1].defaultValue = [1, 3]
+    assert other.fingerprint() != _point().fingerprint()
+    assert hash(_point().fingerprint()) == hash(_point().fingerprint())
+
+
+def test_fingerprint_is_cached_until_invalidated():
+    point = _point()
+    before = point.fingerprint()
+    point.definitions[0].name = "z"
+    assert point.fingerprint() == before
+    point.invalidate_fingerprint()
+    assert point.fingerprint() != before
+
+
+def test_fixup_types_refreshes_fingerprint():
+    definition = "Point p\n===\nMSG: geometry_msgs/Point\nfloat64 x"
+    types = parse(definition, skip_type_fixup=True)
+    before = types[0].fingerprint()
+    fixup_types(types)
+    assert types[0].fingerprint() != before
+    assert types[0].fingerprint() == parse(definition)[0].fingerprint()
+
+
+def test_parse_deduplicates_repeated_sections():
+    section = "===\nMSG: std_msgs/Header\nuint32 seq\ntime stamp\nstring frame_id\n"
+    types = parse("Header header\n" + section * 50)
+    assert [t.name for t in types] == [None, "std_msgs/Header"]
+
+
+def test_frozen_field_round_trip():
+    field = MessageDefinitionField(
+        type="int8", name="y", isArray=True, defaultValue=[1]
+    )
+    frozen = field.freeze()
+    assert frozen.defaultValue == (1,)
+    assert frozen.thaw() == field
+    assert hash(frozen) == hash(field.freeze())
+    assert {frozen, field.freeze()} == {frozen}
+    assert frozen.key() == field.key()
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        frozen.type = "int16"  # type: ignore[misc]
+    assert not hasattr(frozen, "__dict__")
+
+
+def test_frozen_fields_work_with_readers():
+    types = parse("int8[] y [1, 2]\nPoint p\n===\nMSG: geometry_msgs/Point\nfloat64 x")
+    frozen = [
+        MessageDefinition(t.name, [f.freeze() for f in t.definitions])  # type: ignore
+        for t in types
+    ]
+    assert stringify(frozen) == stringify(types)
+    assert frozen[0].fingerprint() == types[0].fingerprint()
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        fixup_types(
+            [
+                MessageDefinition(
+                    None, [FrozenMessageDefinitionField("Point", "p", True)]
+                )
+            ]
+            + types[1:]
+        )
+    assert md5(frozen[1:]) == md5(types[1:])
+
+
+def _allocated_per_item(factory, count=2000) -> float:
+    names = [f"field_{i}" for i in range(count)]
+    tracemalloc.start()
+    try:
+        items = [factory(name) for name in names]
+        size, _peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert len(items) == count
+    return size / count
+
+
+def test_frozen_fields_use_less_memory():
+    mutable = _allocated_per_item(lambda n: MessageDefinitionField("float64", n))
+    frozen = _allocated_per_item(lambda n: FrozenMessageDefinitionField("float64", n))
+    assert frozen < mutable
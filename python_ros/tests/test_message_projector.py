@@ -0,0 +1,114 @@
+import struct
+
+import pytest
+
+from python_ros.rosmsg import parse
+from python_ros.rosmsg_serialization import MessageProjector, MessageReader
+from python_ros.rosmsg_serialization.benchmark import (
+    MSGDEFS_DIR,
+    PROJECTION_BENCHMARKS,
+    load_definitions,
+    synthesize_message,
+)
+from python_ros.rostime import Time
+
+DEFINITION = (
+    "Header header\nstring[] names\nPart[] parts\nfloat64[] values\nPart part\n"
+    "uint8 last\n===\nMSG: std_msgs/Header\nuint32 seq\ntime stamp\nstring frame_id\n"
+    "===\nMSG: p/Part\nstring name\nint16[2] xy"
+)
+
+
+def string_buffer(text: str) -> bytes:
+    data = text.encode()
+    return struct.pack("<I", len(data)) + data
+
+
+def message_buffer() -> bytes:
+    return (
+        struct.pack("<3I", 1, 2, 3)
+        + string_buffer("map")
+        + struct.pack("<I", 2)
+        + string_buffer("a")
+        + string_buffer("bc")
+        + struct.pack("<I", 1)
+        + string_buffer("p")
+        + struct.pack("<2h", 4, 5)
+        + struct.pack("<I2d", 2, 0.5, 1.5)
+        + string_buffer("q")
+        + struct.pack("<2h", 6, 7)
+        + b"\x09"
+    )
+
+
+def test_projects_selected_paths():
+    projector = MessageProjector(
+        parse(DEFINITION), ["last", "header.stamp", "part.xy", "part"]
+    )
+    assert projector.project(message_buffer()) == {
+        "last": 9,
+        "header.stamp": Time(2, 3),
+        "part.xy": [6, 7],
+        "part": {"name": "q", "xy": [6, 7]},
+    }
+
+
+def test_skips_unselected_fields():
+    projector = MessageProjector(parse(DEFINITION), ["header.seq", "values"])
+    assert projector.project(message_buffer()) == {
+        "header.seq": 1,
+        "values": [0.5, 1.5],
+    }
+    source = projector.source()
+    assert "_read_strings" not in source
+    assert "utf-8" not in source
+    # Decoding stops after the last selected field
+    assert "part" not in projector.source()
+
+
+@pytest.mark.parametrize(
+    "path, error",
+    [
+        ("missing", "no field 'missing'"),
+        ("header.stamp.sec", "'sec' is not a message"),
+        ("parts.name", "'name' is not a message"),
+    ],
+)
+def test_rejects_invalid_paths(path, error):
+    with pytest.raises(ValueError, match=error):
+        MessageProjector(parse(DEFINITION), [path])
+
+
+def test_rejects_truncated_buffers():
+    projector = MessageProjector(parse(DEFINITION), ["last"])
+    with pytest.raises(ValueError, match="Buffer too short"):
+        projector.project(message_buffer()[:-1])
+    assert MessageProjector(parse(DEFINITION), ["header.seq"]).project(
+        message_buffer()[:4]
+    ) == {"header.seq": 1}
+
+
+def test_definitions_sharing_an_md5_get_distinct_projectors():
+    point = "===\nMSG: geometry_msgs/Point\nfloat64 x\nfloat64 y"
+    single = MessageProjector(parse(f"geometry_msgs/Point p\nint8 n\n{point}"), ["n"])
+    array = MessageProjector(parse(f"geometry_msgs/Point[] p\nint8 n\n{point}"), ["n"])
+    assert single.project(struct.pack("<2db", 1, 2, 3)) == {"n": 3}
+    assert array.project(struct.pack("<I2db", 1, 1, 2, 4)) == {"n": 4}
+
+
+@pytest.mark.skipif(not MSGDEFS_DIR.is_dir(), reason="msgdefs corpus not available")
+@pytest.mark.parametrize("name", PROJECTION_BENCHMARKS)
+def test_matches_full_decode(name):
+    definitions = load_definitions(name)
+    paths = PROJECTION_BENCHMARKS[name]
+    projector = MessageProjector(definitions, paths)
+    for seed, array_length in [(0, 0), (1, 7)]:
+        data = synthesize_message(definitions, array_length, seed)
+        message = MessageReader(definitions).read_message(data)
+        expected = {}
+        for path in paths:
+            value = message
+            for name in path.split("."):
+                value = value[name]
+            expected[path] = value
+        assert projector.project(data) == expected
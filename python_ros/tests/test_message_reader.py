@@ -0,0 +1,155 @@
+import struct
+
+import pytest
+
+from python_ros.rosmsg import parse
+from python_ros.rosmsg_serialization import MessageReader, compile_reader
+from python_ros.rosmsg_serialization.benchmark import (
+    BENCHMARK_TYPES,
+    MSGDEFS_DIR,
+    load_definitions,
+    synthesize_message,
+)
+from python_ros.rosmsg_serialization.interpreted import InterpretedMessageReader
+from python_ros.rostime import Time
+
+
+def string_buffer(text: str) -> bytes:
+    data = text.encode()
+    return struct.pack("<I", len(data)) + data
+
+
+READER_TESTS = [
+    ("int8 sample # lowest", b"\x80", {"sample": -128}),
+    ("uint8 sample # highest", b"\xff", {"sample": 255}),
+    ("int16 sample # lowest", b"\x00\x80", {"sample": -32768}),
+    ("uint32 sample # highest", b"\xff\xff\xff\xff", {"sample": 4294967295}),
+    ("int64 sample # lowest", struct.pack("<q", -(2**63)), {"sample": -(2**63)}),
+    ("uint64 sample # highest", b"\xff" * 8, {"sample": 2**64 - 1}),
+    ("float32 sample", struct.pack("<f", 5.5), {"sample": 5.5}),
+    ("float64 sample", struct.pack("<d", 0.125), {"sample": 0.125}),
+    ("bool flag", b"\x01", {"flag": True}),
+    ("time stamp", struct.pack("<II", 0, 1), {"stamp": Time(0, 1)}),
+    ("duration stamp", struct.pack("<ii", -1, -2), {"stamp": Time(-1, -2)}),
+    ("int32[] arr", struct.pack("<Iii", 2, 3, 7), {"arr": [3, 7]}),
+    ("time[1] arr", struct.pack("<II", 1, 2), {"arr": [Time(1, 2)]}),
+    ("duration[] arr", struct.pack("<Iii", 1, -1, 2), {"arr": [Time(-1, 2)]}),
+    ("uint8[] data", struct.pack("<I3B", 3, 1, 2, 3), {"data": b"\x01\x02\x03"}),
+    ("char[2] data", b"ab", {"data": b"ab"}),
+    ("int8[2] data", b"\xff\x01", {"data": [-1, 1]}),
+    ("float32[2] data", struct.pack("<2f", 1, 2), {"data": [1.0, 2.0]}),
+    ("bool[] flags", struct.pack("<I2?", 2, True, False), {"flags": [True, False]}),
+    ("string sample", string_buffer("sample"), {"sample": "sample"}),
+    ("string sample", string_buffer("κόσμε"), {"sample": "κόσμε"}),
+    (
+        "string[] names\nstring[2] pair",
+        struct.pack("<I", 2)
+        + string_buffer("a")
+        + string_buffer("bc")
+        + string_buffer("")
+        + string_buffer("d"),
+        {"names": ["a", "bc"], "pair": ["", "d"]},
+    ),
+    (
+        "int8 A=1\nuint8 value\nstring B=x",
+        b"\x05",
+        {"value": 5},
+    ),
+    (
+        "string firstName\nstring lastName\nuint16 age",
+        string_buffer("foo") + string_buffer("bar") + b"\x05\x00",
+        {"firstName": "foo", "lastName": "bar", "age": 5},
+    ),
+    (
+        "Point[] points\nuint8 last\n==========\nMSG: geometry_msgs/Point\n"
+        "float64 x\nfloat64 y",
+        struct.pack("<I4dB", 2, 1, 2, 3, 4, 9),
+        {"points": [{"x": 1.0, "y": 2.0}, {"x": 3.0, "y": 4.0}], "last": 9},
+    ),
+    (
+        "Point[2] points\n==========\nMSG: geometry_msgs/Point\nint16 x\nint16 y",
+        struct.pack("<4h", 1, 2, 3, 4),
+        {"points": [{"x": 1, "y": 2}, {"x": 3, "y": 4}]},
+    ),
+    (
+        "float64[0] none\ntime[0] times\nstring name",
+        string_buffer("a"),
+        {"none": [], "times": [], "name": "a"},
+    ),
+    (
+        "Empty[2] pair\nEmpty[0] none\nuint8 last\n==========\nMSG: p/Empty\nint8 A=1",
+        b"\x07",
+        {"pair": [{}, {}], "none": [], "last": 7},
+    ),
+    (
+        "Named[] items\n==========\nMSG: custom/Named\nstring name\nint32 id",
+        struct.pack("<I", 2)
+        + string_buffer("a")
+        + struct.pack("<i", 1)
+        + string_buffer("b")
+        + struct.pack("<i", 2),
+        {"items": [{"name": "a", "id": 1}, {"name": "b", "id": 2}]},
+    ),
+    (
+        "Header header\nuint8 flag\n==========\nMSG: std_msgs/Header\n"
+        "uint32 seq\ntime stamp\nstring frame_id",
+        struct.pack("<3I", 1, 2, 3) + string_buffer("map") + b"\x07",
+        {"header": {"seq": 1, "stamp": Time(2, 3), "frame_id": "map"}, "flag": 7},
+    ),
+]
+
+
+@pytest.mark.parametrize("msg_def, data, expected", READER_TESTS)
+def test_reads_message(msg_def, data, expected):
+    definitions = parse(msg_def)
+    reader = MessageReader(definitions)
+    assert reader.read_message(data) == expected
+    # unaligned read through a view of a larger buffer
+    padded = bytearray(3) + data
+    assert reader.read_message(memoryview(padded)[3:]) == expected
+    assert InterpretedMessageReader(definitions).read_message(data) == expected
+
+
+def test_merges_fixed_size_fields():
+    definitions = load_definitions("nav_msgs/Odometry")
+    source = MessageReader(definitions).source()
+    # header.seq and header.stamp, then every field after child_frame_id
+    assert source.count("unpack_from(buf, offset)") == 2
+    assert "offset += 680" in source
+
+
+POINT = "MSG: geometry_msgs/Point\nfloat64 x\nfloat64 y\nfloat64 z"
+
+
+def test_caches_readers_by_structure():
+    first = compile_reader(parse("uint8 a\nstring b"))
+    assert compile_reader(parse("uint8  a # comment\nstring b")) is first
+    assert compile_reader(parse("uint8 c\nstring b")) is not first
+    # Both have the same MD5, which ignores whether a complex field is an array
+    single = MessageReader(parse(f"geometry_msgs/Point p\n{'=' * 80}\n{POINT}"))
+    array = MessageReader(parse(f"geometry_msgs/Point[] p\n{'=' * 80}\n{POINT}"))
+    point = struct.pack("<3d", 1, 2, 3)
+    assert single.read_message(point) == {"p": {"x": 1.0, "y": 2.0, "z": 3.0}}
+    assert array.read_message(struct.pack("<I", 1) + point) == {
+        "p": [{"x": 1.0, "y": 2.0, "z": 3.0}]
+    }
+
+
+def test_rejects_truncated_buffers():
+    reader = MessageReader(parse("string name\nuint32 id"))
+    with pytest.raises(ValueError, match="String length error"):
+        reader.read_message(struct.pack("<I", 10) + b"abc")
+    with pytest.raises(ValueError, match="Buffer too short"):
+        reader.read_message(string_buffer("abc") + b"\x01")
+    with pytest.raises(ValueError, match="Array length error"):
+        MessageReader(parse("float64[] data")).read_message(struct.pack("<Id", 2, 1))
+
+
+@pytest.mark.skipif(not MSGDEFS_DIR.is_dir(), reason="msgdefs corpus not available")
+@pytest.mark.parametrize("name", BENCHMARK_TYPES)
+def test_matches_interpreted_reader(name):
+    definitions = load_definitions(name)
+    for seed, array_length in [(0, 0), (1, 1), (2, 5)]:
+        data = synthesize_message(definitions, array_length, seed)
+        expected = InterpretedMessageReader(definitions).read_message(data)
+        assert MessageReader(definitions).read_message(data) == expected
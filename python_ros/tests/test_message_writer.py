@@ -0,0 +1,132 @@
+import struct
+
+import pytest
+
+from python_ros.rosmsg import parse
+from python_ros.rosmsg_serialization import MessageReader, MessageWriter
+from python_ros.rosmsg_serialization.benchmark import (
+    BENCHMARK_TYPES,
+    MSGDEFS_DIR,
+    load_definitions,
+    synthesize_message,
+)
+from python_ros.rostime import Time
+
+
+def string_buffer(text: str) -> bytes:
+    data = text.encode()
+    return struct.pack("<I", len(data)) + data
+
+
+WRITER_TESTS = [
+    ("int8 sample", {"sample": -128}, b"\x80"),
+    ("uint64 sample", {"sample": 2**64 - 1}, b"\xff" * 8),
+    ("float64 sample", {"sample": 0.125}, struct.pack("<d", 0.125)),
+    ("bool flag", {"flag": True}, b"\x01"),
+    ("duration stamp", {"stamp": Time(-1, -2)}, struct.pack("<ii", -1, -2)),
+    ("string name", {"name": "κόσμε"}, string_buffer("κόσμε")),
+    ("uint8[] data", {"data": [1, 2]}, struct.pack("<I2B", 2, 1, 2)),
+    ("char[3] data", {"data": b"abc"}, b"abc"),
+    ("int32[] arr", {"arr": [3, 7]}, struct.pack("<Iii", 2, 3, 7)),
+    ("time[] arr", {"arr": [Time(1, 2)]}, struct.pack("<III", 1, 1, 2)),
+    ("float32[2] arr", {"arr": (1.5, 2.5)}, struct.pack("<2f", 1.5, 2.5)),
+    (
+        "string[] names\nstring[1] one",
+        {"names": ["a", "bc"], "one": [""]},
+        struct.pack("<I", 2) + string_buffer("a") + string_buffer("bc") + b"\0" * 4,
+    ),
+    ("int8 A=1\nuint8 value", {"value": 5}, b"\x05"),
+    (
+        "Point[] points\nPoint[1] one\n==========\nMSG: geometry_msgs/Point\n"
+        "float32 x\nfloat32 y",
+        {"points": [{"x": 1, "y": 2}], "one": [{"x": 3, "y": 4}]},
+        struct.pack("<I4f", 1, 1, 2, 3, 4),
+    ),
+    (
+        "Empty[2] pair\nEmpty[0] none\nEmpty[] some\nuint8 last\n==========\n"
+        "MSG: p/Empty\nint8 A=1",
+        {"pair": [{}, {}], "none": [], "some": [{}], "last": 7},
+        struct.pack("<IB", 1, 7),
+    ),
+    (
+        "float64[0] none\ntime[0] times\nuint8[0] data\nPoint[0] points\nint16 last\n"
+        "==========\nMSG: geometry_msgs/Point\nfloat32 x",
+        {"none": [], "times": [], "data": b"", "points": [], "last": 7},
+        struct.pack("<h", 7),
+    ),
+    (
+        "Header header\n==========\nMSG: std_msgs/Header\n"
+        "uint32 seq\ntime stamp\nstring frame_id",
+        {"header": {"seq": 1, "stamp": Time(2, 3), "frame_id": "map"}},
+        struct.pack("<3I", 1, 2, 3) + string_buffer("map"),
+    ),
+]
+
+
+@pytest.mark.parametrize("msg_def, message, expected", WRITER_TESTS)
+def test_writes_message(msg_def, message, expected):
+    writer = MessageWriter(parse(msg_def))
+    assert writer.calculate_byte_size(message) == len(expected)
+    assert writer.write_message(message) == expected
+
+
+def test_writes_into_output_buffer():
+    writer = MessageWriter(parse("string name\nuint16 age"))
+    message = {"name": "foo", "age": 5}
+    output = bytearray(12)
+    assert writer.write_message(message, output) is output
+    assert output[:9] == string_buffer("foo") + b"\x05\x00"
+    view = memoryview(bytearray(9))
+    writer.write_message(message, view)
+    assert view.tobytes() == output[:9]
+    with pytest.raises(ValueError, match="too small"):
+        writer.write_message(message, bytearray(8))
+
+
+def test_writes_batch_with_offset_table():
+    writer = MessageWriter(parse("string name\nuint16 age"))
+    messages = [
+        {"name": "a", "age": 1},
+        {"name": "", "age": 2},
+        {"name": "abc", "age": 3},
+    ]
+    batch = writer.write_messages(messages)
+    assert batch.offsets == [0, 7, 13, 22]
+    assert len(batch.buffer) == 22
+    reader = MessageReader(parse("string name\nuint16 age"))
+    assert [reader.read_message(batch.message(i)) for i in range(3)] == messages
+    assert writer.write_messages([]) == (bytearray(), [0])
+
+
+def test_rejects_invalid_messages():
+    writer = MessageWriter(parse("uint8 a\nint16[2] b"))
+    with pytest.raises(ValueError, match="missing field 'b'"):
+        writer.write_message({"a": 1})
+    with pytest.raises(ValueError, match="needs 2 elements, got 3"):
+        writer.write_message({"a": 1, "b": [1, 2, 3]})
+    with pytest.raises(ValueError, match="Cannot serialize"):
+        writer.write_message({"a": 256, "b": [1, 2]})
+
+
+def test_writers_of_same_md5_are_distinct():
+    point = "MSG: geometry_msgs/Point\nfloat64 x\nfloat64 y\nfloat64 z"
+    single = MessageWriter(parse(f"geometry_msgs/Point p\n{'=' * 80}\n{point}"))
+    array = MessageWriter(parse(f"geometry_msgs/Point[] p\n{'=' * 80}\n{point}"))
+    p = {"x": 1.0, "y": 2.0, "z": 3.0}
+    assert single.write_message({"p": p}) == struct.pack("<3d", 1, 2, 3)
+    assert array.write_message({"p": [p]}) == struct.pack("<I3d", 1, 1, 2, 3)
+
+
+@pytest.mark.skipif(not MSGDEFS_DIR.is_dir(), reason="msgdefs corpus not available")
+@pytest.mark.parametrize("name", BENCHMARK_TYPES)
+def test_round_trips_corpus_messages(name):
+    definitions = load_definitions(name)
+    reader = MessageReader(definitions)
+    writer = MessageWriter(definitions)
+    for seed, array_length in [(0, 0), (1, 1), (2, 5)]:
+        data = synthesize_message(definitions, array_length, seed)
+        message = reader.read_message(data)
+        assert writer.calculate_byte_size(message) == len(data)
+        assert writer.write_message(message) == data
+        batch = writer.write_messages([message, message])
+        assert batch.buffer == data + data
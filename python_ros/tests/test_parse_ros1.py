@@ -1,5 +1,7 @@
+import pytest
+
 from python_ros.message_definition import MessageDefinition, MessageDefinitionField
-from python_ros.rosmsg.parse import fixup_types, parse
+from python_ros.rosmsg.parse import TypeIndex, fixup_types, parse
 
 
 def test_parses_single_field():
@@ -237,3 +239,27 @@ def test_fixup_types_rewrites_names():
     assert types[0].definitions[0].type == "Point"
     fixup_types(types)
     assert types[0].definitions[0].type == "geometry_msgs/Point"
+
+
+def test_fixup_types_errors():
+    with pytest.raises(ValueError, match="Expected 1 top level type definition"):
+        parse("Point p")
+    ambiguous = (
+        "Point p\n===\nMSG: geometry_msgs/Point\nfloat64 x\n"
+        "===\nMSG: other_msgs/Point\nfloat32 x"
+    )
+    with pytest.raises(ValueError, match="Cannot unambiguously determine"):
+        parse(ambiguous)
+
+
+def test_type_index_lookups():
+    header = MessageDefinition(name="std_msgs/Header")
+    point = MessageDefinition(name="geometry_msgs/msg/Point")
+    root = MessageDefinition()
+    index = TypeIndex([root, header, point])
+    assert index.find("") is root
+    assert index.find("Header") is header
+    assert index.find("Point") is point
+    assert index.find("Point", "geometry_msgs/msg") is point
+    assert index.find("geometry_msgs/msg/Point") is point
+    assert index.candidates("Point", "other_msgs") == []
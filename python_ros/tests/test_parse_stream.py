@@ -0,0 +1,47 @@
+import io
+
+from python_ros.rosmsg import fixup_types, parse, parse_stream
+
+DEFINITION = (
+    "Header header\n"
+    "Point[] points\n"
+    "===============\n"
+    "MSG: std_msgs/Header\n"
+    "uint32 seq\n"
+    "time stamp\n"
+    "string frame_id\n"
+    "===============\n"
+    "MSG: geometry_msgs/Point\n"
+    "float64 x\n"
+    "===============\n"
+    "MSG: geometry_msgs/Point\n"
+    "float64 x\n"
+)
+
+
+def test_matches_parse_after_fixup():
+    types = list(parse_stream(io.StringIO(DEFINITION)))
+    assert types == parse(DEFINITION, skip_type_fixup=True)
+    fixup_types(types)
+    assert types == parse(DEFINITION)
+
+
+def test_reads_binary_streams():
+    types = list(parse_stream(io.BytesIO(DEFINITION.encode()), ros2=True))
+    fixup_types(types)
+    assert types == parse(DEFINITION, ros2=True)
+
+
+def test_yields_each_section_when_it_ends():
+    consumed = []
+
+    def lines():
+        for line in DEFINITION.splitlines():
+            consumed.append(line)
+            yield line
+
+    stream = parse_stream(lines())
+    first = next(stream)
+    assert [f.name for f in first.definitions] == ["header", "points"]
+    assert consumed == DEFINITION.splitlines()[:3]
+    assert [t.name for t in stream] == ["std_msgs/Header", "geometry_msgs/Point"]
@@ -0,0 +1,88 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from python_ros.message_definition import (
+    MessageDefinition,
+    MessageDefinitionField,
+    MessageDefinitionRegistry,
+)
+from python_ros.rosmsg import md5, parse
+from python_ros.rosmsg_serialization import MessageReader, MessageWriter
+from python_ros.rostime import Time
+
+STAMPED = (
+    "Header header\n"
+    "geometry_msgs/Point point\n"
+    "===\n"
+    "MSG: std_msgs/Header\n"
+    "uint32 seq\n"
+    "time stamp\n"
+    "string frame_id\n"
+    "===\n"
+    "MSG: geometry_msgs/Point\n"
+    "float64 x\n"
+)
+
+
+def test_parses_share_interned_definitions():
+    registry = MessageDefinitionRegistry()
+    first = parse(STAMPED, registry=registry)
+    second = parse(STAMPED, registry=registry)
+    assert first == parse(STAMPED)
+    assert all(a is b for a, b in zip(first, second))
+    assert registry.get("std_msgs/Header") is first[1]
+    assert len(registry) == 3
+
+
+def test_resolves_types_missing_from_text():
+    registry = MessageDefinitionRegistry()
+    parse(STAMPED, registry=registry)
+    types = parse("Header header\ngeometry_msgs/Point p", registry=registry)
+    assert [f.type for f in types[0].definitions] == [
+        "std_msgs/Header",
+        "geometry_msgs/Point",
+    ]
+    with pytest.raises(ValueError):
+        parse("Point p", registry=registry)
+
+
+def test_returns_dependencies_from_the_registry():
+    registry = MessageDefinitionRegistry()
+    parse(STAMPED, registry=registry)
+    types = parse("Header header\ngeometry_msgs/Point p", registry=registry)
+    assert [t.name for t in types] == [None, "std_msgs/Header", "geometry_msgs/Point"]
+    assert types[1] is registry.get("std_msgs/Header")
+    assert md5(types) == md5(parse(STAMPED.replace(" point", " p")))
+    message = {
+        "header": {"seq": 1, "stamp": Time(2, 3), "frame_id": "a"},
+        "p": {"x": 0.5},
+    }
+    data = MessageWriter(types).write_message(message)
+    assert MessageReader(types).read_message(data) == message
+
+
+def test_keeps_structural_variants_apart():
+    registry = MessageDefinitionRegistry()
+    a = MessageDefinition("pkg/A", [MessageDefinitionField(type="int8", name="x")])
+    b = MessageDefinition("pkg/A", [MessageDefinitionField(type="int16", name="x")])
+    assert registry.intern(a) is a
+    assert registry.intern(b) is b
+    assert registry.get("pkg/A", b.fingerprint()) is b
+    assert registry.variants("pkg/A") == [a, b]
+    with pytest.raises(ValueError, match="different definitions"):
+        registry.get("pkg/A")
+    assert registry.get("pkg/B") is None
+
+
+def test_rejects_unresolved_definitions():
+    with pytest.raises(ValueError):
+        parse(STAMPED, skip_type_fixup=True, registry=MessageDefinitionRegistry())
+
+
+def test_concurrent_interning():
+    registry = MessageDefinitionRegistry()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: parse(STAMPED, registry=registry), range(64)))
+    assert len(registry) == 3
+    assert all(r[1] is results[0][1] for r in results)
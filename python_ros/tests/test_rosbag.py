@@ -0,0 +1,191 @@
+import bz2
+import io
+import struct
+from pathlib import Path
+
+import pytest
+
+from python_ros.rosbag import Bag, BagReader, MessageData
+from python_ros.rosbag.benchmark import PHASES, profile_bag
+from python_ros.rostime import Time
+
+FIXTURES_DIR = Path(__file__).resolve().parents[2] / "packages/rosbag/fixtures"
+EXAMPLE = FIXTURES_DIR / "example.bag"
+
+TOPICS = [
+    "/rosout",
+    "/turtle1/color_sensor",
+    "/rosout",
+    "/rosout",
+    "/tf_static",
+    "/turtle2/color_sensor",
+    "/turtle1/pose",
+    "/turtle2/pose",
+    "/tf",
+    "/tf",
+    "/turtle2/cmd_vel",
+    "/turtle1/cmd_vel",
+]
+
+
+def read_all(name="example", decompress=None, **options):
+    with Bag(FIXTURES_DIR / f"{name}.bag", decompress) as bag:
+        return list(bag.read_messages(**options))
+
+
+def field(key: str, value: bytes) -> bytes:
+    entry = key.encode() + b"=" + value
+    return struct.pack("<i", len(entry)) + entry
+
+
+def fake_bag(preamble: bytes = b"#ROSBAG V2.0\n", *counts: int) -> io.BytesIO:
+    index_position, connection_count, chunk_count = counts or (0, 0, 0)
+    header = (
+        field("op", b"\x03")
+        + field("index_pos", struct.pack("<q", index_position))
+        + field("conn_count", struct.pack("<i", connection_count))
+        + field("chunk_count", struct.pack("<i", chunk_count))
+    )
+    padding = 4096 - len(header) - 8
+    record = struct.pack("<i", len(header)) + header + struct.pack("<i", padding)
+    return io.BytesIO(preamble + record + b" " * padding)
+
+
+@pytest.mark.parametrize("counts", [(1, 2, 3), (100000, 200000, 300000)])
+def test_reads_header(tmp_path, counts):
+    path = tmp_path / "header.bag"
+    path.write_bytes(fake_bag(b"#ROSBAG V2.0\n", *counts).getvalue())
+    with BagReader(path) as reader:
+        header = reader.read_header()
+    assert (header.indexPosition, header.connectionCount, header.chunkCount) == counts
+
+
+def test_rejects_invalid_files(tmp_path):
+    path = tmp_path / "v1.bag"
+    path.write_bytes(fake_bag(b"#ROSBAG V1.0\n").getvalue())
+    with pytest.raises(ValueError, match="Cannot identify bag format."):
+        Bag(path).open()
+    with pytest.raises(ValueError, match="Attempted to read 13 bytes"):
+        Bag(FIXTURES_DIR / "empty-file.bag").open()
+    with pytest.raises(FileNotFoundError):
+        Bag(FIXTURES_DIR / "NON_EXISTENT_FILE.bag")
+    assert read_all("no-messages") == []
+
+
+def test_reads_connections():
+    with Bag(EXAMPLE) as bag:
+        assert [c.topic for c in bag.connections.values()] == TOPICS
+        assert len(bag.chunkInfos) == 1
+        assert bag.startTime == Time(1396293887, 844783943)
+        assert bag.endTime == Time(1396293909, 544870199)
+        tf = bag.connections[8]
+        assert (tf.type, tf.md5sum) == (
+            "tf/tfMessage",
+            "94810edda583a504dfda3829e70d7eec",
+        )
+        # Definitions are parsed once per connection
+        assert tf.definitions is tf.definitions
+        assert tf.reader is tf.reader
+
+
+@pytest.mark.parametrize(
+    "count, options",
+    [
+        (8647, {}),
+        (8647, {"start_time": Time(0, 0)}),
+        (
+            1,
+            {
+                "start_time": Time(1396293887, 846735850),
+                "end_time": Time(1396293887, 846735850),
+            },
+        ),
+        (
+            319,
+            {
+                "start_time": Time(1396293886, 846735850),
+                "end_time": Time(1396293888, 846735850),
+            },
+        ),
+        (0, {"end_time": Time(0, 0)}),
+        (0, {"start_time": Time(2000000000, 0)}),
+        (1351, {"topics": ["/turtle1/color_sensor"]}),
+        (2695, {"topics": ["/turtle1/color_sensor", "/turtle2/color_sensor"]}),
+    ],
+)
+def test_counts_messages(count, options):
+    messages = read_all(**options)
+    assert len(messages) == count
+    times = [(m.timestamp.sec, m.timestamp.nsec) for m in messages]
+    assert times == sorted(times)
+    if "topics" in options:
+        assert {m.topic for m in messages} == set(options["topics"])
+
+
+def test_reads_messages():
+    [tf, *_] = read_all(topics=["/tf"])
+    assert (tf.chunkOffset, tf.totalChunks, tf.connectionId) == (0, 1, 8)
+    assert tf.message == {
+        "transforms": [
+            {
+                "header": {
+                    "seq": 0,
+                    "stamp": Time(1396293888, 56065082),
+                    "frame_id": "world",
+                },
+                "child_frame_id": "turtle2",
+                "transform": {
+                    "translation": {"x": 4.0, "y": 9.088889122009277, "z": 0.0},
+                    "rotation": {"x": 0.0, "y": 0.0, "z": 0.0, "w": 1.0},
+                },
+            }
+        ]
+    }
+    [pose, *_] = read_all(topics=["/turtle1/cmd_vel"])
+    assert pose.timestamp == Time(1396293889, 366115136)
+    assert pose.message["linear"] == {"x": 2.0, "y": 0.0, "z": 0.0}
+
+
+def test_payloads_are_views_of_the_file():
+    data = EXAMPLE.read_bytes()
+    with Bag(EXAMPLE, parse=False) as bag:
+        messages = list(bag.read_messages(topics=["/tf"]))
+        first = messages[0]
+        assert isinstance(first.data, memoryview) and first.message is None
+        # The payload is a slice of the file mapping, not a copy
+        assert first.data.obj is bag.reader.read(0, 1).obj
+        record = bag.reader.read_chunk(bag.chunkInfos[0]).chunk
+        copy = bytes(first.data)
+        assert data[record.dataOffset :].find(copy) >= 0
+    # Views handed out keep the mapping alive after close
+    assert bytes(first.data) == copy
+
+
+def test_compressed_chunks():
+    with pytest.raises(ValueError, match="Unsupported compression type bz2"):
+        read_all("example-bz2")
+    messages = read_all(
+        "example-bz2",
+        {"bz2": lambda data, size: bz2.decompress(data)},
+        topics=["/turtle1/color_sensor"],
+    )
+    assert len(messages) == 1351
+    assert [m.message for m in messages] == [
+        m.message for m in read_all(topics=["/turtle1/color_sensor"])
+    ]
+
+
+def test_rejects_wrong_record_type():
+    with BagReader(EXAMPLE) as reader:
+        header = reader.read_header()
+        with pytest.raises(ValueError, match=r"Expected MessageData \(2\) but found 3"):
+            reader.read_record(reader.read(0, reader.size), 13, MessageData)
+        with pytest.raises(ValueError, match="truncated"):
+            reader.read_record(reader.read(0, 20), 13, MessageData)
+        assert header.chunkCount == 1
+
+
+def test_profile_bag():
+    timings = profile_bag(EXAMPLE)
+    assert list(timings) == PHASES
+    assert all(seconds >= 0 for seconds in timings.values())
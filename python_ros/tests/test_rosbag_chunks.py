@@ -0,0 +1,145 @@
+import bz2
+import io
+import threading
+from pathlib import Path
+
+import pytest
+
+from python_ros.rosbag import (
+    HAVE_LZ4,
+    Bag,
+    BagReader,
+    BagWriter,
+    ChunkCache,
+    default_codecs,
+)
+from python_ros.rostime import Time
+
+FIXTURES_DIR = Path(__file__).resolve().parents[2] / "packages/rosbag/fixtures"
+EXAMPLE = FIXTURES_DIR / "example.bag"
+
+
+def messages(bag):
+    return [(m.topic, m.timestamp, bytes(m.data)) for m in bag.read_messages()]
+
+
+def copy_bag(path, compression="none", chunk_size=4096, **options):
+    """Write the messages of example.bag to *path* in many small chunks."""
+
+    with Bag(EXAMPLE) as source, BagWriter(
+        path, compression, chunk_size, **options
+    ) as writer:
+        ids = {
+            conn: writer.add_connection(
+                c.topic, c.type, c.md5sum, c.messageDefinition, c.callerid
+            )
+            for conn, c in source.connections.items()
+        }
+        for message in source.read_messages(no_parse=True):
+            writer.write(
+                ids[message.connectionId], message.timestamp, bytes(message.data)
+            )
+    return path
+
+
+@pytest.fixture(scope="module")
+def expected():
+    with Bag(EXAMPLE) as bag:
+        return messages(bag)
+
+
+@pytest.mark.parametrize(
+    "name",
+    [
+        "example-bz2",
+        pytest.param(
+            "example-lz4",
+            marks=pytest.mark.skipif(not HAVE_LZ4, reason="lz4 is not installed"),
+        ),
+    ],
+)
+def test_default_codecs(name, expected):
+    with Bag(FIXTURES_DIR / f"{name}.bag", default_codecs()) as bag:
+        assert messages(bag) == expected
+
+
+@pytest.mark.parametrize("workers", [None, 0, 4])
+@pytest.mark.parametrize("compression", ["none", "bz2"])
+def test_multi_chunk_bags(tmp_path, expected, workers, compression):
+    path = copy_bag(tmp_path / "copy.bag", compression)
+    with Bag(path, default_codecs(), workers=workers, prefetch=3) as bag:
+        assert len(bag.chunkInfos) > 20
+        assert messages(bag) == expected
+        chunks = map(bag.reader.read_chunk, bag.chunkInfos)
+        assert {result.chunk.compression for result in chunks} == {compression}
+
+
+def test_chunks_are_decompressed_once(tmp_path):
+    path = copy_bag(tmp_path / "copy.bag", "bz2")
+    calls = []
+    lock = threading.Lock()
+
+    def decompress(data, size):
+        with lock:
+            calls.append(threading.current_thread().name)
+        return bz2.decompress(data)
+
+    with Bag(path, {"bz2": decompress}, workers=2) as bag:
+        first = messages(bag)
+        middle = Time(1396293895, 0)
+        assert len(list(bag.read_messages(start_time=middle))) < len(first)
+        assert messages(bag) == first
+        chunk_count = len(bag.chunkInfos)
+        info = bag.reader.cache.cache_info()
+    assert len(calls) == chunk_count
+    assert all(name.startswith("rosbag-decompress") for name in calls)
+    assert info.entries == chunk_count and info.hits >= chunk_count
+
+
+def test_prefetches_in_order(tmp_path):
+    path = copy_bag(tmp_path / "copy.bag", "bz2")
+    order = []
+
+    def decompress(data, size):
+        order.append(size)
+        return bz2.decompress(data)
+
+    with BagReader(path, {"bz2": decompress}, workers=1, prefetch=4) as reader:
+        header = reader.read_header()
+        _, chunk_infos = reader.read_connections_and_chunk_info(
+            header.indexPosition, header.connectionCount, header.chunkCount
+        )
+        chunks = reader.iter_chunks(chunk_infos)
+        first = next(chunks)
+        # The next chunks are loaded ahead of the one being read
+        assert len(reader.cache) >= 1
+        assert first.chunk.offset == chunk_infos[0].chunkPosition
+        rest = list(chunks)
+    assert [r.chunk.offset for r in rest] == [c.chunkPosition for c in chunk_infos[1:]]
+    assert order == [r.chunk.size for r in [first, *rest]]
+
+
+def test_errors_surface_in_order(tmp_path):
+    path = copy_bag(tmp_path / "copy.bag", "bz2")
+    with Bag(path, workers=2) as bag:
+        with pytest.raises(ValueError, match="Unsupported compression type bz2"):
+            next(bag.read_messages())
+
+
+def test_cache_is_bounded_by_bytes():
+    cache = ChunkCache(100)
+    cache.put(1, "a", 40)
+    cache.put(2, "b", 40)
+    assert cache.get(1) == "a"
+    cache.put(3, "c", 40)
+    # 2 was the least recently used
+    assert (cache.get(1), cache.get(2), cache.get(3)) == ("a", None, "c")
+    cache.put(4, "d", 101)
+    assert cache.get(4) is None
+    info = cache.cache_info()
+    assert (info.entries, info.nbytes, info.hits, info.misses) == (2, 80, 3, 2)
+
+
+def test_writer_rejects_unknown_compression():
+    with pytest.raises(ValueError, match="Unsupported compression type zstd"):
+        BagWriter(io.BytesIO(), "zstd")
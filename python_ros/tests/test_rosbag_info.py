@@ -0,0 +1,85 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from python_ros.rosbag import Bag, BagWriter
+from python_ros.rosbag.info import bag_info, format_info, main
+from python_ros.rostime import Time
+
+FIXTURES_DIR = Path(__file__).resolve().parents[2] / "packages/rosbag/fixtures"
+EXAMPLE = FIXTURES_DIR / "example.bag"
+
+
+def test_summarizes_example():
+    info = bag_info(EXAMPLE)
+    assert (info.messageCount, info.chunkCount) == (8647, 1)
+    assert info.startTime == Time(1396293887, 844783943)
+    assert info.duration == Time(21, 700086256)
+    topics = {t.topic: t for t in info.topics}
+    assert len(topics) == 9
+    assert (topics["/rosout"].messageCount, topics["/rosout"].connectionCount) == (
+        10,
+        3,
+    )
+    assert (topics["/tf"].type, topics["/tf"].md5sum) == (
+        "tf/tfMessage",
+        "94810edda583a504dfda3829e70d7eec",
+    )
+    assert sum(t.messageCount for t in info.topics) == info.messageCount
+    [compression] = info.compression
+    assert (compression.compression, compression.ratio) == ("none", 1.0)
+
+
+@pytest.mark.parametrize("name", ["example-bz2", "example-lz4"])
+def test_compression_ratio(name):
+    info = bag_info(FIXTURES_DIR / f"{name}.bag")
+    [compression] = info.compression
+    assert compression.compression == name.split("-")[1]
+    assert compression.uncompressedSize == 743449
+    assert 0 < info.compressionRatio == compression.ratio < 0.5
+
+
+def test_no_messages():
+    info = bag_info(FIXTURES_DIR / "no-messages.bag")
+    assert (info.messageCount, info.startTime, info.topics) == (0, None, [])
+    assert "duration" not in format_info(info)
+
+
+def test_chunk_data_is_not_read(tmp_path):
+    path = tmp_path / "copy.bag"
+    with Bag(EXAMPLE) as source, BagWriter(path, chunk_size=16384) as writer:
+        ids = {
+            conn: writer.add_connection(c.topic, c.type, c.md5sum, c.messageDefinition)
+            for conn, c in source.connections.items()
+        }
+        for m in source.read_messages(no_parse=True):
+            writer.write(ids[m.connectionId], m.timestamp, bytes(m.data))
+    before = bag_info(path)
+    # Overwrite the data of every chunk; the summary must not change
+    data = bytearray(path.read_bytes())
+    with Bag(path) as bag:
+        for info in bag.chunkInfos:
+            chunk = bag.reader.read_chunk_header(info)
+            data[chunk.dataOffset : chunk.end] = b"\xff" * (
+                chunk.end - chunk.dataOffset
+            )
+    path.write_bytes(data)
+    after = bag_info(path)
+    assert before == after
+    assert after.chunkCount > 10 and after.messageCount == 8647
+
+
+def test_cli(capsys):
+    main([str(EXAMPLE)])
+    text = capsys.readouterr().out
+    assert "start:       2014-03-31T19:24:47.844783943Z" in text
+    assert "compression: none [1/1 chunks; 100.00%]" in text
+    assert (
+        "/rosout                  10 msgs : rosgraph_msgs/Log (3 connections)" in text
+    )
+    main(["--json", str(EXAMPLE), str(FIXTURES_DIR / "example-bz2.bag")])
+    [plain, bz2] = json.loads(capsys.readouterr().out)
+    assert plain["endTime"] == "2014-03-31T19:25:09.544870199Z"
+    assert plain["duration"] == pytest.approx(21.700086256)
+    assert bz2["compression"][0]["ratio"] == bz2["compressionRatio"] < 1
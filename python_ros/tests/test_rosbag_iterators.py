@@ -0,0 +1,126 @@
+import random
+import struct
+from pathlib import Path
+
+import pytest
+
+from python_ros.rosbag import Bag, BagWriter, default_codecs
+from python_ros.rostime import Time, compare, from_nanosec, to_nanosec
+
+FIXTURES_DIR = Path(__file__).resolve().parents[2] / "packages/rosbag/fixtures"
+TOPICS = ["/a", "/b", "/c"]
+START = 1_600_000_000 * 10**9
+
+
+@pytest.fixture(scope="module")
+def jittered(tmp_path_factory):
+    """A bag of small chunks whose time ranges overlap their neighbours'."""
+
+    rng = random.Random(0)
+    path = tmp_path_factory.mktemp("bags") / "jittered.bag"
+    written = []
+    with BagWriter(path, "bz2", chunk_size=2048) as writer:
+        ids = [
+            writer.add_connection(t, "std_msgs/UInt32", "*", "uint32 data")
+            for t in TOPICS
+        ]
+        for i in range(3000):
+            conn = ids[i % 3] if i < 2000 else ids[2]
+            nanos = START + i * 10**6 + rng.randrange(-(2 * 10**7), 2 * 10**7)
+            writer.write(conn, from_nanosec(nanos), struct.pack("<I", i))
+            written.append((TOPICS[conn], nanos, i))
+    return path, written
+
+
+def events(bag, **options):
+    return [
+        (m.topic, to_nanosec(m.timestamp), m.message["data"])
+        for m in bag.message_iterator(**options)
+    ]
+
+
+def expected(written, topics=TOPICS, start=None, end=None, reverse=False):
+    result = [
+        m
+        for m in written
+        if m[0] in topics
+        and (start is None or m[1] >= to_nanosec(start))
+        and (end is None or m[1] <= to_nanosec(end))
+    ]
+    return sorted(result, key=lambda m: m[1], reverse=reverse)
+
+
+def assert_same(actual, wanted, reverse=False):
+    times = [m[1] for m in actual]
+    assert times == sorted(times, reverse=reverse)
+    assert sorted(actual) == sorted(wanted)
+
+
+@pytest.mark.parametrize("reverse", [False, True])
+@pytest.mark.parametrize(
+    "options",
+    [
+        {},
+        {"topics": ["/b"]},
+        {"topics": ["/a", "/c"], "start_time": from_nanosec(START + 5 * 10**8)},
+        {
+            "start_time": from_nanosec(START + 10**9),
+            "end_time": from_nanosec(START + 11 * 10**8),
+        },
+        {"end_time": from_nanosec(START + 10**8)},
+        {"start_time": Time(2000000000, 0)},
+    ],
+)
+def test_merges_overlapping_chunks(jittered, options, reverse):
+    path, written = jittered
+    with Bag(path, default_codecs()) as bag:
+        assert any(
+            compare(a.endTime, b.startTime) > 0
+            for a, b in zip(bag.chunkInfos, bag.chunkInfos[1:])
+        )
+        actual = events(bag, reverse=reverse, **options)
+    wanted = expected(
+        written,
+        options.get("topics", TOPICS),
+        options.get("start_time"),
+        options.get("end_time"),
+        reverse,
+    )
+    assert_same(actual, wanted, reverse)
+
+
+def test_reads_only_matching_chunks(jittered):
+    path, _ = jittered
+    with Bag(path, default_codecs()) as bag:
+        loaded = []
+        load_chunk = bag.reader.load_chunk
+
+        def record(info):
+            loaded.append(info)
+            return load_chunk(info)
+
+        bag.reader.load_chunk = record
+        start = from_nanosec(START + 10**9)
+        end = from_nanosec(START + 12 * 10**8)
+        assert events(bag, topics=["/a"], start_time=start, end_time=end)
+        # /a is only written in the first 2000 ms
+        assert (
+            events(bag, topics=["/a"], start_time=from_nanosec(START + 25 * 10**8))
+            == []
+        )
+    assert loaded
+    for info in loaded:
+        assert compare(info.startTime, end) <= 0 and compare(start, info.endTime) <= 0
+        assert 0 in info.connections
+    assert len({info.chunkPosition for info in loaded}) < len(bag.chunkInfos) // 5
+
+
+def test_example_bag():
+    with Bag(FIXTURES_DIR / "example.bag") as bag:
+        forward = list(bag.message_iterator(topics=["/tf"]))
+        backward = list(bag.message_iterator(topics=["/tf"], reverse=True))
+        messages = list(bag.read_messages(topics=["/tf"]))
+    assert [m.timestamp for m in forward] == [m.timestamp for m in messages]
+    assert [m.timestamp for m in backward] == [m.timestamp for m in messages][::-1]
+    assert forward[0].message == messages[0].message
+    assert (forward[0].topic, forward[0].connectionId) == ("/tf", 8)
@@ -0,0 +1,116 @@
+import operator
+from pathlib import Path
+
+import pytest
+
+from python_ros.rosbag import Bag, default_codecs
+from python_ros.rosbag.benchmark import (
+    SCAN_WORKERS,
+    merge_topic_stats,
+    profile_scan,
+    topic_stats,
+    write_synthetic_bag,
+)
+from python_ros.rosbag.scan import partition_bag, scan_bag
+from python_ros.rostime import Time, compare, to_nanosec
+
+FIXTURES_DIR = Path(__file__).resolve().parents[2] / "packages/rosbag/fixtures"
+
+
+def collect(events, event):
+    events.append((to_nanosec(event.timestamp), event.topic, event.message["seq"]))
+    return events
+
+
+@pytest.fixture(scope="module")
+def synthetic(tmp_path_factory):
+    path = tmp_path_factory.mktemp("bags") / "synthetic.bag"
+    return write_synthetic_bag(path, 6000, "bz2", chunk_size=64 * 1024)
+
+
+def expected(path, **options):
+    with Bag(path, default_codecs()) as bag:
+        return [
+            (to_nanosec(m.timestamp), m.topic, m.message["seq"])
+            for m in bag.message_iterator(**options)
+        ]
+
+
+@pytest.mark.parametrize("workers", [0, 3])
+@pytest.mark.parametrize(
+    "options",
+    [
+        {},
+        {"topics": ["/odom"]},
+        {
+            "topics": ["/scan", "/status"],
+            "start_time": Time(1600000001, 500000000),
+            "end_time": Time(1600000015, 0),
+        },
+    ],
+)
+def test_ordered_scan_matches_iteration(synthetic, workers, options):
+    events = scan_bag(
+        synthetic,
+        collect,
+        list,
+        operator.add,
+        ordered=True,
+        workers=workers,
+        decompress=default_codecs(),
+        **options,
+    )
+    assert events == expected(synthetic, **options)
+
+
+def test_unordered_scan(synthetic):
+    stats = scan_bag(
+        synthetic,
+        topic_stats,
+        dict,
+        merge_topic_stats,
+        workers=2,
+        partitions=7,
+        decompress=default_codecs(),
+        parse=False,
+    )
+    assert {topic: count for topic, (count, _) in stats.items()} == {
+        "/scan": 2000,
+        "/odom": 2000,
+        "/status": 2000,
+    }
+    with Bag(synthetic, default_codecs()) as bag:
+        total = sum(len(m.data) for m in bag.message_iterator())
+    assert sum(size for _, size in stats.values()) == total
+
+
+def test_scans_example_bag():
+    stats = scan_bag(FIXTURES_DIR / "example.bag", topic_stats, dict, merge_topic_stats)
+    assert stats["/rosout"][0] == 10 and sum(c for c, _ in stats.values()) == 8647
+    empty = scan_bag(
+        FIXTURES_DIR / "example.bag",
+        topic_stats,
+        dict,
+        merge_topic_stats,
+        start_time=Time(2000000000, 0),
+    )
+    assert empty == {}
+
+
+def test_partitions_are_disjoint(synthetic):
+    with Bag(synthetic) as bag:
+        windows = partition_bag(bag, 5)
+        assert partition_bag(bag, 5, ["/missing"]) == []
+        assert len(windows) == 5 and len(bag.chunkInfos) > 5
+    assert windows[0][0] is None and windows[-1][1] is None
+    for (_, end), (start, _) in zip(windows, windows[1:]):
+        assert to_nanosec(start) == to_nanosec(end) + 1
+    starts = [start for start, _ in windows[1:]]
+    assert all(compare(a, b) < 0 for a, b in zip(starts, starts[1:]))
+
+
+def test_profile_scan(tmp_path):
+    path = write_synthetic_bag(tmp_path / "large.bag", 3000)
+    timings = profile_scan(path)
+    assert list(timings) == SCAN_WORKERS
+    assert all(seconds > 0 for seconds in timings.values())
@@ -0,0 +1,193 @@
+import struct
+
+import pytest
+
+from python_ros.rosmsg import parse
+from python_ros.rosmsg_serialization import (
+    CdrMessageReader,
+    CdrMessageWriter,
+    MessageReader,
+    MessageTranscoder,
+    MessageWriter,
+)
+from python_ros.rosmsg_serialization.benchmark import (
+    MSGDEFS_DIR,
+    load_definitions,
+    synthesize_message,
+)
+from python_ros.rostime import Time
+
+ROS2_MSGDEFS_DIR = MSGDEFS_DIR.parent / "ros2galactic"
+
+ROS1 = (
+    "Header header\nuint8 flag\nfloat64[] values\nstring[] names\nPoint[] points\n"
+    "===\nMSG: std_msgs/Header\nuint32 seq\ntime stamp\nstring frame_id\n"
+    "===\nMSG: geometry_msgs/Point\nfloat64 x\nfloat64 y"
+)
+ROS2 = (
+    "std_msgs/Header header\nuint8 flag\nfloat64[] values\nstring[] names\n"
+    "geometry_msgs/Point[] points\nint16 extra 7\n"
+    "===\nMSG: std_msgs/Header\nbuiltin_interfaces/Time stamp\nstring frame_id\n"
+    "===\nMSG: geometry_msgs/Point\nfloat64 x\nfloat64 y"
+)
+ROS1_MESSAGE = {
+    "header": {"seq": 0, "stamp": Time(1, 2), "frame_id": "map"},
+    "flag": 1,
+    "values": [0.5, 1.5],
+    "names": ["a", "bc"],
+    "points": [{"x": 1.0, "y": 2.0}],
+}
+ROS2_MESSAGE = {
+    "header": {"stamp": {"sec": 1, "nanosec": 2}, "frame_id": "map"},
+    "flag": 1,
+    "values": [0.5, 1.5],
+    "names": ["a", "bc"],
+    "points": [{"x": 1.0, "y": 2.0}],
+    "extra": 7,
+}
+
+
+def ros1_buffer(message):
+    return bytes(MessageWriter(parse(ROS1)).write_message(message))
+
+
+def test_converts_both_ways():
+    transcoder = MessageTranscoder(parse(ROS1), parse(ROS2, ros2=True))
+    assert transcoder.mismatches == (
+        "header.seq: only in ROS 1",
+        "extra: only in ROS 2",
+    )
+    ros2 = transcoder.to_ros2(
+        ros1_buffer(dict(ROS1_MESSAGE, header=dict(ROS1_MESSAGE["header"], seq=5)))
+    )
+    assert ros2 == CdrMessageWriter(parse(ROS2, ros2=True)).write_message(ROS2_MESSAGE)
+    assert transcoder.to_ros1(ros2) == ros1_buffer(ROS1_MESSAGE)
+
+
+def test_reads_big_endian_cdr():
+    definitions = parse(ROS2, ros2=True)
+    data = CdrMessageWriter(definitions, little_endian=False).write_message(
+        ROS2_MESSAGE
+    )
+    transcoder = MessageTranscoder(parse(ROS1), definitions)
+    assert transcoder.to_ros1(data) == ros1_buffer(ROS1_MESSAGE)
+
+
+def test_copies_runs_and_arrays():
+    transcoder = MessageTranscoder(parse(ROS1), parse(ROS2, ros2=True))
+    source = transcoder.source()
+    # The stamp behind the dropped seq and both arrays are copied as bytes
+    assert "buf[offset + 4 : offset + 12]" in source
+    assert "_unpack_from" not in source
+    assert "for _ in range" not in source
+
+
+@pytest.mark.parametrize(
+    "definition, message",
+    [
+        ("uint8[0] a\nint32 b", {"a": b"", "b": 1}),
+        ("int64[0] a\nuint8 b\nint32 c", {"a": [], "b": 1, "c": 2}),
+        ("uint8 a\nP[0] p\nint32 b\n===\nMSG: p/P\nint64 x", {"a": 1, "p": [], "b": 2}),
+        (
+            "uint8 a\nQ q\nQ[] qs\n===\nMSG: p/Q\nuint16[0] x\nint64[0] y\nuint8 z",
+            {
+                "a": 1,
+                "q": {"x": [], "y": [], "z": 2},
+                "qs": [{"x": [], "y": [], "z": 3}],
+            },
+        ),
+        (
+            "uint8 a\nR[2] rs\n===\nMSG: p/R\nfloat64[0] x\nuint8 y\nint32 z",
+            {"a": 1, "rs": [{"x": [], "y": 2, "z": 3}, {"x": [], "y": 4, "z": 5}]},
+        ),
+    ],
+)
+def test_skips_zero_length_arrays(definition, message):
+    ros1, ros2 = parse(definition), parse(definition, ros2=True)
+    transcoder = MessageTranscoder(ros1, ros2)
+    ros1_data = MessageWriter(ros1).write_message(message)
+    ros2_data = CdrMessageWriter(ros2).write_message(message)
+    assert transcoder.to_ros2(ros1_data) == ros2_data
+    assert transcoder.to_ros1(ros2_data) == ros1_data
+
+
+def test_strict_rejects_mismatches():
+    with pytest.raises(ValueError, match="header.seq: only in ROS 1"):
+        MessageTranscoder(parse(ROS1), parse(ROS2, ros2=True), strict=True)
+
+
+@pytest.mark.parametrize(
+    "ros1, ros2, error",
+    [
+        ("int32 a", "string a", "int32 in ROS 1 but string in ROS 2"),
+        ("int32[] a", "int32[3] a", r"int32\[\] in ROS 1 but int32\[3\] in ROS 2"),
+        ("int8 a\nint8 b", "int8 b\nint8 a", "different order"),
+    ],
+)
+def test_rejects_incompatible_fields(ros1, ros2, error):
+    with pytest.raises(ValueError, match=error):
+        MessageTranscoder(parse(ros1), parse(ros2, ros2=True))
+
+
+def test_checks_ros2_bounds():
+    transcoder = MessageTranscoder(
+        parse("string name\nint8[] values"),
+        parse("string<=2 name\nint8[<=2] values", ros2=True),
+    )
+    assert transcoder.to_ros2(struct.pack("<I2sI", 2, b"ab", 0)) == (
+        b"\x00\x01\x00\x00" + struct.pack("<I3sxI", 3, b"ab", 0)
+    )
+    with pytest.raises(ValueError, match="upper bound of 2"):
+        transcoder.to_ros2(struct.pack("<I3sI", 3, b"abc", 0))
+    with pytest.raises(ValueError, match="upper bound of 2"):
+        transcoder.to_ros2(struct.pack("<I2sI3b", 2, b"ab", 3, 1, 2, 3))
+
+
+def test_rejects_truncated_buffers():
+    transcoder = MessageTranscoder(parse(ROS1), parse(ROS2, ros2=True))
+    with pytest.raises(ValueError, match="too short"):
+        transcoder.to_ros2(ros1_buffer(ROS1_MESSAGE)[:10])
+
+
+def as_ros2(value):
+    if isinstance(value, Time):
+        # Both stamps are copied bit for bit: sec is int32, nanosec uint32
+        sec = value.sec - 2**32 if value.sec >= 2**31 else value.sec
+        return {"sec": sec, "nanosec": value.nsec % 2**32}
+    if isinstance(value, dict):
+        return {k: as_ros2(v) for k, v in value.items() if k != "seq"}
+    if isinstance(value, list):
+        return [as_ros2(v) for v in value]
+    return value
+
+
+@pytest.mark.skipif(
+    not ROS2_MSGDEFS_DIR.is_dir(), reason="msgdefs corpus not available"
+)
+@pytest.mark.parametrize(
+    "name",
+    [
+        "sensor_msgs/Imu",
+        "sensor_msgs/PointCloud2",
+        "sensor_msgs/JointState",
+        "nav_msgs/Odometry",
+        "tf2_msgs/TFMessage",
+        "visualization_msgs/MarkerArray",
+    ],
+)
+def test_corpus_pairs(name):
+    ros1 = load_definitions(name)
+    package, type_name = name.split("/")
+    ros2 = parse(
+        (ROS2_MSGDEFS_DIR / package / "msg" / f"{type_name}.msg").read_text(),
+        ros2=True,
+    )
+    transcoder = MessageTranscoder(ros1, ros2)
+    assert transcoder.mismatches == ("header.seq: only in ROS 1",)
+    for seed, array_length in [(0, 0), (1, 3)]:
+        data = synthesize_message(ros1, array_length, seed)
+        message = as_ros2(MessageReader(ros1).read_message(data))
+        ros2_data = transcoder.to_ros2(data)
+        assert CdrMessageReader(ros2).read_message(ros2_data) == message
+        back = MessageReader(ros1).read_message(transcoder.to_ros1(ros2_data))
+        assert as_ros2(back) == message